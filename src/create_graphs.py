@@ -1,6 +1,5 @@
 import argparse
 import csv
-import functools
 import json
 import logging
 import os
@@ -8,20 +7,37 @@ import pickle
 import time
 import multiprocessing as mp
 from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
-from awpy.analytics.nav import area_distance, find_closest_area
+import numpy as np
+from awpy.analytics.nav import area_distance
 from awpy.data import AREA_DIST_MATRIX, NAV
 from dotenv import load_dotenv
 from tqdm import tqdm
 
 import stats
-from datamodel.data_manager import DataManager
+from datamodel.data_manager import (
+    DataManager,
+    estimate_finish,
+    get_map_name_from_demo_file_without_parsing,
+)
+from datamodel.demo_stream import DemoIndex, read_demo_manifest, write_demo_manifest
+from datamodel.graph_store import write_round_graphs
 from graphs_to_csv import parse_graph_data, parse_node_data, parse_edges_data, CSV_HEADERS
+from stats import create_player_mappings, set_round_player_mapping
 from utils.discord_webhook import send_progress_embed
 from utils.download_demo_from_repo import get_demo_files_from_list
 from utils.logging_config import get_logger
+from utils.nav_data import (
+    attach_shared_nav_data,
+    get_area_distance_matrix,
+    get_area_index,
+    get_bombsite_distance_table,
+    release_shared_nav_data,
+    share_nav_data,
+)
 
 load_dotenv()
 
@@ -36,6 +52,9 @@ logging.getLogger("asyncio").setLevel(logging.CRITICAL)
 logging.getLogger("discord").setLevel(logging.CRITICAL)
 logging.getLogger("discord.webhook.async_").setLevel(logging.CRITICAL)
 
+# Marks progress queue items that set the total frame count of a demo instead of advancing it
+PROGRESS_TOTAL = "total"
+
 KEYS_ROUND_LEVEL = (
     "roundNum",
     "isWarmup",
@@ -88,6 +107,15 @@ KEYS_PER_NODE = KEYS_PLAYER_LEVEL + (
 BOMB_NODE_INDEX = 6
 BOMBSITE_A_NODE_INDEX = 7
 BOMBSITE_B_NODE_INDEX = 8
+NODE_COUNT = BOMBSITE_B_NODE_INDEX + 1  # node slots per graph in the npz output, slot 5 is never used
+# All edges a graph can have, in the column order of the npz output (and the dist columns of the CSV output):
+# players and bomb are connected pairwise and to both bombsites
+EDGE_PAIRS = [
+    (source, target)
+    for source in (*range(5), BOMB_NODE_INDEX)
+    for target in (*range(5), BOMB_NODE_INDEX, BOMBSITE_A_NODE_INDEX, BOMBSITE_B_NODE_INDEX)
+    if source != target
+]
 
 # PyTorch can only handle numeric tensors
 NODE_TYPE_PLAYER_INDEX = (
@@ -144,6 +172,22 @@ WEAPON_ID_MAPPING = {
 }
 
 
+def resolve_round_areas(map_name: str, frames) -> list[np.ndarray]:
+    """Finds the closest area of every T player and the bomb in all frames of a round with a single spatial query.
+    Returns one array per frame with the area IDs of the T players (in frame order) followed by the bomb's area ID."""
+    coords = ("x", "y", "z")
+    points = []
+    offsets = [0]
+    for frame in frames:
+        players = (frame.get("t") or {}).get("players") or []
+        bomb = frame.get("bomb") or {}
+        points.extend([player.get(key) for key in coords] for player in players)
+        points.append([bomb.get(key) for key in coords])
+        offsets.append(len(points))
+    area_ids = get_area_index(map_name).find_closest_areas(np.array(points, dtype=np.float64).reshape(-1, 3))
+    return [area_ids[start:end] for start, end in zip(offsets[:-1], offsets[1:], strict=True)]
+
+
 def process_round(
     dm: DataManager,
     round_idx: int,
@@ -166,6 +210,9 @@ def process_round(
     # store crucial bomb events for later analysis and estimating correct round ingame seconds.
     bomb_event_data = stats.process_bomb_data(round)
 
+    # resolve the nav areas of all players and the bomb for the whole round at once
+    frame_areas = resolve_round_areas(map_name, frames)
+
     # iterate and process each frame
     graphs = []
     error_frame_count = 0
@@ -209,16 +256,14 @@ def process_round(
         # iterate through all players, but keep them in same order every iteration
         nodes_data = {}
         edges_data = []
-        for player_idx, player in enumerate(
+        for player_idx, (frame_player_idx, player) in enumerate(
             sorted(
-                team["players"],
-                key=lambda p: dm.get_player_idx_mapped(p["name"], "t", frame),
+                enumerate(team["players"]),
+                key=lambda p: dm.get_player_idx_mapped(p[1]["name"], "t", frame),
             )
         ):
             node_data = {key: player[key] for key in KEYS_PLAYER_LEVEL}
-            node_data["areaId"] = find_closest_area(
-                map_name, point=[node_data[key] for key in ("x", "y", "z")], flat=False
-            )["areaId"]
+            node_data["areaId"] = int(frame_areas[frame_idx][frame_player_idx])
             node_data["nodeType"] = NODE_TYPE_PLAYER_INDEX
             node_data["activeWeapon"] = map_weapon_to_id(
                 node_data["activeWeapon"], logger=logger
@@ -227,11 +272,7 @@ def process_round(
 
         # add bomb node
         nodes_data[BOMB_NODE_INDEX] = dm.get_bomb_info(round_idx, frame_idx)
-        nodes_data[BOMB_NODE_INDEX]["areaId"] = find_closest_area(
-            map_name,
-            point=[nodes_data[BOMB_NODE_INDEX][key] for key in ("x", "y", "z")],
-            flat=False,
-        )["areaId"]
+        nodes_data[BOMB_NODE_INDEX]["areaId"] = int(frame_areas[frame_idx][-1])
         nodes_data[BOMB_NODE_INDEX]["nodeType"] = NODE_TYPE_BOMB_INDEX
 
         ### Create Edge Data
@@ -253,23 +294,20 @@ def process_round(
             edges_data.append((k, BOMBSITE_B_NODE_INDEX, {"dist": distance_B[k]}))
 
         # compute distances pairwise
-        for node_a in reversed(nodes_data.keys()):
-            for node_b in reversed(nodes_data.keys()):
+        node_keys = list(nodes_data.keys())
+        pairwise_distances = _pairwise_distances_internal(
+            map_name, [nodes_data[k]["areaId"] for k in node_keys], logger=logger
+        )
+        for idx_a in reversed(range(len(node_keys))):
+            for idx_b in reversed(range(len(node_keys))):
                 # ignore self loops
-                if node_a == node_b:
+                if idx_a == idx_b:
                     continue
                 edges_data.append(
                     (
-                        node_a,
-                        node_b,
-                        {
-                            "dist": _distance_internal(
-                                map_name,
-                                nodes_data[node_a]["areaId"],
-                                nodes_data[node_b]["areaId"],
-                                logger=logger,
-                            )
-                        },
+                        node_keys[idx_a],
+                        node_keys[idx_b],
+                        {"dist": float(pairwise_distances[idx_a, idx_b])},
                     )
                 )
 
@@ -315,32 +353,17 @@ def distance_bombsites(dm: DataManager, nodes: dict, logger=None):
     if map_name not in NAV:
         raise ValueError("Map not found.")
 
-    # find shortest distances to both bombsites:
-    closest_distances_A = {key: float("Inf") for key in nodes}
-    closest_distances_B = {key: float("Inf") for key in nodes}
-
+    # find shortest distances to both bombsites (precomputed per area):
     ## Todo: find bombsite *plantable* area  with minimum distance from bomb
-    for map_area_id in NAV[map_name]:
-        map_area = NAV[map_name][map_area_id]
-        if map_area["areaName"].startswith("BombsiteA"):
-            for key, _value in nodes.items():
-                target_area = nodes[key]["areaId"]
-                current_bombsite_dist = _distance_internal(
-                    map_name, map_area_id, target_area
-                )
-                # Set closest distance
-                if current_bombsite_dist < closest_distances_A[key]:
-                    closest_distances_A[key] = current_bombsite_dist
-
-        elif map_area["areaName"].startswith("BombsiteB"):
-            for key, _value in nodes.items():
-                target_area = nodes[key]["areaId"]
-                current_bombsite_dist = _distance_internal(
-                    map_name, map_area_id, target_area
-                )
-                # Set closest distance
-                if current_bombsite_dist < closest_distances_B[key]:
-                    closest_distances_B[key] = current_bombsite_dist
+    site_distances = get_bombsite_distance_table(map_name).lookup(
+        [nodes[key]["areaId"] for key in nodes]
+    )
+    closest_distances_A = {
+        key: float(site_distances[i, 0]) for i, key in enumerate(nodes)
+    }
+    closest_distances_B = {
+        key: float(site_distances[i, 1]) for i, key in enumerate(nodes)
+    }
 
     # estimate the distances for nodes that are not reachable by neighbors
     for dist_dict in [closest_distances_A, closest_distances_B]:
@@ -378,31 +401,173 @@ def distance_bombsites(dm: DataManager, nodes: dict, logger=None):
     return closest_distances_A, closest_distances_B
 
 
+def _pairwise_distances_internal(map_name, area_ids, logger=None) -> np.ndarray:
+    """Returns the [n, n] geodesic distances between all given areas. Distances are taken from the dense area
+    distance matrix in one lookup, only pairs missing from it are computed with `_distance_internal`.
+    The diagonal is 0."""
+    matrix = get_area_distance_matrix(map_name)
+    if matrix is not None:
+        distances = matrix.pairwise(area_ids).astype(np.float64)
+    else:
+        distances = np.full((len(area_ids), len(area_ids)), np.nan)
+    np.fill_diagonal(distances, 0)
+    for idx_a, idx_b in zip(*np.nonzero(np.isnan(distances)), strict=True):
+        distances[idx_a, idx_b] = _distance_internal(
+            map_name, area_ids[idx_a], area_ids[idx_b], logger=logger
+        )
+    return distances
+
+
 def _distance_internal(map_name, area_a, area_b, logger=None):
     # Use Area Distance Matrix if available, since it is faster
-    # distance matrix uses strings as key
-    area_a_str = str(area_a)
-    area_b_str = str(area_b)
-    if (
-        map_name in AREA_DIST_MATRIX
-        and area_a_str in AREA_DIST_MATRIX[map_name]
-        and area_b_str in AREA_DIST_MATRIX[map_name][area_a_str]
-    ):
-        current_bombsite_dist = AREA_DIST_MATRIX[map_name][area_a_str][area_b_str][
-            "geodesic"
-        ]
+    matrix = get_area_distance_matrix(map_name)
+    if matrix is not None:
+        current_bombsite_dist = float(matrix.lookup(area_a, area_b))
+        if not np.isnan(current_bombsite_dist):
+            return current_bombsite_dist
+
     # Else: calculate distance from pairwise iteration over all areas in map
+    if logger and len(AREA_DIST_MATRIX) > 0:
+        logger.warning("Area matrix exists but does not contain areaid: %d" % area_a)
+    geodesic_path = area_distance(
+        map_name=map_name, area_a=area_a, area_b=area_b, dist_type="geodesic"
+    )
+    return geodesic_path["distance"]
+
+
+@dataclass
+class DemoPlan:
+    """What the round tasks of a demo need to know about it. Computed once per demo by `plan_demo`."""
+
+    demo_path: str
+    match_id: str
+    map_name: str
+    round_frame_counts: list[int]
+    player_mappings: tuple[dict[str, int], dict[str, int]] | None  # T and CT mapping of the first half
+    log_path: Path
+    scanned_demo: tuple[dict, DemoIndex] | None  # Header and round byte ranges, so round tasks do not scan the demo again
+
+
+def get_demo_log_path(demo_path, create_graphs_output_dir: str) -> Path:
+    """Returns the path of a new, timestamped log file for graphing the given demo."""
+    timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
+    return Path(create_graphs_output_dir) / Path(demo_path).stem / "logs" / f"{timestamp}.log"
+
+
+def get_demo_logger(demo_path, log_path: Path) -> logging.Logger:
+    return get_logger(
+        log_path, name=f"create_graphs_logger_{Path(demo_path).stem}", level=logging.DEBUG
+    )
+
+
+def get_output_filename_template(demo_path, create_graphs_output_dir: str, output_type: str) -> str:
+    """Returns the template of the graph output file of a round (to be filled with the round index), creating its folder."""
+    output_folder = Path(create_graphs_output_dir) / Path(demo_path).stem
+    if output_type == "pickle":
+        output_filename_template = str(output_folder / "graph-rounds-%d.pkl")
+    elif output_type == "csv":
+        output_filename_template = str(output_folder / "graph-rounds-%d.csv")
+    elif output_type == "npz":
+        output_filename_template = str(output_folder / "graph-rounds-%d.npz")
     else:
-        if logger and len(AREA_DIST_MATRIX) > 0:
-            logger.warning(
-                "Area matrix exists but does not contain areaid: %d" % area_a
-            )
-        geodesic_path = area_distance(
-            map_name=map_name, area_a=area_a, area_b=area_b, dist_type="geodesic"
+        raise ValueError(f"Output type {output_type} is not supported.")
+    output_folder.mkdir(parents=True, exist_ok=True)
+    return output_filename_template
+
+
+def open_worker_demo(plan: DemoPlan, strict: bool) -> DataManager:
+    """Returns the DataManager of a planned demo for a round task. It is opened from the demo index of the plan, so
+    the task only reads its own round from the file instead of scanning the whole demo again."""
+    logger = get_demo_logger(plan.demo_path, plan.log_path)
+    return DataManager(
+        Path(plan.demo_path), do_validate=strict, logger=logger, lazy=True, scanned_demo=plan.scanned_demo
+    )
+
+
+def graph_round(
+    dm: DataManager,
+    round_idx: int,
+    player_mappings,
+    queue=None,
+    key=None,
+    rewrite_graphed_rounds=False,
+    strict=False,
+    tactic_labels_dir: str = "data/tactic_labels",
+    output_filename_template: str = "graph-rounds-%d.pkl",
+    output_type="pickle",
+) -> int:
+    """Creates the graphs of a single round and writes them to the round's output file.
+    Returns the number of processed frames (graphs written, or frames of a round that was already graphed)."""
+    logger = dm.logger
+    output_filename = output_filename_template % round_idx
+    logger.info("Converting round %d to file %s." % (round_idx, output_filename))
+
+    set_round_player_mapping(dm, player_mappings, round_idx)
+
+    # Load per-frame tactic labels for this round
+    round_label_path = (
+        Path(tactic_labels_dir)
+        / dm.get_map_name()
+        / dm.get_match_id()
+        / f"{dm.get_match_id()}_{round_idx + 1}.json"
+    )
+    if round_label_path.exists():
+        with open(round_label_path) as f:
+            frame_tactic_map = json.load(f)
+    else:
+        logger.warning(
+            f"No tactic labels found for round {round_idx + 1}. Defaulting to 'unknown'."
         )
-        current_bombsite_dist = geodesic_path["distance"]
+        frame_tactic_map = {}
+
+    # Skip if not rewriting and file exists
+    if not rewrite_graphed_rounds and Path(output_filename).exists():
+        estimated_frames = len(dm._get_frames(round_idx))
+        logger.info(
+            f"Skipping round {round_idx} with {estimated_frames} frames: graph file already exists."
+        )
+        if queue and key:
+            queue.put((key, estimated_frames))
+        return estimated_frames
+
+    graphs = process_round(
+        dm,
+        round_idx,
+        frame_tactic_map=frame_tactic_map,
+        queue=queue,
+        key=key,
+        logger=logger,
+        strict=strict,  # reuse flag for now
+    )
+
+    if output_type == "pickle":
+        with open(output_filename, "wb") as f:
+            pickle.dump(graphs, f)
+    elif output_type == "csv":
+        with open(output_filename, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADERS)
+            for graph in graphs:
+                writer.writerow(
+                    [dm.get_match_id(), round_idx] +
+                    parse_graph_data(graph["graph_data"]) +
+                    parse_node_data(graph["nodes_data"]) +
+                    parse_edges_data(graph["edges_data"]))
+    elif output_type == "npz":
+        write_round_graphs(Path(output_filename), graphs, KEYS_PER_NODE, NODE_COUNT, EDGE_PAIRS)
+    else:
+        raise ValueError(f"Output type {output_type} is not supported.")
+
+    logger.info("%d graphs written to file." % len(graphs))
+    return len(graphs)
+
 
-    return current_bombsite_dist
+def log_demo_completion(logger, processed_frames: int, total_frames: int) -> None:
+    logger.info("✅ SUCCESSFULLY COMPLETED: %d graphs written in total." % processed_frames)
+
+    if processed_frames < total_frames:
+        logger.warning(f"{total_frames - processed_frames} frames were skipped.")
+    logger.info(f"Processed {processed_frames} / {total_frames} frames.")
 
 
 def process_single_demo(
@@ -416,43 +581,30 @@ def process_single_demo(
     create_graphs_output_dir: str="data/graphs",
     output_type="pickle"
 ):
-    # logger
-    demo_uuid = Path(demo_path).stem
-    timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
-    log_path = Path(create_graphs_output_dir) / demo_uuid / "logs" / f"{timestamp}.log"
-    logger = get_logger(
-        log_path, name=f"create_graphs_logger_{demo_uuid}", level=logging.DEBUG
-    )
+    """Graphs all rounds of a demo one after another in this process."""
+    logger = get_demo_logger(demo_path, get_demo_log_path(demo_path, create_graphs_output_dir))
 
-    dm = DataManager(Path(demo_path), do_validate=strict, logger=logger)
-    output_folder = Path(create_graphs_output_dir) / demo_uuid
-    if output_type == "pickle":
-        output_filename_template = str(output_folder / "graph-rounds-%d.pkl")
-    elif output_type == "csv":
-        output_filename_template = str(output_folder / "graph-rounds-%d.csv")
-    else:
-        raise ValueError(f"Output type {output_type} is not supported.")
-    output_folder.mkdir(parents=True, exist_ok=True)
+    # Rounds are streamed from the file, so only the current and the next round are held in memory
+    dm = DataManager(Path(demo_path), do_validate=strict, logger=logger, lazy=True)
+    output_filename_template = get_output_filename_template(demo_path, create_graphs_output_dir, output_type)
 
     logger.info(
         "Processing match id: %s with %d rounds."
         % (dm.get_match_id(), dm.get_round_count())
     )
 
-    # tactic label directory for per-frame labeling
-    tactic_dir = (
-        Path(tactic_labels_dir)
-        / dm.get_map_name()
-        / dm.get_match_id()
-    )
-
     start_time = time.time()
-    total_frames = len(dm.get_all_frames())
+    round_frame_counts = dm.get_rounds_frame_count()
+    total_frames = sum(round_frame_counts)
+    # the monitor might not know the total yet, and later runs can read it from the manifest without parsing the demo
+    if queue and key:
+        queue.put((key, total_frames, PROGRESS_TOTAL))
+    write_demo_manifest(Path(demo_path), round_frame_counts)
+    player_mappings = create_player_mappings(dm)
     processed_frames = 0
-    graphs_total = 0
     for round_idx in range(dm.get_round_count()):
-        output_filename = output_filename_template % round_idx
-        logger.info("Converting round %d to file %s." % (round_idx, output_filename))
+        # read the next round in the background while this one is processed
+        dm.prefetch_round(round_idx + 1)
 
         progress = round((processed_frames / total_frames) * 100, 2)
         eta = dm.get_estimated_finish(
@@ -471,71 +623,20 @@ def process_single_demo(
                 logger=logger,
             )
 
-        # we need to swap mappings, because player sides switch here.
-        # WARNING: This only works if teams player in MR15 setting.
-        if round_idx == 15:
-            dm.swap_player_mapping()
-
-        # Load per-frame tactic labels for this round
-        round_label_path = tactic_dir / f"{dm.get_match_id()}_{round_idx + 1}.json"
-        if round_label_path.exists():
-            with open(round_label_path) as f:
-                frame_tactic_map = json.load(f)
-        else:
-            logger.warning(
-                f"No tactic labels found for round {round_idx + 1}. Defaulting to 'unknown'."
-            )
-            frame_tactic_map = {}
-
-        # Skip if not rewriting and file exists
-        if not rewrite_graphed_rounds and Path(output_filename).exists():
-
-            logger.info(
-                f"Skipping round {round_idx} with {len(dm._get_frames(round_idx))} frames: graph file already exists."
-            )
-            estimated_frames = len(dm._get_frames(round_idx))
-            if queue and key:
-                queue.put((key, estimated_frames))
-
-            graphs_total += estimated_frames
-            processed_frames += estimated_frames
-            continue
-
-        graphs = process_round(
+        processed_frames += graph_round(
             dm,
             round_idx,
-            frame_tactic_map=frame_tactic_map,
+            player_mappings,
             queue=queue,
             key=key,
-            logger=logger,
-            strict=strict,  # reuse flag for now
+            rewrite_graphed_rounds=rewrite_graphed_rounds,
+            strict=strict,
+            tactic_labels_dir=tactic_labels_dir,
+            output_filename_template=output_filename_template,
+            output_type=output_type,
         )
 
-        if output_type == "pickle":
-            with open(output_filename, "wb") as f:
-                pickle.dump(graphs, f)
-        elif output_type == "csv":
-            with open(output_filename, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(CSV_HEADERS)
-                for graph in graphs:
-                    writer.writerow(
-                        [dm.get_match_id(), round_idx] +
-                        parse_graph_data(graph["graph_data"]) +
-                        parse_node_data(graph["nodes_data"]) +
-                        parse_edges_data(graph["edges_data"]))
-        else:
-            raise ValueError(f"Output type {output_type} is not supported.")
-
-        logger.info("%d graphs written to file." % len(graphs))
-        graphs_total += len(graphs)
-        processed_frames += len(graphs)
-
-    logger.info("✅ SUCCESSFULLY COMPLETED: %d graphs written in total." % graphs_total)
-
-    if processed_frames < total_frames:
-        logger.warning(f"{total_frames - processed_frames} frames were skipped.")
-    logger.info(f"Processed {processed_frames} / {total_frames} frames.")
+    log_demo_completion(logger, processed_frames, total_frames)
 
     if send_dc_webhooks:
         send_progress_embed(
@@ -549,7 +650,68 @@ def process_single_demo(
         )
 
 
+def plan_demo(demo_path, queue=None, key=None, strict=False, create_graphs_output_dir: str = "data/graphs") -> DemoPlan:
+    """Indexes a demo and precomputes everything its rounds need, so they can be graphed as independent tasks
+    (see `process_demo_round`)."""
+    log_path = get_demo_log_path(demo_path, create_graphs_output_dir)
+    # Rounds are streamed from the file, so only the rounds in use are held in memory. With DEMO_CACHE_DIR set, the demo
+    # cache is built here once per demo, as round tasks never build it
+    dm = DataManager(Path(demo_path), do_validate=strict, logger=get_demo_logger(demo_path, log_path), lazy=True)
+
+    dm.logger.info(
+        "Processing match id: %s with %d rounds."
+        % (dm.get_match_id(), dm.get_round_count())
+    )
+
+    round_frame_counts = dm.get_rounds_frame_count()
+    # the monitor might not know the total yet, and later runs can read it from the manifest without parsing the demo
+    if queue and key:
+        queue.put((key, sum(round_frame_counts), PROGRESS_TOTAL))
+    write_demo_manifest(Path(demo_path), round_frame_counts)
+
+    return DemoPlan(
+        demo_path=demo_path,
+        match_id=dm.get_match_id(),
+        map_name=dm.get_map_name(),
+        round_frame_counts=round_frame_counts,
+        player_mappings=create_player_mappings(dm),
+        log_path=log_path,
+        scanned_demo=dm.get_scanned_demo(),
+    )
+
+
+def process_demo_round(
+    plan: DemoPlan,
+    round_idx: int,
+    queue=None,
+    key=None,
+    rewrite_graphed_rounds=False,
+    strict=False,
+    tactic_labels_dir: str = "data/tactic_labels",
+    create_graphs_output_dir: str = "data/graphs",
+    output_type="pickle",
+) -> int:
+    """Graphs a single round of a planned demo. Returns the number of processed frames."""
+    dm = open_worker_demo(plan, strict)
+    return graph_round(
+        dm,
+        round_idx,
+        plan.player_mappings,
+        queue=queue,
+        key=key,
+        rewrite_graphed_rounds=rewrite_graphed_rounds,
+        strict=strict,
+        tactic_labels_dir=tactic_labels_dir,
+        output_filename_template=get_output_filename_template(
+            plan.demo_path, create_graphs_output_dir, output_type
+        ),
+        output_type=output_type,
+    )
+
+
 def progress_monitor(queue, total_map):
+    """Shows a progress bar per demo. Queue items are (key, n) to advance a bar by n frames, (key, n, PROGRESS_TOTAL) to
+    set the total of a bar (for demos whose total was unknown up front), and None to stop."""
     pbars = {
         k: tqdm(total=v, desc=k, position=i, leave=True)
         for i, (k, v) in enumerate(total_map.items())
@@ -559,10 +721,14 @@ def progress_monitor(queue, total_map):
         task = queue.get()
         if task is None:
             break
-        key, n = task
+        key, n, *kind = task
         if key in pbars:
-            pbars[key].update(n)
-            if pbars[key].n >= pbars[key].total:
+            if kind == [PROGRESS_TOTAL]:
+                pbars[key].total = n
+                pbars[key].refresh()
+            else:
+                pbars[key].update(n)
+            if pbars[key].total is not None and pbars[key].n >= pbars[key].total:
                 finished.add(key)
     for pbar in pbars.values():
         pbar.close()
@@ -608,8 +774,8 @@ def get_env_variables():
         print("Environment variable CREATE_GRAPHS_PROCESSES_COUNT is not set. Using default of 1 process.")
         batch_size = 1
 
-    if not output_type or not output_type in ("pickle", "csv"):
-        print("Environment variable CREATE_GRAPHS_CSV_OUTPUT is not set to valid value ('pickle' or 'csv'). " \
+    if not output_type or not output_type in ("pickle", "csv", "npz"):
+        print("Environment variable CREATE_GRAPHS_CSV_OUTPUT is not set to valid value ('pickle', 'csv' or 'npz'). " \
               "Using default of 'pickle'.")
         output_type = "pickle"
 
@@ -649,11 +815,12 @@ def main(send_dc_webhooks=False, rewrite_graphed_rounds=False, strict=False, syn
     )
     print(f"Processing {len(demo_pathnames)}/{len(filtered_demos)} demo files...")
 
-    # Calculate total frames per demo for progress bars
-    total_map = {
-        demo: len(DataManager(Path(demo), do_validate=strict).get_all_frames())
-        for demo in demo_pathnames
-    }
+    # Total frames per demo for progress bars, from the manifests of earlier runs.
+    # Demos without a manifest are not parsed here, their worker reports the total once it has loaded the demo.
+    total_map = {}
+    for demo in demo_pathnames:
+        round_frame_counts = read_demo_manifest(Path(demo))
+        total_map[demo] = sum(round_frame_counts) if round_frame_counts is not None else None
 
     if sync:
         for demo in demo_pathnames:
@@ -676,35 +843,84 @@ def main(send_dc_webhooks=False, rewrite_graphed_rounds=False, strict=False, syn
         # Process terminates when "None" is retrieved from Queue
         monitor = mp.Process(target=progress_monitor, args=(queue, total_map))
         monitor.start()
+        # Build the distance data of all maps once and share it with the workers instead of each building its own
+        map_names = {get_map_name_from_demo_file_without_parsing(Path(demo)) for demo in demo_pathnames}
+        shared_blocks, shared_nav_data = share_nav_data(name for name in map_names if name is not None)
         # Create a ProcessPoolExecutor with the desired number of workers
-        with ProcessPoolExecutor(max_workers=batch_size) as executor:
-
-            # Submit all tasks to the executor
-            futures = [
-                executor.submit(
-                    functools.partial(
-                        process_single_demo,
+        try:
+            start_time = time.time()
+            with ProcessPoolExecutor(
+                max_workers=batch_size,
+                initializer=attach_shared_nav_data,
+                initargs=(shared_nav_data,),
+            ) as executor:
+                # Every demo is first indexed by one task, then each of its rounds is graphed as a task of its own,
+                # so even a single demo keeps all workers busy.
+                plan_futures = [
+                    executor.submit(
+                        plan_demo,
                         demo,
                         queue,
                         demo,
-                        send_dc_webhooks=send_dc_webhooks,
-                        rewrite_graphed_rounds=rewrite_graphed_rounds,
                         strict=strict,
-                        tactic_labels_dir=tactic_labels_dir,
                         create_graphs_output_dir=create_graphs_output_dir,
-                        output_type=output_type,
                     )
-                )
-                for demo in demo_pathnames
-            ]
-
-            # Process the completed tasks
-            for future in as_completed(futures):
-                try:
-                    result = future.result()  # Get the task result (if returned)
-                    print(f"Task completed with result: {result}")  # Optional: Process the result
-                except Exception as e:
-                    print(f"Task failed with error: {e}")  # Handle errors appropriately
+                    for demo in demo_pathnames
+                ]
+
+                # Submit the rounds of each demo as soon as it is planned, while other demos are still being planned
+                round_futures = {}
+                for future in as_completed(plan_futures):
+                    try:
+                        plan = future.result()
+                    except Exception as e:
+                        print(f"Task failed with error: {e}")  # Handle errors appropriately
+                        continue
+                    for round_idx in range(len(plan.round_frame_counts)):
+                        round_future = executor.submit(
+                            process_demo_round,
+                            plan,
+                            round_idx,
+                            queue,
+                            plan.demo_path,
+                            rewrite_graphed_rounds=rewrite_graphed_rounds,
+                            strict=strict,
+                            tactic_labels_dir=tactic_labels_dir,
+                            create_graphs_output_dir=create_graphs_output_dir,
+                            output_type=output_type,
+                        )
+                        round_futures[round_future] = (plan, round_idx)
+
+                # Process the completed rounds and finish off each demo once all of its rounds are done
+                open_rounds = {}
+                processed_frames = {}
+                for plan, _ in round_futures.values():
+                    open_rounds[plan.demo_path] = len(plan.round_frame_counts)
+                    processed_frames[plan.demo_path] = 0
+                for future in as_completed(round_futures):
+                    plan, round_idx = round_futures[future]
+                    try:
+                        processed_frames[plan.demo_path] += future.result()
+                    except Exception as e:
+                        print(f"Task for round {round_idx} of {plan.demo_path} failed with error: {e}")
+                    open_rounds[plan.demo_path] -= 1
+                    rounds_done = len(plan.round_frame_counts) - open_rounds[plan.demo_path]
+                    total_frames = sum(plan.round_frame_counts)
+                    if send_dc_webhooks:
+                        send_progress_embed(
+                            progress=round((processed_frames[plan.demo_path] / total_frames) * 100, 2) if total_frames else 100,
+                            roundsTotal=len(plan.round_frame_counts),
+                            currentRound=rounds_done - 1,
+                            eta=estimate_finish(start_time, processed_frames[plan.demo_path], total_frames),
+                            id=plan.match_id,
+                            sendSilent=open_rounds[plan.demo_path] > 0,  # Send loud for the last round
+                        )
+                    if open_rounds[plan.demo_path] == 0:
+                        log_demo_completion(
+                            get_demo_logger(plan.demo_path, plan.log_path), processed_frames[plan.demo_path], total_frames
+                        )
+        finally:
+            release_shared_nav_data(shared_blocks)
 
         # Signal task completion to the queue and join the monitor
         queue.put(None)
@@ -1,4 +1,5 @@
 import json
+import os
 import re
 import time
 from collections import defaultdict
@@ -9,6 +10,15 @@ from pathlib import Path
 from awpy.types import BombInfo, Game, GameFrame, GameRound, GrenadeAction, PlayerInfo
 from pydantic import TypeAdapter, ValidationError
 
+from datamodel.demo_cache import build_demo_cache, load_demo_cache
+from datamodel.demo_stream import (
+    DemoIndex,
+    LazyGameRounds,
+    sanitize_game_header,
+    sanitize_game_round,
+    scan_demo,
+)
+from datamodel.frame_store import SIDE_INDEX, ColumnarFrames, FrameStore
 from datamodel.player import Player
 from datamodel.round_events import RoundActions
 from datamodel.round_stats import RoundStats
@@ -31,54 +41,10 @@ game_validator = TypeAdapter(Game)
 def _load_game_data(file_path: Path, do_validate: bool = True, logger=None) -> Game:
     """Loads a JSON file containing a Game object. If `do_validate` is True, the data will be validated against the Game schema."""
 
-    def is_valid_player(p: dict) -> bool:
-        required_fields = [
-            "eyeX",
-            "eyeY",
-            "eyeZ",
-            "flashGrenades",
-            "smokeGrenades",
-            "heGrenades",
-            "fireGrenades",
-            "lastPlaceName",
-            "isBot",
-        ]
-        return all(field in p for field in required_fields)
-
-    def is_valid_frame(frame: dict) -> bool:
-        return (
-            isinstance(frame.get("frameID"), int)
-            and isinstance(frame.get("globalFrameID"), int)
-            and isinstance(frame.get("clockTime"), str)
-        )
-
     def sanitize_game_data(game_data: dict, file_path: Path) -> dict:
-        # Drop root-level fields if missing
-        required_root_keys = ["chatMessages", "parserParameters"]
-        for key in required_root_keys:
-            game_data.setdefault(key, {} if key == "parserParameters" else [])
-
-        # Ensure required nested parser fields
-        game_data["parserParameters"].setdefault("parseChat", False)
-
-        # Add missing matchID from file name if not present
-        game_data.setdefault("matchID", file_path.stem)
-
+        sanitize_game_header(game_data, file_path)
         for rnd in game_data.get("gameRounds", []):
-            if "frames" in rnd:
-                rnd["frames"] = [
-                    frame for frame in rnd["frames"] if is_valid_frame(frame)
-                ]
-                for frame in rnd["frames"]:
-                    for side in ("ct", "t"):
-                        if side in frame and "players" in frame[side]:
-                            frame[side]["players"] = [
-                                p for p in frame[side]["players"] if is_valid_player(p)
-                            ]
-            if "kills" in rnd:
-                for kill in rnd["kills"]:
-                    kill.setdefault("playerTradedSide", None)
-
+            sanitize_game_round(rnd)
         return game_data
 
     with open(file_path) as file:
@@ -111,18 +77,163 @@ def _load_game_data(file_path: Path, do_validate: bool = True, logger=None) -> G
             raise RuntimeError("Schema validation failed during demo load.") from None
 
 
+def _load_game_data_lazy(
+    file_path: Path, do_validate: bool = True, logger=None, on_round=None, scanned_demo: tuple[dict, DemoIndex] | None = None
+) -> Game:
+    """Like `_load_game_data`, but streams through the file once to index its rounds instead of keeping them in memory.
+    The returned Game has a LazyGameRounds sequence as `gameRounds`, which reads each round from disk on access.
+    If the header and DemoIndex of an earlier scan are given, the file is not scanned again."""
+    if scanned_demo is not None:
+        header, index = dict(scanned_demo[0]), scanned_demo[1]
+    else:
+        header, index = scan_demo(file_path, on_round, do_validate)
+    header["gameRounds"] = []
+    if do_validate:
+        header = sanitize_game_header(header, file_path)
+        if logger:
+            logger.info(f"Validating demo header against Game schema for file {file_path.name}")
+        try:
+            header = game_validator.validate_python(header)
+        except ValidationError as e:
+            print(e)
+            raise RuntimeError("Schema validation failed during demo load.") from None
+    elif logger:
+        logger.warning(
+            "Demo data was not validated against the Game schema on load. This may cause issues later on."
+        )
+    else:
+        print(
+            "Demo data was not validated against the Game schema on load. This may cause issues later on."
+        )
+    header["gameRounds"] = LazyGameRounds(file_path, index, do_validate)
+    return header
+
+
 class DataManager:
-    """Wrapper around an awpy-generated Game object. Function calls replace direct dictionary access, including some error handling."""
+    """Wrapper around an awpy-generated Game object. Function calls replace direct dictionary access, including some error handling.
+
+    If `columnar` is True, the frames of every round are packed into a FrameStore on load and the nested frame
+    dictionaries are dropped. All accessors keep working (frames are rebuilt on access), and the store can be used
+    directly for vectorized access to whole rounds (see `get_frame_store`).
+
+    If `lazy` is True, the demo file is streamed instead of loaded at once: only the byte offsets of the rounds are
+    kept, and rounds are read from disk when accessed (see `prefetch_round`). This bounds memory use to a few rounds.
+    A `scanned_demo` from `get_scanned_demo` of another lazily loaded DataManager of the same file skips the scan, e.g.
+    in worker processes that only read a single round.
+
+    If a `cache_dir` is given (or the DEMO_CACHE_DIR environment variable is set), the demo is converted into a binary
+    cache on first load (see `datamodel.demo_cache`) and memory-mapped from there on later loads, which skips the JSON
+    parse entirely. Cached demos always use the columnar backend. Opening with a `scanned_demo` never builds the cache.
+    """
 
     file_path: Path  # Path to the demo file being parsed by awpy
+    do_validate: bool  # Whether the demo was validated on load, which drops invalid frames
     data: Game
-
-    def __init__(self, file_path: Path, logger=None, do_validate: bool = True):
+    frame_store: FrameStore | None  # Columnar copy of all frames, built on load (columnar backend) or on first use
+
+    def __init__(
+        self,
+        file_path: Path,
+        logger=None,
+        do_validate: bool = True,
+        columnar: bool = False,
+        lazy: bool = False,
+        cache_dir: Path | None = None,
+        scanned_demo: tuple[dict, DemoIndex] | None = None,
+    ):
         self.file_path = file_path
         self.logger = logger
-        self.data = _load_game_data(file_path, do_validate, logger)
+        self.do_validate = do_validate
+        self.frame_store = None
         self.mappingT = None
         self.mappingCT = None
+        if cache_dir is None and os.environ.get("DEMO_CACHE_DIR"):
+            cache_dir = Path(os.environ["DEMO_CACHE_DIR"])
+        if cache_dir is not None:
+            self._load_cached(Path(cache_dir), do_validate, lazy, scanned_demo)
+            return
+        if lazy:
+            self.data = _load_game_data_lazy(file_path, do_validate, logger, scanned_demo=scanned_demo)
+        else:
+            self.data = _load_game_data(file_path, do_validate, logger)
+        if columnar:
+            self._use_frame_store(FrameStore.from_game_rounds(self._get_game_rounds()))
+
+    def _load_cached(
+        self, cache_dir: Path, do_validate: bool, lazy: bool, scanned_demo: tuple[dict, DemoIndex] | None = None
+    ) -> None:
+        """Loads the demo from the binary cache, converting the JSON file into the cache first if needed.
+        With a `scanned_demo`, the cache is left to whoever scanned the demo: on a miss, the demo is only opened lazily
+        from the scan, so workers that read a single round never parse the whole demo or race to write its cache."""
+        cached = load_demo_cache(self.file_path, cache_dir, require_validated=do_validate, logger=self.logger)
+        if cached is None and scanned_demo is not None:
+            self.data = _load_game_data_lazy(self.file_path, do_validate, self.logger, scanned_demo=scanned_demo)
+            return
+        if cached is None:
+            if lazy:
+                data = _load_game_data_lazy(self.file_path, do_validate, self.logger)
+            else:
+                data = _load_game_data(self.file_path, do_validate, self.logger)
+            cached = build_demo_cache(self.file_path, cache_dir, data, do_validate, self.logger)
+        self.data, store = cached
+        self._use_frame_store(store)
+
+    def _use_frame_store(self, store: FrameStore) -> None:
+        """Replaces the frame lists of all rounds with views into the given FrameStore, so the dicts can be freed."""
+        self.frame_store = store
+        game_rounds = self._get_game_rounds()
+        if isinstance(game_rounds, LazyGameRounds):
+            # Lazily loaded rounds are re-read from disk, so their frames are swapped for views on every load
+            def attach_frames(round_index: int, game_round: GameRound) -> GameRound:
+                game_round["frames"] = ColumnarFrames(store, round_index)
+                return game_round
+
+            game_rounds.on_load = attach_frames
+            return
+        for round_index, game_round in enumerate(game_rounds):
+            if game_round["frames"] is not None:
+                game_round["frames"] = ColumnarFrames(store, round_index)
+
+    def prefetch_round(self, round_index: int) -> None:
+        """Starts reading the given round in the background when the demo is loaded lazily, so it is ready when needed. No-op otherwise."""
+        game_rounds = self._get_game_rounds()
+        if isinstance(game_rounds, LazyGameRounds):
+            game_rounds.prefetch(round_index)
+
+    def get_scanned_demo(self) -> tuple[dict, DemoIndex] | None:
+        """Returns the demo header (without rounds) and the DemoIndex of a lazily loaded demo, to open the same demo
+        elsewhere without scanning it again (see the `scanned_demo` argument). None if the demo is not loaded lazily."""
+        game_rounds = self._get_game_rounds()
+        if not isinstance(game_rounds, LazyGameRounds):
+            return None
+        return {key: value for key, value in self.data.items() if key != "gameRounds"}, game_rounds.index
+
+    def get_frame_store(self) -> FrameStore:
+        """Returns the columnar FrameStore for this demo. Without the columnar backend, it is built on first call (the frame dicts are kept)."""
+        if self.frame_store is None:
+            self.frame_store = FrameStore.from_game_rounds(self._get_game_rounds())
+        return self.frame_store
+
+    def get_round_frame_store(self, round_index: int) -> tuple[FrameStore, int]:
+        """Returns a FrameStore that holds the given round, and the index of the round in that store. For lazily
+        loaded demos without a store, only this round is packed, so the other rounds are not read from disk."""
+        if self.frame_store is None and isinstance(self._get_game_rounds(), LazyGameRounds):
+            return FrameStore.from_game_rounds([self.get_game_round(round_index)]), 0
+        return self.get_frame_store(), round_index
+
+    def get_round_player_values(
+        self, round_index: int, fields: str | list[str], team: SideType | None = None
+    ):
+        """Returns numeric player fields for all frames of the given round as a NumPy array shaped [frames, side, slot(, field)],
+        or [frames, slot(, field)] if a team is given. Slots follow the player order of each frame; empty slots are NaN."""
+        values = self.get_frame_store().get_player_values(fields, round_index)
+        if team is None:
+            return values
+        return values[:, SIDE_INDEX[team]]
+
+    def get_round_bomb_positions(self, round_index: int):
+        """Returns the bomb position for all frames of the given round as a NumPy array shaped [frames, xyz]."""
+        return self.get_frame_store().get_bomb_positions(round_index)
 
     def get_match_id(self) -> str | None:
         """Returns the match ID of the Game object, or None if no match ID is found."""
@@ -181,6 +292,12 @@ class DataManager:
 
     def get_rounds_frame_count(self) -> list[int]:
         """Returns a list of the number of frames in each round."""
+        if self.frame_store is not None:
+            return [self.frame_store.get_round_frame_count(i) for i in range(self.frame_store.round_count)]
+        game_rounds = self._get_game_rounds()
+        if isinstance(game_rounds, LazyGameRounds):
+            # Counted while scanning the file, so no round has to be read again (without the frames validation drops)
+            return list(game_rounds.index.round_frame_counts)
         return [len(self._get_frames(i)) for i in range(self.get_round_count())]
 
     def get_map_name(self) -> str:
@@ -461,17 +578,21 @@ class DataManager:
 
     def get_estimated_finish(self, start_time: float, processed_frames: int) -> str:
         """Returns an ETA string based on elapsed time and actual frame progress."""
-        total_frames = len(self.get_all_frames())
-        if total_frames == 0 or processed_frames == 0:
-            return "Calculating ETA..."
-
-        progress = processed_frames / total_frames
-        elapsed = time.time() - start_time
-        estimated_total_time = elapsed / progress
-        remaining_time = estimated_total_time - elapsed
-        eta = timedelta(seconds=max(0, int(remaining_time)))
-        finish_time = datetime.now() + eta
-        return f"Estimated finish: {finish_time.strftime('%H:%M')} (ETA: {str(eta)})"
+        return estimate_finish(start_time, processed_frames, sum(self.get_rounds_frame_count()))
+
+
+def estimate_finish(start_time: float, processed_frames: int, total_frames: int) -> str:
+    """Returns an ETA string based on elapsed time and frame progress."""
+    if total_frames == 0 or processed_frames == 0:
+        return "Calculating ETA..."
+
+    progress = processed_frames / total_frames
+    elapsed = time.time() - start_time
+    estimated_total_time = elapsed / progress
+    remaining_time = estimated_total_time - elapsed
+    eta = timedelta(seconds=max(0, int(remaining_time)))
+    finish_time = datetime.now() + eta
+    return f"Estimated finish: {finish_time.strftime('%H:%M')} (ETA: {str(eta)})"
 
 
 def get_map_name_from_demo_file_without_parsing(file_path: Path) -> str | None:
@@ -0,0 +1,145 @@
+"""Binary cache of parsed demos, so every tool only pays for the JSON parse of a demo once.
+
+A cached demo is a directory `<cache_dir>/<demo file stem>-<path hash>/` containing one `.npy` file per FrameStore array (opened
+memory-mapped, so reopening a demo reads almost nothing from disk) and `meta.pkl`, which holds the demo data without
+frames, the string/object tables of the store, and a fingerprint of the source JSON. The cache is rebuilt automatically
+when the source file changes. The hash of the resolved demo path keeps demos with the same file name in different
+directories apart.
+"""
+
+import hashlib
+import os
+import pickle
+import shutil
+from collections.abc import Generator, Iterable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from awpy.types import Game, GameRound
+
+from datamodel.frame_store import STORE_ARRAYS, FrameStore
+
+# Bump when the layout of the cache or of the FrameStore changes, to invalidate all existing caches
+CACHE_FORMAT_VERSION = 1
+META_FILENAME = "meta.pkl"
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def get_demo_cache_dir(cache_dir: Path, file_path: Path) -> Path:
+    """Returns the directory in which the cache for the given demo file is stored."""
+    file_path = Path(file_path)
+    path_hash = hashlib.blake2b(str(file_path.resolve()).encode(), digest_size=8).hexdigest()
+    return cache_dir / f"{file_path.stem}-{path_hash}"
+
+
+def hash_demo_file(file_path: Path) -> str:
+    """Returns a hash of the contents of a demo file."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as file:
+        while chunk := file.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_fingerprint(file_path: Path, content_hash: str | None = None) -> dict[str, Any]:
+    stat = os.stat(file_path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": content_hash if content_hash is not None else hash_demo_file(file_path),
+    }
+
+
+def _is_source_unchanged(file_path: Path, meta_path: Path, meta: dict) -> bool:
+    """Checks the stored fingerprint against the source file. Size and mtime are compared first, and the file is only
+    hashed if they differ (e.g. after copying the demo), in which case the stored fingerprint is refreshed."""
+    source = meta["source"]
+    stat = os.stat(file_path)
+    if stat.st_size != source["size"]:
+        return False
+    if stat.st_mtime_ns == source["mtime_ns"]:
+        return True
+    if hash_demo_file(file_path) != source["hash"]:
+        return False
+    meta["source"] = _source_fingerprint(file_path, source["hash"])
+    with open(meta_path, "wb") as f:
+        pickle.dump(meta, f)
+    return True
+
+
+def load_demo_cache(
+    file_path: Path, cache_dir: Path, require_validated: bool = False, logger=None
+) -> tuple[Game, FrameStore] | None:
+    """Opens the cached demo data and memory-mapped FrameStore for the given demo file.
+    Returns None if there is no cache, it is outdated, or it was built without validation while `require_validated` is set."""
+    demo_cache_dir = get_demo_cache_dir(cache_dir, file_path)
+    meta_path = demo_cache_dir / META_FILENAME
+    if not meta_path.exists():
+        return None
+    try:
+        with open(meta_path, "rb") as f:
+            meta = pickle.load(f)
+        if meta.get("version") != CACHE_FORMAT_VERSION:
+            return None
+        if require_validated and not meta["validated"]:
+            return None
+        if not _is_source_unchanged(file_path, meta_path, meta):
+            if logger:
+                logger.info(f"Demo cache for {Path(file_path).name} is outdated and will be rebuilt.")
+            return None
+        arrays = {
+            name: np.load(demo_cache_dir / f"{name}.npy", mmap_mode="r") for name in STORE_ARRAYS
+        }
+    except (OSError, EOFError, ValueError, KeyError, pickle.UnpicklingError) as e:
+        if logger:
+            logger.warning(f"Could not read demo cache for {Path(file_path).name}, rebuilding it: {e}")
+        return None
+
+    store = FrameStore(**arrays, strings=meta["strings"], objects=meta["objects"])
+    return meta["data"], store
+
+
+def _strip_frames(game_rounds: Iterable[GameRound], stripped: list[GameRound]) -> Generator[GameRound, None, None]:
+    """Yields the given rounds and collects shallow copies of them without frames (None stays None) in `stripped`."""
+    for game_round in game_rounds:
+        yield game_round
+        stripped.append({**game_round, "frames": None if game_round["frames"] is None else []})
+
+
+def build_demo_cache(
+    file_path: Path, cache_dir: Path, data: Game, validated: bool, logger=None
+) -> tuple[Game, FrameStore]:
+    """Packs the frames of the given demo data into a FrameStore and writes both to the cache.
+    The rounds are only iterated once, so `data["gameRounds"]` can be a lazily loaded sequence.
+    Returns the demo data without frames and the store, as `load_demo_cache` would."""
+    stripped_rounds: list[GameRound] = []
+    store = FrameStore.from_game_rounds(_strip_frames(data["gameRounds"] or [], stripped_rounds))
+    stripped_data = {**data, "gameRounds": stripped_rounds if data["gameRounds"] is not None else None}
+
+    demo_cache_dir = get_demo_cache_dir(cache_dir, file_path)
+    tmp_dir = demo_cache_dir.with_name(f"{demo_cache_dir.name}.tmp-{os.getpid()}")
+    try:
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        for name in STORE_ARRAYS:
+            np.save(tmp_dir / f"{name}.npy", getattr(store, name))
+        meta = {
+            "version": CACHE_FORMAT_VERSION,
+            "source": _source_fingerprint(file_path),
+            "validated": validated,
+            "data": stripped_data,
+            "strings": store.strings,
+            "objects": store.objects,
+        }
+        with open(tmp_dir / META_FILENAME, "wb") as f:
+            pickle.dump(meta, f)
+        # Swap the complete cache in at once, so concurrent readers never see a partially written cache
+        shutil.rmtree(demo_cache_dir, ignore_errors=True)
+        os.replace(tmp_dir, demo_cache_dir)
+        if logger:
+            logger.info(f"Wrote demo cache for {Path(file_path).name} to {demo_cache_dir}")
+    except OSError as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if logger:
+            logger.warning(f"Could not write demo cache for {Path(file_path).name}: {e}")
+    return stripped_data, store
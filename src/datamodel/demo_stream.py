@@ -0,0 +1,340 @@
+"""Incremental parsing of (potentially very large) awpy demo JSON files.
+
+`json.load` needs the whole document in memory at once, which for a multi-hundred-MB ESTA demo dominates the peak
+memory of every tool. The functions here walk the top-level object and decode the entries of `gameRounds` one at a
+time, so only a single round (plus a read buffer) is in memory. While doing so, they record the byte range of every
+round in the file, which lets `LazyGameRounds` re-read a single round later with one seek.
+"""
+
+import codecs
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Generator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from awpy.types import GameRound
+from pydantic import TypeAdapter, ValidationError
+
+_CHUNK_SIZE = 1 << 20  # Initial read size in bytes, grows for values larger than the buffer
+_WHITESPACE = " \t\n\r"
+MANIFEST_SUFFIX = ".index"  # Not .json, so manifests next to the demos are not mistaken for demos
+
+# For validating a single round of JSON data as a GameRound object
+round_validator = TypeAdapter(GameRound)
+
+
+def is_valid_player(p: dict) -> bool:
+    required_fields = [
+        "eyeX",
+        "eyeY",
+        "eyeZ",
+        "flashGrenades",
+        "smokeGrenades",
+        "heGrenades",
+        "fireGrenades",
+        "lastPlaceName",
+        "isBot",
+    ]
+    return all(field in p for field in required_fields)
+
+
+def is_valid_frame(frame: dict) -> bool:
+    return (
+        isinstance(frame.get("frameID"), int)
+        and isinstance(frame.get("globalFrameID"), int)
+        and isinstance(frame.get("clockTime"), str)
+    )
+
+
+def sanitize_game_header(game_data: dict, file_path: Path) -> dict:
+    """Fills in root-level fields that older demos are missing, so the Game schema validates."""
+    # Drop root-level fields if missing
+    required_root_keys = ["chatMessages", "parserParameters"]
+    for key in required_root_keys:
+        game_data.setdefault(key, {} if key == "parserParameters" else [])
+
+    # Ensure required nested parser fields
+    game_data["parserParameters"].setdefault("parseChat", False)
+
+    # Add missing matchID from file name if not present
+    game_data.setdefault("matchID", file_path.stem)
+    return game_data
+
+
+def sanitize_game_round(rnd: dict) -> dict:
+    """Drops invalid frames and players from a round and fills in missing kill fields, so the GameRound schema validates."""
+    if "frames" in rnd:
+        rnd["frames"] = [frame for frame in rnd["frames"] if is_valid_frame(frame)]
+        for frame in rnd["frames"]:
+            for side in ("ct", "t"):
+                if side in frame and "players" in frame[side]:
+                    frame[side]["players"] = [
+                        p for p in frame[side]["players"] if is_valid_player(p)
+                    ]
+    if "kills" in rnd:
+        for kill in rnd["kills"]:
+            kill.setdefault("playerTradedSide", None)
+    return rnd
+
+
+def load_game_round(raw_round: dict, do_validate: bool) -> GameRound:
+    """Sanitizes and validates a single decoded round. Raises a RuntimeError if the round does not match the schema."""
+    if not do_validate:
+        return raw_round
+    try:
+        return round_validator.validate_python(sanitize_game_round(raw_round))
+    except ValidationError as e:
+        print(e)
+        raise RuntimeError("Schema validation failed during demo load.") from None
+
+
+@dataclass
+class DemoIndex:
+    """Byte ranges and frame counts of all rounds in a demo file, as found by `scan_demo`."""
+
+    round_byte_ranges: list[tuple[int, int]] = field(default_factory=list)  # (start, end) of each round in the file
+    # Number of frames in each round, without the frames that sanitizing drops if the demo is validated
+    round_frame_counts: list[int] = field(default_factory=list)
+
+    @property
+    def round_count(self) -> int:
+        return len(self.round_byte_ranges)
+
+
+class _JsonStream:
+    """Reads a JSON document from a binary file piece by piece, tracking the byte offset of the current position."""
+
+    def __init__(self, file: BinaryIO):
+        self._file = file
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._byte_offset = 0  # Byte offset of self._buffer[0] in the file
+        self._eof = False
+
+    @property
+    def byte_position(self) -> int:
+        return self._byte_offset + len(self._buffer[: self._pos].encode("utf-8"))
+
+    def _read_more(self) -> None:
+        # Drop what has already been consumed so the buffer only ever holds the current value
+        self._byte_offset = self.byte_position
+        self._buffer = self._buffer[self._pos :]
+        self._pos = 0
+        chunk = self._file.read(max(_CHUNK_SIZE, 2 * len(self._buffer)))
+        self._eof = not chunk
+        self._buffer += self._decoder.decode(chunk, final=self._eof)
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character without consuming it ("" at the end of the file)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer) or self._eof:
+                return self._buffer[self._pos : self._pos + 1]
+            self._read_more()
+
+    def expect(self, chars: str) -> str:
+        """Consumes the next non-whitespace character, which must be one of the given characters."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Malformed demo JSON: expected one of {chars!r} at byte {self.byte_position}, found {char!r}")
+        self._pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Decodes the next complete JSON value, reading as much of the file as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+                # A number at the end of the buffer might continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._read_more()
+
+
+def _iter_top_level(file: BinaryIO) -> Generator[tuple[str, Any, tuple[int, int] | None], None, None]:
+    """Yields the entries of the top-level demo object as (key, value, None), except for `gameRounds`, whose rounds
+    are yielded one at a time as ("gameRounds", raw_round, (start_byte, end_byte))."""
+    stream = _JsonStream(file)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == "gameRounds" and stream.peek() == "[":
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.expect("]")
+            else:
+                while True:
+                    stream.peek()
+                    start = stream.byte_position
+                    raw_round = stream.value()
+                    yield key, raw_round, (start, stream.byte_position)
+                    if stream.expect(",]") == "]":
+                        break
+        else:
+            yield key, stream.value(), None
+        if stream.expect(",}") == "}":
+            return
+
+
+def scan_demo(
+    file_path: Path, on_round: Callable[[int, dict], None] | None = None, do_validate: bool = False
+) -> tuple[dict, DemoIndex]:
+    """Streams through a demo file once and returns its top-level fields (without `gameRounds`) and a DemoIndex.
+    If given, `on_round(round_index, raw_round)` is called with every decoded (unsanitized) round, which is dropped afterwards.
+    If `do_validate` is True, the frame counts leave out the invalid frames that `sanitize_game_round` drops, so they
+    match the rounds read with validation."""
+    header: dict[str, Any] = {}
+    index = DemoIndex()
+    with open(file_path, "rb") as file:
+        for key, value, byte_range in _iter_top_level(file):
+            if byte_range is None:
+                header[key] = value
+                continue
+            index.round_byte_ranges.append(byte_range)
+            frames = value.get("frames") or []
+            index.round_frame_counts.append(
+                sum(1 for frame in frames if is_valid_frame(frame)) if do_validate else len(frames)
+            )
+            if on_round is not None:
+                on_round(index.round_count - 1, value)
+    return header, index
+
+
+def get_demo_manifest_path(file_path: Path, manifest_dir: Path | None = None) -> Path:
+    """Returns the path of the sidecar manifest of a demo file, next to the demo unless a directory is given."""
+    file_path = Path(file_path)
+    return (Path(manifest_dir) if manifest_dir else file_path.parent) / f"{file_path.name}{MANIFEST_SUFFIX}"
+
+
+def read_demo_manifest(file_path: Path, manifest_dir: Path | None = None) -> list[int] | None:
+    """Returns the per-round frame counts stored in the sidecar manifest of a demo file, without parsing the demo.
+    Returns None if there is no manifest or the demo was modified after the manifest was written."""
+    try:
+        with open(get_demo_manifest_path(file_path, manifest_dir)) as f:
+            manifest = json.load(f)
+        stat = os.stat(file_path)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("size") != stat.st_size or manifest.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return manifest.get("round_frame_counts")
+
+
+def write_demo_manifest(file_path: Path, round_frame_counts: list[int], manifest_dir: Path | None = None) -> bool:
+    """Writes the per-round frame counts of a demo file to its sidecar manifest. Returns False if it cannot be written."""
+    try:
+        stat = os.stat(file_path)
+        manifest = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "round_frame_counts": [int(count) for count in round_frame_counts],
+        }
+        with open(get_demo_manifest_path(file_path, manifest_dir), "w") as f:
+            json.dump(manifest, f)
+    except OSError:
+        return False
+    return True
+
+
+def iter_game_rounds(file_path: Path, do_validate: bool = True) -> Generator[GameRound, None, None]:
+    """Yields the rounds of a demo file one at a time, without ever holding more than one round in memory."""
+    with open(file_path, "rb") as file:
+        for _key, value, byte_range in _iter_top_level(file):
+            if byte_range is not None:
+                yield load_game_round(value, do_validate)
+
+
+def read_game_round(file_path: Path, byte_range: tuple[int, int], do_validate: bool = True) -> GameRound:
+    """Reads a single round from a demo file, given its byte range from a DemoIndex."""
+    start, end = byte_range
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        raw_round = json.loads(file.read(end - start))
+    return load_game_round(raw_round, do_validate)
+
+
+class LazyGameRounds(Sequence):
+    """A read-only list of the rounds in a demo file that loads each round from disk on access.
+
+    Only the `cache_size` most recently used rounds are kept in memory. `prefetch` starts loading a round on a
+    background thread, so reading the next round can overlap with processing the current one.
+    """
+
+    def __init__(
+        self,
+        file_path: Path,
+        index: DemoIndex,
+        do_validate: bool = True,
+        cache_size: int = 2,
+        on_load: Callable[[int, GameRound], GameRound] | None = None,
+    ):
+        self._file_path = file_path
+        self._index = index
+        self._do_validate = do_validate
+        self._cache_size = max(1, cache_size)
+        self._cache: OrderedDict[int, GameRound] = OrderedDict()
+        self._pending: dict[int, Future] = {}
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.on_load = on_load  # Hook to post-process a round after it is read (e.g. to attach columnar frames)
+
+    def __len__(self) -> int:
+        return self._index.round_count
+
+    @property
+    def index(self) -> DemoIndex:
+        return self._index
+
+    def _load(self, round_index: int) -> GameRound:
+        game_round = read_game_round(self._file_path, self._index.round_byte_ranges[round_index], self._do_validate)
+        if self.on_load is not None:
+            game_round = self.on_load(round_index, game_round)
+        return game_round
+
+    def __getitem__(self, index: int | slice) -> GameRound | list[GameRound]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(f"Round index {index} out of range")
+
+        with self._lock:
+            if index in self._cache:
+                self._cache.move_to_end(index)
+                return self._cache[index]
+            pending = self._pending.pop(index, None)
+
+        game_round = pending.result() if pending is not None else self._load(index)
+        with self._lock:
+            self._cache[index] = game_round
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return game_round
+
+    def prefetch(self, round_index: int) -> None:
+        """Starts loading the given round in the background, if it is not already loaded or loading."""
+        if round_index < 0 or round_index >= len(self):
+            return
+        with self._lock:
+            if round_index in self._cache or round_index in self._pending:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="demo-prefetch")
+            self._pending[round_index] = self._executor.submit(self._load, round_index)
@@ -0,0 +1,483 @@
+from collections.abc import Iterable, Sequence
+from typing import Any, overload
+
+import numpy as np
+from awpy.types import GameFrame, GameRound
+
+from datamodel.side_type import SideType
+
+# Order of the side axis in all player and team arrays, i.e. [frames, side, slot, field]
+SIDES = (SideType.CT, SideType.T)
+SIDE_INDEX = {side: index for index, side in enumerate(SIDES)}
+
+# Number of player slots per side. A frame can (rarely) contain more players than this, in which case the store grows.
+DEFAULT_PLAYER_SLOTS = 5
+
+# Per-player fields, in the order of awpy's PlayerInfo. Each field is stored as one of the kinds below:
+#   "float"/"int"/"bool": numeric, packed into one float64 array (missing values are NaN)
+#   "str": interned string, stored as an int32 code into the string table (missing values are -1)
+#   "object": interned python object (lists of dicts), stored as an int32 code into the object table
+PLAYER_KEYS: tuple[tuple[str, str], ...] = (
+    ("steamID", "steamid"),
+    ("name", "str"),
+    ("team", "str"),
+    ("side", "str"),
+    ("x", "float"),
+    ("y", "float"),
+    ("z", "float"),
+    ("eyeX", "float"),
+    ("eyeY", "float"),
+    ("eyeZ", "float"),
+    ("velocityX", "float"),
+    ("velocityY", "float"),
+    ("velocityZ", "float"),
+    ("viewX", "float"),
+    ("viewY", "float"),
+    ("hp", "int"),
+    ("armor", "int"),
+    ("activeWeapon", "str"),
+    ("flashGrenades", "int"),
+    ("smokeGrenades", "int"),
+    ("heGrenades", "int"),
+    ("fireGrenades", "int"),
+    ("totalUtility", "int"),
+    ("lastPlaceName", "str"),
+    ("isAlive", "bool"),
+    ("isBot", "bool"),
+    ("isBlinded", "bool"),
+    ("isAirborne", "bool"),
+    ("isDucking", "bool"),
+    ("isDuckingInProgress", "bool"),
+    ("isUnDuckingInProgress", "bool"),
+    ("isDefusing", "bool"),
+    ("isPlanting", "bool"),
+    ("isReloading", "bool"),
+    ("isInBombZone", "bool"),
+    ("isInBuyZone", "bool"),
+    ("isStanding", "bool"),
+    ("isScoped", "bool"),
+    ("isWalking", "bool"),
+    ("isUnknown", "bool"),
+    ("inventory", "object"),
+    ("spotters", "object"),
+    ("equipmentValue", "int"),
+    ("equipmentValueFreezetimeEnd", "int"),
+    ("equipmentValueRoundStart", "int"),
+    ("cash", "int"),
+    ("cashSpendThisRound", "int"),
+    ("cashSpendTotal", "int"),
+    ("hasHelmet", "bool"),
+    ("hasDefuse", "bool"),
+    ("hasBomb", "bool"),
+    ("ping", "int"),
+    ("zoomLevel", "int"),
+)
+
+# Per-team fields (everything in TeamFrameInfo except the player list)
+TEAM_KEYS: tuple[tuple[str, str], ...] = (
+    ("side", "str"),
+    ("teamName", "str"),
+    ("teamEqVal", "int"),
+    ("alivePlayers", "int"),
+    ("totalUtility", "int"),
+)
+
+# Per-frame fields (everything in GameFrame except the two teams and the bomb)
+FRAME_KEYS: tuple[tuple[str, str], ...] = (
+    ("frameID", "int"),
+    ("globalFrameID", "int"),
+    ("isKillFrame", "bool"),
+    ("tick", "int"),
+    ("seconds", "float"),
+    ("clockTime", "str"),
+    ("bombPlanted", "bool"),
+    ("bombsite", "str"),
+    ("projectiles", "object"),
+    ("smokes", "object"),
+    ("fires", "object"),
+)
+
+BOMB_KEYS = ("x", "y", "z")
+
+_NUMERIC_KINDS = ("float", "int", "bool")
+
+# Names of the NumPy arrays of a FrameStore, in the order they are declared on the class
+STORE_ARRAYS = (
+    "round_offsets",
+    "player_counts",
+    "player_numeric",
+    "player_strings",
+    "player_objects",
+    "steam_ids",
+    "team_numeric",
+    "team_strings",
+    "frame_numeric",
+    "frame_strings",
+    "frame_objects",
+    "bomb_positions",
+    "has_bomb",
+)
+
+
+def _columns(keys: tuple[tuple[str, str], ...], kinds: tuple[str, ...]) -> dict[str, int]:
+    """Maps each key of the given kinds to its column index in the packed array for those kinds."""
+    return {key: index for index, key in enumerate(key for key, kind in keys if kind in kinds)}
+
+
+PLAYER_NUMERIC_COLUMNS = _columns(PLAYER_KEYS, _NUMERIC_KINDS)
+PLAYER_STRING_COLUMNS = _columns(PLAYER_KEYS, ("str",))
+PLAYER_OBJECT_COLUMNS = _columns(PLAYER_KEYS, ("object",))
+TEAM_NUMERIC_COLUMNS = _columns(TEAM_KEYS, _NUMERIC_KINDS)
+TEAM_STRING_COLUMNS = _columns(TEAM_KEYS, ("str",))
+FRAME_NUMERIC_COLUMNS = _columns(FRAME_KEYS, _NUMERIC_KINDS)
+FRAME_STRING_COLUMNS = _columns(FRAME_KEYS, ("str",))
+FRAME_OBJECT_COLUMNS = _columns(FRAME_KEYS, ("object",))
+
+
+class _Interner:
+    """Assigns stable integer codes to repeated values, so each distinct value is only kept in memory once."""
+
+    def __init__(self, values: list | None = None, key=None):
+        self.values = [] if values is None else values
+        self._key = key or (lambda value: value)
+        self._codes = {self._key(value): code for code, value in enumerate(self.values)}
+
+    def code(self, value) -> int:
+        key = self._key(value)
+        code = self._codes.get(key)
+        if code is None:
+            code = len(self.values)
+            self._codes[key] = code
+            self.values.append(value)
+        return code
+
+
+def _decode_numeric(value: float, kind: str) -> Any:
+    """Converts a packed float64 value back into the python type of the original field."""
+    if np.isnan(value):
+        return None
+    if kind == "int":
+        return int(value)
+    if kind == "bool":
+        return bool(value)
+    return float(value)
+
+
+class FrameStore:
+    """Columnar storage for the frame data of a whole demo.
+
+    All frames of all rounds are stacked along the first axis of every array, and `round_offsets` marks where each
+    round starts (round `r` spans frames `round_offsets[r]:round_offsets[r + 1]`). Player data is shaped
+    `[frames, side, slot, field]` (see `SIDES`), with slots in the same order as the players in the original frame.
+    Empty slots have a player count below the slot index, NaN numeric values, and -1 codes.
+    """
+
+    round_offsets: np.ndarray  # int64 [rounds + 1]
+    player_counts: np.ndarray  # int8 [frames, side]
+    player_numeric: np.ndarray  # float64 [frames, side, slot, numeric field]
+    player_strings: np.ndarray  # int32 [frames, side, slot, string field]
+    player_objects: np.ndarray  # int32 [frames, side, slot, object field]
+    steam_ids: np.ndarray  # int64 [frames, side, slot]
+    team_numeric: np.ndarray  # float64 [frames, side, numeric field]
+    team_strings: np.ndarray  # int32 [frames, side, string field]
+    frame_numeric: np.ndarray  # float64 [frames, numeric field]
+    frame_strings: np.ndarray  # int32 [frames, string field]
+    frame_objects: np.ndarray  # int32 [frames, object field]
+    bomb_positions: np.ndarray  # float64 [frames, 3]
+    has_bomb: np.ndarray  # bool [frames]
+    strings: list[str]
+    objects: list[Any]
+
+    def __init__(self, **arrays):
+        for name, value in arrays.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def from_game_rounds(cls, game_rounds: Iterable[GameRound]) -> "FrameStore":
+        """Packs the frames of the given rounds into a FrameStore. Rounds without frames are stored as empty rounds."""
+        strings = _Interner()
+        objects = _Interner(key=repr)
+
+        round_offsets = [0]
+        chunks: list[dict[str, np.ndarray]] = []
+        slots = DEFAULT_PLAYER_SLOTS
+        for game_round in game_rounds:
+            frames = game_round["frames"] or []
+            slots = max(
+                slots,
+                max(
+                    (
+                        len(frame[side.value].get("players") or [])
+                        for frame in frames
+                        for side in SIDES
+                        if frame.get(side.value)
+                    ),
+                    default=0,
+                ),
+            )
+            chunks.append(cls._pack_frames(frames, slots, strings, objects))
+            round_offsets.append(round_offsets[-1] + len(frames))
+
+        # Rounds packed before a round with more players than usual have fewer slots, pad them
+        def concat(name: str, fill) -> np.ndarray:
+            parts = []
+            for chunk in chunks:
+                part = chunk[name]
+                if part.ndim >= 3 and part.shape[2] < slots:
+                    pad = [(0, 0)] * part.ndim
+                    pad[2] = (0, slots - part.shape[2])
+                    part = np.pad(part, pad, constant_values=fill)
+                parts.append(part)
+            return np.concatenate(parts) if parts else cls._pack_frames([], slots, strings, objects)[name]
+
+        return cls(
+            round_offsets=np.asarray(round_offsets, dtype=np.int64),
+            player_counts=concat("player_counts", 0),
+            player_numeric=concat("player_numeric", np.nan),
+            player_strings=concat("player_strings", -1),
+            player_objects=concat("player_objects", -1),
+            steam_ids=concat("steam_ids", 0),
+            team_numeric=concat("team_numeric", np.nan),
+            team_strings=concat("team_strings", -1),
+            frame_numeric=concat("frame_numeric", np.nan),
+            frame_strings=concat("frame_strings", -1),
+            frame_objects=concat("frame_objects", -1),
+            bomb_positions=concat("bomb_positions", np.nan),
+            has_bomb=concat("has_bomb", False),
+            strings=strings.values,
+            objects=objects.values,
+        )
+
+    @staticmethod
+    def _pack_frames(
+        frames: Sequence[GameFrame], slots: int, strings: _Interner, objects: _Interner
+    ) -> dict[str, np.ndarray]:
+        """Packs a list of frames into arrays with the given number of player slots."""
+        n = len(frames)
+        sides = len(SIDES)
+        packed = {
+            "player_counts": np.zeros((n, sides), dtype=np.int8),
+            "player_numeric": np.full((n, sides, slots, len(PLAYER_NUMERIC_COLUMNS)), np.nan),
+            "player_strings": np.full((n, sides, slots, len(PLAYER_STRING_COLUMNS)), -1, dtype=np.int32),
+            "player_objects": np.full((n, sides, slots, len(PLAYER_OBJECT_COLUMNS)), -1, dtype=np.int32),
+            "steam_ids": np.zeros((n, sides, slots), dtype=np.int64),
+            "team_numeric": np.full((n, sides, len(TEAM_NUMERIC_COLUMNS)), np.nan),
+            "team_strings": np.full((n, sides, len(TEAM_STRING_COLUMNS)), -1, dtype=np.int32),
+            "frame_numeric": np.full((n, len(FRAME_NUMERIC_COLUMNS)), np.nan),
+            "frame_strings": np.full((n, len(FRAME_STRING_COLUMNS)), -1, dtype=np.int32),
+            "frame_objects": np.full((n, len(FRAME_OBJECT_COLUMNS)), -1, dtype=np.int32),
+            "bomb_positions": np.full((n, len(BOMB_KEYS)), np.nan),
+            "has_bomb": np.zeros(n, dtype=bool),
+        }
+
+        for frame_index, frame in enumerate(frames):
+            _pack_dict(frame, FRAME_KEYS, (frame_index,), packed, "frame", strings, objects)
+            bomb = frame.get("bomb")
+            if bomb is not None:
+                packed["has_bomb"][frame_index] = True
+                packed["bomb_positions"][frame_index] = [
+                    np.nan if bomb.get(key) is None else bomb[key] for key in BOMB_KEYS
+                ]
+            for side_index, side in enumerate(SIDES):
+                team = frame.get(side.value)
+                if team is None:
+                    continue
+                _pack_dict(team, TEAM_KEYS, (frame_index, side_index), packed, "team", strings, objects)
+                players = team.get("players") or []
+                packed["player_counts"][frame_index, side_index] = len(players)
+                for slot, player in enumerate(players):
+                    index = (frame_index, side_index, slot)
+                    _pack_dict(player, PLAYER_KEYS, index, packed, "player", strings, objects)
+                    if player.get("steamID") is not None:
+                        packed["steam_ids"][index] = player["steamID"]
+        return packed
+
+    @property
+    def round_count(self) -> int:
+        """The number of rounds in the store."""
+        return len(self.round_offsets) - 1
+
+    @property
+    def frame_count(self) -> int:
+        """The total number of frames in the store."""
+        return int(self.round_offsets[-1])
+
+    @property
+    def slot_count(self) -> int:
+        """The number of player slots per side."""
+        return self.player_numeric.shape[2]
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the numeric arrays of the store (excluding the string and object tables)."""
+        return sum(getattr(self, name).nbytes for name in STORE_ARRAYS)
+
+    def round_slice(self, round_index: int) -> slice:
+        """Returns the slice of the frame axis that belongs to the given round. If the index is out of bounds, raises a ValueError."""
+        if round_index < 0 or round_index >= self.round_count:
+            raise ValueError(
+                f"Round index {round_index} out of bounds (max index is {self.round_count - 1})"
+            )
+        return slice(int(self.round_offsets[round_index]), int(self.round_offsets[round_index + 1]))
+
+    def get_round_frame_count(self, round_index: int) -> int:
+        """Returns the number of frames in the given round."""
+        round_slice = self.round_slice(round_index)
+        return round_slice.stop - round_slice.start
+
+    def _frames(self, round_index: int | None) -> slice:
+        return slice(None) if round_index is None else self.round_slice(round_index)
+
+    def get_player_values(self, fields: str | Sequence[str], round_index: int | None = None) -> np.ndarray:
+        """Returns numeric player fields as an array shaped [frames, side, slot] for a single field or
+        [frames, side, slot, field] for a list of fields. Booleans are returned as 0.0/1.0, empty slots as NaN."""
+        frames = self._frames(round_index)
+        if isinstance(fields, str):
+            return self.player_numeric[frames, :, :, PLAYER_NUMERIC_COLUMNS[fields]]
+        return self.player_numeric[frames][..., [PLAYER_NUMERIC_COLUMNS[field] for field in fields]]
+
+    def get_player_positions(self, round_index: int | None = None) -> np.ndarray:
+        """Returns the player positions as an array shaped [frames, side, slot, xyz]."""
+        return self.get_player_values(("x", "y", "z"), round_index)
+
+    def get_player_strings(self, field: str, round_index: int | None = None) -> np.ndarray:
+        """Returns a string player field (e.g. "name") as an object array shaped [frames, side, slot]. Empty slots are None."""
+        codes = self.player_strings[self._frames(round_index), :, :, PLAYER_STRING_COLUMNS[field]]
+        return self._decode_strings(codes)
+
+    def get_player_counts(self, round_index: int | None = None) -> np.ndarray:
+        """Returns the number of players per side as an array shaped [frames, side]."""
+        return self.player_counts[self._frames(round_index)]
+
+    def get_team_values(self, field: str, round_index: int | None = None) -> np.ndarray:
+        """Returns a numeric team field (e.g. "teamEqVal") as an array shaped [frames, side]."""
+        return self.team_numeric[self._frames(round_index), :, TEAM_NUMERIC_COLUMNS[field]]
+
+    def get_frame_values(self, field: str, round_index: int | None = None) -> np.ndarray:
+        """Returns a numeric frame field (e.g. "tick" or "seconds") as an array shaped [frames]."""
+        return self.frame_numeric[self._frames(round_index), FRAME_NUMERIC_COLUMNS[field]]
+
+    def get_bomb_positions(self, round_index: int | None = None) -> np.ndarray:
+        """Returns the bomb positions as an array shaped [frames, xyz]."""
+        return self.bomb_positions[self._frames(round_index)]
+
+    def _decode_strings(self, codes: np.ndarray) -> np.ndarray:
+        table = np.asarray(self.strings + [None], dtype=object)
+        return table[codes]  # -1 picks the trailing None
+
+    def frame(self, frame_index: int) -> GameFrame:
+        """Rebuilds the GameFrame dictionary for the given global frame index (see `round_offsets`)."""
+        frame: dict[str, Any] = {}
+        _unpack_dict(frame, FRAME_KEYS, self.frame_numeric[frame_index], self.frame_strings[frame_index],
+                      self.frame_objects[frame_index], self)
+        for side_index, side in enumerate(SIDES):
+            team: dict[str, Any] = {}
+            _unpack_dict(team, TEAM_KEYS, self.team_numeric[frame_index, side_index],
+                         self.team_strings[frame_index, side_index], None, self)
+            players = []
+            for slot in range(self.player_counts[frame_index, side_index]):
+                player: dict[str, Any] = {}
+                _unpack_dict(
+                    player,
+                    PLAYER_KEYS,
+                    self.player_numeric[frame_index, side_index, slot],
+                    self.player_strings[frame_index, side_index, slot],
+                    self.player_objects[frame_index, side_index, slot],
+                    self,
+                    steam_id=int(self.steam_ids[frame_index, side_index, slot]),
+                )
+                players.append(player)
+            team["players"] = players
+            frame[side.value] = team
+        frame["bomb"] = (
+            {key: _decode_numeric(value, "float") for key, value in zip(BOMB_KEYS, self.bomb_positions[frame_index], strict=True)}
+            if self.has_bomb[frame_index]
+            else None
+        )
+        return frame
+
+
+def _pack_dict(
+    source: dict,
+    keys: tuple[tuple[str, str], ...],
+    index: tuple[int, ...],
+    packed: dict[str, np.ndarray],
+    prefix: str,
+    strings: _Interner,
+    objects: _Interner,
+) -> None:
+    """Writes the fields of a single player, team or frame dict into the packed arrays at the given index."""
+    numeric, string, obj = 0, 0, 0
+    for key, kind in keys:
+        value = source.get(key)
+        if kind in _NUMERIC_KINDS:
+            if value is not None:
+                packed[f"{prefix}_numeric"][index + (numeric,)] = value
+            numeric += 1
+        elif kind == "str":
+            if value is not None:
+                packed[f"{prefix}_strings"][index + (string,)] = strings.code(value)
+            string += 1
+        elif kind == "object":
+            if key in source:
+                packed[f"{prefix}_objects"][index + (obj,)] = objects.code(value)
+            obj += 1
+
+
+def _unpack_dict(
+    target: dict,
+    keys: tuple[tuple[str, str], ...],
+    numeric_row: np.ndarray,
+    string_row: np.ndarray,
+    object_row: np.ndarray | None,
+    store: FrameStore,
+    steam_id: int | None = None,
+) -> None:
+    """Fills the target dict with the fields of a single packed player, team or frame, in the original key order."""
+    numeric, string, obj = 0, 0, 0
+    for key, kind in keys:
+        if kind in _NUMERIC_KINDS:
+            target[key] = _decode_numeric(numeric_row[numeric], kind)
+            numeric += 1
+        elif kind == "str":
+            code = string_row[string]
+            target[key] = store.strings[code] if code >= 0 else None
+            string += 1
+        elif kind == "object":
+            code = object_row[obj]
+            if code >= 0:
+                target[key] = store.objects[code]
+            obj += 1
+        elif kind == "steamid":
+            target[key] = steam_id
+
+
+class ColumnarFrames(Sequence):
+    """A read-only list of the frames of one round, rebuilt from a FrameStore on access.
+
+    Replaces the `frames` list of a GameRound when the columnar backend is used, so code that indexes or iterates
+    `game_round["frames"]` keeps working. Every access returns a fresh dictionary; changes to it are not stored.
+    """
+
+    def __init__(self, store: FrameStore, round_index: int):
+        self._store = store
+        self._round_index = round_index
+        self._slice = store.round_slice(round_index)
+
+    def __len__(self) -> int:
+        return self._slice.stop - self._slice.start
+
+    @overload
+    def __getitem__(self, index: int) -> GameFrame: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[GameFrame]: ...
+
+    def __getitem__(self, index: int | slice) -> GameFrame | list[GameFrame]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(f"Frame index {index} out of range for round {self._round_index}")
+        return self._store.frame(self._slice.start + index)
@@ -0,0 +1,201 @@
+"""Columnar storage of the graphs of a round, as written by `create_graphs` with the `npz` output type.
+
+The pickle output stores every frame as nested dicts (`graph_data`, `nodes_data`, `edges_data` with tuple edges), so
+reading a round means rebuilding all of those objects. The npz output stores the same graphs as fixed-shape arrays
+in one compressed `.npz` file per round:
+
+- `nodes` [frames, nodes, F]: the node attributes, `node_keys` names the F columns and `node_kinds` their Python type
+  ("b", "i" or "f"). `node_mask` [frames, nodes] marks the nodes that exist in a frame.
+- `edges` [frames, E]: the `dist` of each edge in `edge_pairs` [E, 2] (source, target), NaN if the edge is missing.
+- `graph/<key>` [frames]: one column per graph-level attribute. `graph_mask/<key>` [frames] marks the frames in which
+  the attribute is not None, and is only stored for attributes that are None in some frame.
+
+`read_round_graphs` opens such a file without unpickling anything. `load_graph_file` reads both formats as lists of
+graph dicts, for code that works on the dict format.
+"""
+
+import pickle
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+GRAPH_FILE_SUFFIXES = (".pkl", ".npz")
+_GRAPH_PREFIX = "graph/"
+_GRAPH_MASK_PREFIX = "graph_mask/"
+_KIND_CASTS = {"b": bool, "i": int, "f": float}
+_ROUND_FILE_PATTERN = re.compile(r"graph-rounds-(\d+)\.\w+$")
+
+
+def _value_kind(value: Any) -> str:
+    if isinstance(value, bool | np.bool_):
+        return "b"
+    if isinstance(value, int | np.integer):
+        return "i"
+    return "f"
+
+
+def _graph_column(values: list[Any]) -> tuple[np.ndarray, np.ndarray | None]:
+    """Converts the values of a graph-level attribute to an array that can be stored without pickling. Returns the
+    column and the mask of the frames with a value, or None as mask if no value is None."""
+    present = np.array([value is not None for value in values], dtype=bool)
+    # missing values are filled with a present value, so they do not change the type of the column
+    fill = next((value for value in values if value is not None), "")
+    column = np.asarray([fill if value is None else value for value in values])
+    if column.dtype == object:
+        # mixed types, store as strings
+        column = np.array([str(value) for value in column])
+    return column, None if present.all() else present
+
+
+def write_round_graphs(
+    file_path: Path,
+    graphs: list[dict],
+    node_keys: tuple[str, ...],
+    node_count: int,
+    edge_pairs: list[tuple[int, int]],
+) -> None:
+    """Writes the graphs of a round (as created by `create_graphs.process_round`) to a compressed npz file.
+
+    Args:
+        file_path (Path): The file to write.
+        graphs (list[dict]): The graphs of the round, one per frame.
+        node_keys (tuple[str, ...]): The node attributes to store. Missing attributes are stored as 0.
+        node_count (int): The number of node slots per graph. Node IDs must be below this.
+        edge_pairs (list[tuple[int, int]]): All (source, target) edges a graph can have, in storage order.
+    """
+    frame_count = len(graphs)
+    edge_columns = {pair: col for col, pair in enumerate(edge_pairs)}
+    nodes = np.zeros((frame_count, node_count, len(node_keys)), dtype=np.float64)
+    node_mask = np.zeros((frame_count, node_count), dtype=bool)
+    edges = np.full((frame_count, len(edge_pairs)), np.nan, dtype=np.float64)
+    seen_kinds: list[set[str]] = [set() for _ in node_keys]
+    graph_keys: list[str] = []
+    for graph in graphs:
+        graph_keys.extend(key for key in graph["graph_data"] if key not in graph_keys)
+
+    for frame_idx, graph in enumerate(graphs):
+        for node_id, node in graph["nodes_data"].items():
+            node_mask[frame_idx, node_id] = True
+            for col, key in enumerate(node_keys):
+                value = node.get(key, 0)
+                if value is None:
+                    nodes[frame_idx, node_id, col] = np.nan
+                    continue
+                nodes[frame_idx, node_id, col] = value
+                seen_kinds[col].add(_value_kind(value))
+        for source, target, attributes in graph["edges_data"]:
+            edges[frame_idx, edge_columns[(source, target)]] = attributes["dist"]
+
+    # bool attributes are filled up with int 0 for nodes without them (see create_graphs.fill_keys)
+    node_kinds = ["f" if "f" in kinds or not kinds else "b" if "b" in kinds else "i" for kinds in seen_kinds]
+    arrays = {
+        "nodes": nodes,
+        "node_mask": node_mask,
+        "node_keys": np.array(node_keys, dtype=str),
+        "node_kinds": np.array(node_kinds, dtype=str),
+        "edges": edges,
+        "edge_pairs": np.array(edge_pairs, dtype=np.int64).reshape(-1, 2),
+    }
+    for key in graph_keys:
+        column, mask = _graph_column([graph["graph_data"].get(key) for graph in graphs])
+        arrays[_GRAPH_PREFIX + key] = column
+        if mask is not None:
+            arrays[_GRAPH_MASK_PREFIX + key] = mask
+    with open(file_path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+
+
+@dataclass
+class RoundGraphs:
+    """The graphs of a round as arrays, see the module docstring for the layout."""
+
+    nodes: np.ndarray
+    node_mask: np.ndarray
+    node_keys: list[str]
+    node_kinds: list[str]
+    edges: np.ndarray
+    edge_pairs: np.ndarray
+    graph_data: dict[str, np.ndarray]
+    graph_masks: dict[str, np.ndarray] = field(default_factory=dict)  # Only for attributes that are None in some frame
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def get_node_values(self, key: str) -> np.ndarray:
+        """Returns the values of a node attribute for all frames and nodes, shaped [frames, nodes]."""
+        return self.nodes[:, :, self.node_keys.index(key)]
+
+    def to_graph_dicts(self) -> list[dict]:
+        """Rebuilds the graphs in the dict format of the pickle output."""
+        casts = [_KIND_CASTS[kind] for kind in self.node_kinds]
+        graphs = []
+        for frame_idx in range(len(self)):
+            nodes_data = {
+                int(node_id): {
+                    key: None if np.isnan(value) else cast(value)
+                    for key, cast, value in zip(self.node_keys, casts, self.nodes[frame_idx, node_id].tolist(), strict=True)
+                }
+                for node_id in np.flatnonzero(self.node_mask[frame_idx])
+            }
+            edges_data = [
+                (int(source), int(target), {"dist": dist})
+                for (source, target), dist in zip(self.edge_pairs.tolist(), self.edges[frame_idx].tolist(), strict=True)
+                if not np.isnan(dist)
+            ]
+            graph_data = {
+                key: column[frame_idx].item() if key not in self.graph_masks or self.graph_masks[key][frame_idx] else None
+                for key, column in self.graph_data.items()
+            }
+            graphs.append({"graph_data": graph_data, "nodes_data": nodes_data, "edges_data": edges_data})
+        return graphs
+
+
+def read_round_graphs(file_path: Path) -> RoundGraphs:
+    """Reads a round written by `write_round_graphs`."""
+    with np.load(file_path, allow_pickle=False) as arrays:
+        return RoundGraphs(
+            nodes=arrays["nodes"],
+            node_mask=arrays["node_mask"],
+            node_keys=arrays["node_keys"].tolist(),
+            node_kinds=arrays["node_kinds"].tolist(),
+            edges=arrays["edges"],
+            edge_pairs=arrays["edge_pairs"],
+            graph_data={
+                name[len(_GRAPH_PREFIX):]: arrays[name] for name in arrays.files if name.startswith(_GRAPH_PREFIX)
+            },
+            graph_masks={
+                name[len(_GRAPH_MASK_PREFIX):]: arrays[name]
+                for name in arrays.files
+                if name.startswith(_GRAPH_MASK_PREFIX)
+            },
+        )
+
+
+def is_graph_file(file_name: str) -> bool:
+    """Returns whether the given file name is a graph file written by `create_graphs` (pickle or npz)."""
+    return str(file_name).endswith(GRAPH_FILE_SUFFIXES)
+
+
+def get_graph_file_round_index(file_path) -> int | None:
+    """Returns the round index of a `graph-rounds-<round>` file, or None if the file is not named by round."""
+    match = _ROUND_FILE_PATTERN.search(Path(file_path).name)
+    return int(match.group(1)) if match else None
+
+
+def graph_file_sort_key(file_path) -> tuple[str, float, str]:
+    """Sort key that orders graph files by folder (demo) and then by round index, so that `graph-rounds-10` comes
+    after `graph-rounds-9`. Files that are not named by round sort after the round files of their folder."""
+    file_path = Path(file_path)
+    round_index = get_graph_file_round_index(file_path)
+    return str(file_path.parent), float("inf") if round_index is None else round_index, file_path.name
+
+
+def load_graph_file(file_path: Path) -> list[dict] | dict:
+    """Loads a pickle or npz graph file in the dict format of the pickle output."""
+    if str(file_path).endswith(".npz"):
+        return read_round_graphs(file_path).to_graph_dicts()
+    with open(file_path, "rb") as f:
+        return pickle.load(f)
@@ -1,4 +1,5 @@
 from collections import Counter, defaultdict
+from collections.abc import Callable
 from pathlib import Path
 from typing import overload
 
@@ -95,36 +96,40 @@ class RoutineTracker:
         return tracker
 
     @classmethod
-    def aggregate_routines_from_directory(cls, directory_path: Path, map_name: str, tile_length: int, routine_length: FrameCount = DEFAULT_ROUTINE_LENGTH, limit: int | None = None) -> 'RoutineTracker':
+    def aggregate_routines_from_directory(cls, directory_path: Path, map_name: str, tile_length: int, routine_length: FrameCount = DEFAULT_ROUTINE_LENGTH, limit: int | None = None,
+                                          progress_callback: Callable[[int, int], None] | None = None, should_stop: Callable[[], bool] | None = None) -> 'RoutineTracker':
         """Aggregates all the routines from a directory of demo files into a single RoutineTracker object.
-        If a limit is provided, only the first limit number of files will be processed."""
+        If a limit is provided, only the first limit number of files will be processed.
+        If given, `progress_callback` is called with the number of processed demo files and the total demo file count after every file,
+        and the aggregation stops early (returning the routines aggregated so far) once `should_stop` returns True."""
         tracker = RoutineTracker(map_name, tile_length, routine_length)
 
+        demo_files = [file_path for file_path in directory_path.iterdir() if file_path.suffix == '.json']
         files_processed = 0
-        total_file_count = len(list(directory_path.iterdir()))
+        total_file_count = len(demo_files)
         demos_aggregated = 0
         total_demos_to_aggregate = min(limit, total_file_count) if limit is not None else total_file_count
-        
-        for file_path in directory_path.iterdir():
-            if file_path.suffix == '.json':
-                # Skip demos that aren't for the map we're interested in.
-                if get_map_name_from_demo_file_without_parsing(file_path) != map_name:
-                    files_processed += 1
-                    continue
-
+        if progress_callback is not None:
+            progress_callback(files_processed, total_file_count)
+
+        for file_path in demo_files:
+            if should_stop is not None and should_stop():
+                break
+            # Skip demos that aren't for the map we're interested in.
+            if get_map_name_from_demo_file_without_parsing(file_path) == map_name:
                 try:
                     dm = DataManager(file_path, do_validate=False)
                 except Exception as e:
                     print(f"Error loading file {file_path}: {e}")
-                    files_processed += 1
-                    continue
-
-                tracker += RoutineTracker.from_data_manager(dm, tile_length, routine_length)
-                files_processed += 1
-                demos_aggregated += 1
-                print(f"Processed {file_path.name} - {files_processed}/{total_file_count} files processed, {demos_aggregated} demos aggregated.")
-                if total_demos_to_aggregate is not None and demos_aggregated >= total_demos_to_aggregate:
-                    break
+                else:
+                    tracker += RoutineTracker.from_data_manager(dm, tile_length, routine_length)
+                    demos_aggregated += 1
+                    print(f"Processed {file_path.name} - {files_processed + 1}/{total_file_count} files processed, {demos_aggregated} demos aggregated.")
+            files_processed += 1
+            if progress_callback is not None:
+                progress_callback(files_processed, total_file_count)
+            if total_demos_to_aggregate is not None and demos_aggregated >= total_demos_to_aggregate:
+                break
 
         return tracker
 
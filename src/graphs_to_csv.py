@@ -1,10 +1,11 @@
 import csv
 import os
-import pickle
 from pathlib import Path
 
 from dotenv import load_dotenv
 
+from datamodel.graph_store import is_graph_file, load_graph_file
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -97,22 +98,21 @@ def main():
       print(f"Writing output to {output_name} from {graphs_folder}")
       writer = csv.writer(f_out)
       writer.writerow(CSV_HEADERS)
-      pkl_files = list(graphs_folder.rglob("*.pkl")) # for len
+      pkl_files = [path for path in graphs_folder.rglob("*") if is_graph_file(path.name)] # for len
       len_pkl_files = len(pkl_files)
       for idx, pkl_file in enumerate(pkl_files):
         file_name = pkl_file.name
         demo_name = pkl_file.parent.name
         round_idx = pkl_file.stem.rpartition("-")[2]
         print(f"Loading demo round file: {file_name} ({idx+1}/{len_pkl_files})")
-        with open(pkl_file, "rb") as f:
-          frames = pickle.load(f)
-          for frame in frames:
-            writer.writerow(
-              [demo_name, round_idx] +
-              parse_graph_data(frame["graph_data"]) +
-              parse_node_data(frame["nodes_data"]) +
-              parse_edges_data(frame["edges_data"]))
-          print(f"Written {len(frames)} to file.")
+        frames = load_graph_file(pkl_file)
+        for frame in frames:
+          writer.writerow(
+            [demo_name, round_idx] +
+            parse_graph_data(frame["graph_data"]) +
+            parse_node_data(frame["nodes_data"]) +
+            parse_edges_data(frame["edges_data"]))
+        print(f"Written {len(frames)} to file.")
       return
   except Exception as e:
     print(f"Failed: {e}")
@@ -122,18 +122,17 @@ def main_onlyprint():
   graphs_folder = Path(os.environ.get("GRAPHS_OUTPUT_DIR"))
   output_name = "output.csv"
   print(f"Writing output to {output_name} from {graphs_folder}")
-  pkl_files = list(graphs_folder.rglob("*.pkl")) # for len
+  pkl_files = [path for path in graphs_folder.rglob("*") if is_graph_file(path.name)] # for len
   len_pkl_files = len(pkl_files)
   for idx, pkl_file in enumerate(pkl_files):
     file_name = pkl_file.name
     demo_name = pkl_file.parent.name
     round_idx = pkl_file.stem.rpartition("-")[2]
     print(f"Loading demo round file: {file_name} ({idx+1}/{len_pkl_files})")
-    with open(pkl_file, "rb") as f:
-      frames = pickle.load(f)
-      for frame in frames:
-        pass #todo add print
-      print(f"Written {len(frames)} to file.")
+    frames = load_graph_file(pkl_file)
+    for frame in frames:
+      pass #todo add print
+    print(f"Written {len(frames)} to file.")
   return
 
 
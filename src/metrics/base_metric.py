@@ -1,21 +1,70 @@
 import logging
 from abc import ABC, abstractmethod
+from functools import cached_property
+from typing import Any
 
 import matplotlib.pyplot as plt
 import numpy as np
 from awpy.data import NAV
 
 from datamodel.data_manager import DataManager
+from datamodel.frame_store import SIDE_INDEX
+from datamodel.side_type import SideType
+from metrics.metric_cache import MetricCache, get_metric_cache
 
 logger = logging.getLogger(__name__)
 
 
+class RoundFrames:
+  """
+  The frames of a round as NumPy arrays, read once from the columnar FrameStore of the DataManager and shared by all
+  metrics of the round. Player arrays are shaped [frames, slot] per side, with slots in the player order of each
+  frame; empty slots are NaN (or None for strings).
+  """
+  def __init__(self, dm: DataManager, round_idx: int):
+    self.dm = dm
+    self.round_idx = round_idx
+    self.map_name = dm.get_map_name()
+    self.store, self._store_round_idx = dm.get_round_frame_store(round_idx)
+    self.frame_count = self.store.get_round_frame_count(self._store_round_idx)
+    self._round_slice = self.store.round_slice(self._store_round_idx)
+
+  def get_player_values(self, fields: str | list[str], side: SideType) -> np.ndarray:
+    """Returns numeric player fields of one side, shaped [frames, slot] or [frames, slot, field]."""
+    return self.store.get_player_values(fields, self._store_round_idx)[:, SIDE_INDEX[side]]
+
+  def get_player_positions(self, side: SideType) -> np.ndarray:
+    """Returns the player positions of one side, shaped [frames, slot, xyz]."""
+    return self.get_player_values(["x", "y", "z"], side)
+
+  def get_player_names(self, side: SideType) -> np.ndarray:
+    """Returns the player names of one side as an object array shaped [frames, slot]."""
+    return self.store.get_player_strings("name", self._store_round_idx)[:, SIDE_INDEX[side]]
+
+  def get_player_steam_ids(self, side: SideType) -> np.ndarray:
+    """Returns the player steamIDs of one side, shaped [frames, slot]. 0 for empty slots and players without one."""
+    return self.store.steam_ids[self._round_slice, SIDE_INDEX[side]]
+
+  @cached_property
+  def bomb_positions(self) -> np.ndarray:
+    """The bomb position per frame, shaped [frames, xyz]. NaN in frames without bomb info."""
+    positions = self.store.get_bomb_positions(self._store_round_idx).copy()
+    positions[~self.store.has_bomb[self._round_slice]] = np.nan
+    return positions
+
+
 class BaseMetric(ABC):
   """
   This class provides interface for all metrics. Each metric is calculated on the frame-level and then can be
   aggregated towards the round level. Base implementation of the round aggregation is just putting the frame
   level values in a list.
+
+  Metrics that can be computed on whole rounds at once override `process_metric_frames`, which receives the frames of
+  a round as arrays (see RoundFrames) and returns one value per frame.
   """
+  # Type of the values in `process_metric_round`, e.g. int for metrics that count or sum whole numbers
+  value_type: type = float
+
   @abstractmethod
   def process_metric_frame(self, dm: DataManager, round_idx: int, frame_idx: int, plot_metric: bool = False) -> float:
     """Calculates the metric for a single frames in a round.
@@ -30,16 +79,56 @@ class BaseMetric(ABC):
     """
     pass
 
+  def process_metric_frames(self, frames: RoundFrames) -> np.ndarray:
+    """Calculates the metric for all frames of a round at once. Base implementation calls `process_metric_frame`
+    for every frame.
+
+    Args:
+      frames: The frames of the round.
+
+    Returns: Float array with one metric value per frame, NaN for frames where the metric is not available.
+    """
+    metric_values = np.full(frames.frame_count, np.nan)
+    for frame_idx in range(frames.frame_count):
+      try:
+        metric = self.process_metric_frame(frames.dm, frames.round_idx, frame_idx)
+      except ValueError as err:
+        logger.warning(err)
+        logger.warning("Ignoring frame %d and adding NA instead." % frame_idx)
+        continue
+      if metric is not None:
+        metric_values[frame_idx] = metric
+    return metric_values
+
+  def get_parameters(self) -> dict[str, Any]:
+    """Returns the configuration of the metric, i.e. everything that changes its values besides the game data. Used
+    to key the metric cache. Base implementation returns the public instance attributes."""
+    return {name: value for name, value in vars(self).items() if not name.startswith("_")}
+
+  def process_metric_frames_cached(self, frames: RoundFrames, cache: MetricCache | None = None) -> np.ndarray:
+    """Returns `process_metric_frames` from the metric cache, computing and storing the values if they are not
+    cached yet. Without a cache (and without the METRIC_CACHE_DIR environment variable), nothing is cached."""
+    cache = cache if cache is not None else get_metric_cache()
+    if cache is None:
+      return self.process_metric_frames(frames)
+    metric_name, parameters, validated = self.__class__.__name__, self.get_parameters(), frames.dm.do_validate
+    metric_values = cache.load(frames.dm.file_path, frames.round_idx, metric_name, parameters, validated)
+    if metric_values is not None and len(metric_values) == frames.frame_count:
+      return metric_values
+    metric_values = self.process_metric_frames(frames)
+    cache.save(frames.dm.file_path, frames.round_idx, metric_name, parameters, metric_values, validated)
+    return metric_values
+
   def process_metric_round(self, dm: DataManager, round_idx: int, plot_metric: bool = False) -> list[float]:
-    """Calculates the metric for all frames in a round. Base implementation just aggregates all single frame
-    values into a list.
+    """Calculates the metric for all frames in a round (see `process_metric_frames`). The values are read from the
+    metric cache if they were calculated before with the same parameters (see `process_metric_frames_cached`).
 
     Args:
       dm: DataManager that hosts all game data.
       round_idx: The round index.
       plot_metric: True = plot the round chart; False = no plot
 
-    Returns: List of metric values.
+    Returns: List of metric values, None for frames where the metric is not available.
     """
     logger.info("Calculating %s metrics for round %d." % (self.__class__.__name__, round_idx))
     map_name = dm.get_map_name()
@@ -47,15 +136,7 @@ class BaseMetric(ABC):
     if map_name not in NAV:
       raise ValueError("Map not found.")
 
-    metric_values = []
-    for frame_idx, _frame in enumerate(dm.get_game_round(round_idx)["frames"] or []):
-      try:
-        metric = self.process_metric_frame(dm, round_idx, frame_idx)
-        metric_values.append(metric)
-      except ValueError as err:
-        logger.warning(err)
-        logger.warning("Ignoring frame %d and adding NA instead." % frame_idx)
-        metric_values.append(None)
+    metric_values = to_metric_list(self.process_metric_frames_cached(RoundFrames(dm, round_idx)), self.value_type)
 
     if plot_metric:
       logger.info("Plotting %s metrics for round %d." % (self.__class__.__name__, round_idx))
@@ -63,3 +144,9 @@ class BaseMetric(ABC):
       plt.show()
 
     return metric_values
+
+
+def to_metric_list(metric_values: np.ndarray, value_type: type = float) -> list[float | None]:
+  """Converts a metric vector to a list of `value_type` values (see `BaseMetric.value_type`), with None instead of
+  NaN."""
+  return [None if np.isnan(value) else value_type(value) for value in metric_values.tolist()]
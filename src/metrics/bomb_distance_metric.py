@@ -1,15 +1,23 @@
+import functools
 import logging
+import math
 import os
 from typing import override
 
-from awpy.analytics.nav import area_distance, find_closest_area
+import numpy as np
+from awpy.analytics.nav import area_distance
 from awpy.data import AREA_DIST_MATRIX, NAV
 from awpy.types import BombInfo
 from awpy.visualization.plot import plot_map, position_transform
 from matplotlib import patches
 
 from datamodel.data_manager import DataManager
-from metrics.base_metric import BaseMetric
+from metrics.base_metric import BaseMetric, RoundFrames
+from utils.nav_data import (
+  get_area_distance_matrix,
+  get_area_index,
+  get_bombsite_distance_table,
+)
 
 LOGGING_LEVEL = os.environ.get("LOGGING_INFO")
 if LOGGING_LEVEL == "INFO":
@@ -36,48 +44,19 @@ class BombDistanceMetric(BaseMetric):
     if map_name not in NAV:
       raise ValueError("Map not found.")
 
-    # find shorted bombsite:
-    closest_bombsite_dist: float = float("Inf")
-    closest_bombsite_areaid: int = -1
     bombinfo: BombInfo = dm.get_bomb_info(round_idx, frame_idx)
-    bomb_coords = [bombinfo[key] for key in bombinfo]
-    area_bomb = find_closest_area(map_name, point=bomb_coords, flat=False)
-    geodesic_path = None
-
-    ## Todo: find bombsite *plantable* area  with minimum distance from bomb
-
-    for area_id in NAV[map_name]:
-      area = NAV[map_name][area_id]
-      if area["areaName"].startswith("Bombsite"):
-        # Use Area Distance Matrix if available, since it is faster
-        # area distance matrix uses str as keys
-        # *TODO* copy pasted this from the create_graphy.py check if it works here as well
-        area_a_str = str(area_id)
-        area_b_str = str(area_bomb["areaId"])
-        if (map_name in AREA_DIST_MATRIX
-            and area_a_str in AREA_DIST_MATRIX[map_name]
-            and area_b_str in AREA_DIST_MATRIX[map_name][area_a_str]):
-          current_bombsite_dist = AREA_DIST_MATRIX[map_name][area_a_str][area_b_str]["geodesic"]
-        # Else: calculate all distances pairwise
-        else:
-          if LOGGING_LEVEL == "DEBUG" and len(AREA_DIST_MATRIX) > 0: # this happened once, not sure if debug overhead is needed
-            logger.debug("Area matrix exists but does not contain areaid: %d" % area_id)
-          geodesic_path = area_distance(map_name=map_name, area_a=area_id, area_b=area_bomb["areaId"], dist_type="geodesic")
-          current_bombsite_dist = geodesic_path["distance"]
-        # Set closest area_id
-        if current_bombsite_dist < closest_bombsite_dist:
-          closest_bombsite_areaid = area_id
-          closest_bombsite_dist = current_bombsite_dist
-
-    if closest_bombsite_areaid < 0:
-      raise ValueError("Could not find closest bombsite distance with bomb area id: %d in frame %d." % (area_bomb["areaId"], frame_idx))
-
-    if not geodesic_path:
-      geodesic_path = area_distance(map_name=map_name, area_a=closest_bombsite_areaid, area_b=area_bomb["areaId"], dist_type="geodesic")
+    area_bomb_id = _find_bomb_area(map_name, *(bombinfo[key] for key in ("x", "y", "z")))
+    closest_bombsite_dist = _closest_bombsite_distance(map_name, area_bomb_id)
+
+    if math.isinf(closest_bombsite_dist):
+      raise ValueError("Could not find closest bombsite distance with bomb area id: %d in frame %d." % (area_bomb_id, frame_idx))
 
     if not plot_metric:
       return closest_bombsite_dist
 
+    # the path is only needed for plotting
+    geodesic_path = _closest_bombsite_path(map_name, area_bomb_id)
+
     logger.info("Plotting %s metrics for round %d, frame %d." % (self.__class__.__name__, round_idx, frame_idx))
     fig, ax = plot_map(map_name=map_name, map_type='simpleradar', dark=True)
 
@@ -101,6 +80,72 @@ class BombDistanceMetric(BaseMetric):
     fig.show()
     return closest_bombsite_dist
 
+  @override
+  def process_metric_frames(self, frames: RoundFrames) -> np.ndarray:
+    """Resolves the bomb areas of all frames with one spatial index query and looks up their distance to the closest
+    bombsite in the precomputed bombsite distance table. Frames without bomb info or without a path to a bombsite
+    are NaN."""
+    if frames.map_name not in NAV:
+      raise ValueError("Map not found.")
+
+    bomb_positions = frames.bomb_positions
+    has_bomb = ~np.isnan(bomb_positions).any(axis=1)
+    metric = np.full(frames.frame_count, np.nan)
+    if not has_bomb.any():
+      return metric
+    area_bomb_ids = get_area_index(frames.map_name).find_closest_areas(bomb_positions[has_bomb])
+    # the bomb rests in the same area for most of the round, so look up every area once
+    unique_area_ids, area_idx = np.unique(area_bomb_ids, return_inverse=True)
+    closest_bombsite_dist = get_bombsite_distance_table(frames.map_name).lookup(unique_area_ids).min(axis=1)
+    closest_bombsite_dist = np.where(np.isinf(closest_bombsite_dist), np.nan, closest_bombsite_dist)
+    metric[has_bomb] = closest_bombsite_dist[area_idx]
+    return metric
+
+
+@functools.lru_cache(maxsize=1024)
+def _find_bomb_area(map_name: str, x: float, y: float, z: float) -> int:
+  """Returns the area of a bomb position. Memoized, since the bomb rests at the same position for many frames."""
+  return get_area_index(map_name).find_closest_area([x, y, z])
+
+
+@functools.lru_cache(maxsize=1024)
+def _closest_bombsite_distance(map_name: str, area_bomb_id: int) -> float:
+  """Returns the geodesic distance from the closest bombsite area to the given area (inf if there is no path)."""
+  return float(get_bombsite_distance_table(map_name).lookup([area_bomb_id]).min())
+
+
+@functools.lru_cache(maxsize=64)
+def _closest_bombsite_path(map_name: str, area_bomb_id: int) -> dict:
+  """Returns awpy's geodesic path (with "distance" and "areas") from the closest bombsite area to the given area."""
+  closest_bombsite_dist: float = float("Inf")
+  closest_bombsite_areaid: int = -1
+  dist_matrix = get_area_distance_matrix(map_name)
+  geodesic_path = None
+
+  for area_id in NAV[map_name]:
+    area = NAV[map_name][area_id]
+    if area["areaName"].startswith("Bombsite"):
+      # Use Area Distance Matrix if available, since it is faster
+      current_bombsite_dist = float(dist_matrix.lookup(area_id, area_bomb_id)) if dist_matrix is not None else math.nan
+      # Else: calculate the path, which is reused if this area turns out to be the closest
+      current_path = None
+      if math.isnan(current_bombsite_dist):
+        if LOGGING_LEVEL == "DEBUG" and len(AREA_DIST_MATRIX) > 0: # this happened once, not sure if debug overhead is needed
+          logger.debug("Area matrix exists but does not contain areaid: %d" % area_id)
+        current_path = area_distance(map_name=map_name, area_a=area_id, area_b=area_bomb_id, dist_type="geodesic")
+        current_bombsite_dist = current_path["distance"]
+      # Set closest area_id
+      if current_bombsite_dist < closest_bombsite_dist:
+        closest_bombsite_areaid = area_id
+        closest_bombsite_dist = current_bombsite_dist
+        geodesic_path = current_path
+
+  if closest_bombsite_areaid < 0:
+    raise ValueError("Could not find closest bombsite distance with bomb area id: %d." % area_bomb_id)
+  if geodesic_path is None:
+    geodesic_path = area_distance(map_name=map_name, area_a=closest_bombsite_areaid, area_b=area_bomb_id, dist_type="geodesic")
+  return geodesic_path
+
 
 
 if __name__ == "__main__":
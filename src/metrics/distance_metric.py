@@ -1,11 +1,14 @@
 import logging
 import os
+import weakref
 from typing import override
 
+import numpy as np
 from awpy.data import NAV
 
 from datamodel.data_manager import DataManager
-from metrics.base_metric import BaseMetric
+from datamodel.side_type import SideType
+from metrics.base_metric import BaseMetric, RoundFrames
 
 LOGGING_LEVEL = os.environ.get("LOGGING_INFO")
 if LOGGING_LEVEL == "INFO":
@@ -14,23 +17,27 @@ elif LOGGING_LEVEL == "DEBUG":
   logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# The values of the last round requested per frame, by DataManager: ((round index, cumulative), values). The demos are
+# only referenced weakly, so an entry is dropped with its DataManager.
+_round_values: weakref.WeakKeyDictionary[DataManager, tuple[tuple[int, bool], np.ndarray]] = weakref.WeakKeyDictionary()
+
 
 ## TODO: Add total distance not only to previous frame;
 ## TODO: Todo, estimate metric depending on CT vs. T side.
 
 class DistanceMetric(BaseMetric):
+  """
+  DistanceMetric provides a metric for the distance the T-side players moved since the previous frame (or since the
+  start of the round if cumulative). It keeps no state between calls, so frames can be processed in any order.
+  """
 
   def __init__(self, cumulative: bool = True):
     self.cumulative = cumulative
-    self.total_distance = 0.0
-    self.previous_positions = None
 
   @override
   def process_metric_frame(self, dm: DataManager, round_idx: int, frame_idx: int, plot_metric: bool = False) -> float:
     """ Calculates the metric for a single frames in a round.
 
-    **WARNING**: This method only works if frame are iterated by correct order !!
-
     Args:
       dm: DataManager that hosts all game data.
       round_idx: The round index.
@@ -41,76 +48,68 @@ class DistanceMetric(BaseMetric):
 
     """
     logger.debug("Calculating %s metrics for round %d, frame %d" % (self.__class__.__name__, round_idx, frame_idx))
-    map_name = dm.get_map_name()
-
-    if map_name not in NAV:
-      raise ValueError("Map not found.")
-
-    frames = dm._get_frames(round_idx)
-    if frame_idx >= len(frames):
-      raise ValueError(f"Frame index {frame_idx} out of bounds (max index is {len(frames) - 1})")
-
-    # first frame is always 0.0 by definition (there cannot be a preceding frame to get a distance delta)
-    if frame_idx < 1 or self.previous_positions is None:
-      # save previous positions for next frame and return 0.0.
-      self.previous_positions = {
-        player["name"]: (player["x"], player["y"], player["z"])
-        for player in frames[frame_idx]["t"]["players"]}
-      return 0.0
-
-    current_frame = frames[frame_idx]
-    frames[frame_idx-1]
-
-    # players are indexed at different positions each frame, so we need to remember them by name...
-    # tuples are (x,y,z)
-    current_positions = {
-       player["name"]: (player["x"], player["y"], player["z"])
-    for player in current_frame["t"]["players"] }
-
-    delta_positions = {
-      player_name: (
-          current_positions[player_name][0] - self.previous_positions[player_name][0],
-          current_positions[player_name][1] - self.previous_positions[player_name][1],
-          current_positions[player_name][2] - self.previous_positions[player_name][2]
-      ) for player_name in current_positions }
-
-    # we use absolute values
-    metric = sum([
-      sum((abs(delta[0]), abs(delta[1]), abs(delta[2])))
-      for delta in delta_positions.values()
-      ])
-
-    # save total distance and previous positions for next frame and return metric value
-    self.previous_positions = current_positions
-    self.total_distance += metric
+    # a frame needs all frames before it, so the whole round is computed once and reused for its other frames
+    round_key = (round_idx, self.cumulative)
+    cached = _round_values.get(dm)
+    if cached is None or cached[0] != round_key:
+      cached = (round_key, self.process_metric_frames(RoundFrames(dm, round_idx)))
+      _round_values[dm] = cached
+    metric_values = cached[1]
+    if frame_idx >= len(metric_values):
+      raise ValueError(f"Frame index {frame_idx} out of bounds (max index is {len(metric_values) - 1})")
 
     if plot_metric:
       # TODO: Think of plotting, e.g. a simple scatterplot / line with delta distance
       pass
 
-    if self.cumulative:
-      return self.total_distance
-    else:
-        return metric
+    return float(metric_values[frame_idx])
+
+  @override
+  def process_metric_frames(self, frames: RoundFrames) -> np.ndarray:
+    """Calculates the distance of all frames at once from the frame-to-frame position differences of each player.
+    The first frame is 0.0, players that are missing in one of two consecutive frames do not add to the distance."""
+    if frames.map_name not in NAV:
+      raise ValueError("Map not found.")
+    if frames.frame_count == 0:
+      return np.zeros(0)
+    player_keys = _player_keys(frames.get_player_names(SideType.T), frames.get_player_steam_ids(SideType.T))
+    tracks = _player_tracks(player_keys, frames.get_player_positions(SideType.T))
+    # we use absolute values
+    metric = np.zeros(frames.frame_count)
+    metric[1:] = np.nansum(np.abs(np.diff(tracks, axis=0)), axis=(1, 2))
+    return np.cumsum(metric) if self.cumulative else metric
 
 
+def _player_keys(names: np.ndarray, steam_ids: np.ndarray) -> np.ndarray:
+  """Identifies the players in the slots of a round by steamID, or by name for players without one (e.g. bots).
 
-  def process_metric_round(self, dm: DataManager, round_idx: int, plot_metric: bool = False) -> list[float]:
-    """Calculates the metric for all frames in a round. Base implementation just aggregates all single frame
-    values into a list.
+  Args:
+    names: The player names, shaped [frames, slot] (None for empty slots).
+    steam_ids: The player steamIDs, shaped [frames, slot] (0 if missing).
 
-    Args:
-      dm: DataManager that hosts all game data.
-      round_idx: The round index.
-      plot_metric: True = plot the round chart; False = no plot
+  Returns: Object array shaped [frames, slot] with one key string per player, None for empty slots.
+  """
+  keys = np.where(steam_ids != 0,
+                  np.char.add("steamID:", steam_ids.astype(str)),
+                  np.char.add("name:", names.astype(str))).astype(object)
+  keys[np.equal(names, None)] = None
+  return keys
 
-    Returns: List of metric values.
-    """
-    # We have to reset total distance before calling the base implementation
-    self.total_distance = 0.0
-    return super().process_metric_round(dm, round_idx, plot_metric)
 
+def _player_tracks(player_keys: np.ndarray, positions: np.ndarray) -> np.ndarray:
+  """Reorders the player positions of a round from frame slots to one column per player.
+
+  Args:
+    player_keys: The player keys, shaped [frames, slot] (None for empty slots), see `_player_keys`.
+    positions: The player positions, shaped [frames, slot, xyz].
 
+  Returns: The positions shaped [frames, player, xyz], NaN in frames where a player is missing.
+  """
+  frame_idx, slot_idx = np.nonzero(np.not_equal(player_keys, None))
+  players, player_idx = np.unique(player_keys[frame_idx, slot_idx].astype(str), return_inverse=True)
+  tracks = np.full((len(player_keys), len(players), 3), np.nan)
+  tracks[frame_idx, player_idx] = positions[frame_idx, slot_idx]
+  return tracks
 
 
 if __name__ == "__main__":
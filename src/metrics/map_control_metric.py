@@ -1,40 +1,64 @@
 import logging
-from collections import defaultdict, deque
+from collections import defaultdict
 
 import numpy as np
-from awpy.analytics.map_control import _approximate_neighbors, extract_teams_metadata
-from awpy.analytics.nav import calculate_tile_area, find_closest_area
-from awpy.data import NAV, NAV_GRAPHS
-from awpy.types import BFSTileData, FrameMapControlValues
+from awpy.analytics.map_control import extract_teams_metadata
+from awpy.data import NAV
+from awpy.types import FrameMapControlValues
 from awpy.visualization.plot import _plot_map_control_from_dict, plot_map
-from matplotlib import pyplot as plt
 
 from datamodel.data_manager import DataManager
 from metrics.base_metric import BaseMetric
+from utils.nav_data import NavAdjacency, get_area_index, get_nav_adjacency
 
 logger = logging.getLogger(__name__)
 
 
 ## TODO: Discuss how to estimate map control logic
-## TODO: Performance optimize calculation (e.g., less full loops over all NAV areas)
 ## TODO: Todo, estimate metric depending on CT vs. T side.
 
 class MapControlMetric(BaseMetric):
   """
   MapControlMetric provides a metric to estimate the mapcontrol for the T-side.
   """
+  def __init__(self,
+               area_threshold: float = 1/20,
+               steps: int = 10,
+               occupied_only: bool = True,
+               norm: int = 0,
+               absolute: bool = False):
+    """
+    Args:
+      area_threshold: maximum share of the map a single player can control (by area).
+                      default is area_threshold = 1 / 20.
+      steps: number of steps to use for BFS search in identifying neighboring area tiles.
+             default is steps = 10
+      occupied_only: True = only consider occupied area tiles for map control metric, False = consider all area tiles
+      norm: 0 = Normalize from -1 to 1 for ct possession weighted by tile area (ONLY occupied tiles)
+            1 = Normalize from 0 to 1 for ct possession, weighted by tile area (ONLY occupied tiles)
+            2 = No normalization, weighted by tile area (ONLY occupied tiles)
+      absolute: True if absolute pixel area from the tiles should be used,
+                False if relative area (T vs CT) should be used. Does not work with occupied = False.
+    """
+    self.area_threshold = area_threshold
+    self.steps = steps
+    self.occupied_only = occupied_only
+    self.norm = norm
+    self.absolute = absolute
+
   def process_metric_frame(self,
                            dm: DataManager,
                            round_idx: int,
                            frame_idx: int,
                            plot_metric: bool = False,
-                           area_threshold: float = 1/20,
-                           steps: int = 10,
-                           occupied_only: bool = True,
-                           norm: int = 0,
-                           absolute: bool = False
+                           area_threshold: float | None = None,
+                           steps: int | None = None,
+                           occupied_only: bool | None = None,
+                           norm: int | None = None,
+                           absolute: bool | None = None
                            ) -> float:
-    """Calculates the metric for a single frame in a round.
+    """Calculates the metric for a single frame in a round. Parameters that are not given are taken from the metric
+    (see `__init__`).
 
     Args:
       dm: DataManager instance.
@@ -57,17 +81,19 @@ class MapControlMetric(BaseMetric):
 
     """
     logger.debug("Calculating %s metrics for round %d, frame %d" % (self.__class__.__name__, round_idx, frame_idx))
+    area_threshold = self.area_threshold if area_threshold is None else area_threshold
+    steps = self.steps if steps is None else steps
+    occupied_only = self.occupied_only if occupied_only is None else occupied_only
+    norm = self.norm if norm is None else norm
+    absolute = self.absolute if absolute is None else absolute
     testframe = dm.get_frame(round_idx, frame_idx)
     map_name = dm.get_map_name()
 
     if map_name not in NAV:
       raise ValueError("Map not found.")
 
-    # map list of 2-tuples to a lookup dicts for identifying neighboring tiles (for BFS) from NAV map graph
-    tile_to_neighbors: dict[int, set[int]] = defaultdict(set)
-    for tile_1, tile_2 in list(NAV_GRAPHS[map_name].edges):
-      tile_to_neighbors[tile_1].add(tile_2)
-      tile_to_neighbors[tile_2].add(tile_1)
+    # neighboring tiles (for BFS) and tile areas, built once per map
+    adjacency = get_nav_adjacency(map_name)
 
     # get alive player locations from frame
     coords = ("x", "y", "z")
@@ -82,19 +108,16 @@ class MapControlMetric(BaseMetric):
       if player["isAlive"]
     ]
 
-    # use euclidian distance to find occupied tile for each player from player location
-    t_tiles = [
-      find_closest_area(map_name, i)["areaId"]
-      for i in alive_players_locations_t
-    ]
-    ct_tiles = [
-      find_closest_area(map_name, i)["areaId"]
-      for i in alive_players_locations_ct
-    ]
+    # use euclidian distance to find occupied tile for each player from player location (one query for both teams)
+    tiles = get_area_index(map_name).find_closest_areas(
+      alive_players_locations_t + alive_players_locations_ct
+    ).tolist()
+    t_tiles = tiles[:len(alive_players_locations_t)]
+    ct_tiles = tiles[len(alive_players_locations_t):]
 
     # use breadth-first-search to identify map control
-    t_control_values = _bfs(map_name, t_tiles, tile_to_neighbors, area_threshold, steps)
-    ct_control_values = _bfs(map_name, ct_tiles, tile_to_neighbors, area_threshold, steps)
+    t_control_values = _bfs(map_name, t_tiles, adjacency, area_threshold, steps)
+    ct_control_values = _bfs(map_name, ct_tiles, adjacency, area_threshold, steps)
 
     # calculate final control value for team T
     map_control_values = FrameMapControlValues(t_control_values, ct_control_values)
@@ -125,55 +148,40 @@ class MapControlMetric(BaseMetric):
                            dm: DataManager,
                            round_idx: int,
                            plot_metric: bool = False,
-                           area_threshold: float = 1/20,
-                           steps: int = 10,
-                           occupied_only: bool = True,
-                           norm: int = 0,
-                           absolute: bool = False
+                           area_threshold: float | None = None,
+                           steps: int | None = None,
+                           occupied_only: bool | None = None,
+                           norm: int | None = None,
+                           absolute: bool | None = None
                            ) -> list[float]:
-    """Calculates the metric for an all frames in a round.
+    """Calculates the metric for an all frames in a round. Parameters that are not given are taken from the metric
+    (see `__init__`). The values are read from the metric cache if they were calculated before with the same
+    parameters.
 
     Args:
       dm: DataManager instance
       round_idx: The round index.
       plot_metric: Plot the frame?
       area_threshold: maximum share of the map a single player can control (by area).
-                      default is area_threshold = 1 / 20.
       steps: number of steps to use for BFS search in identifying neighboring area tiles.
-             default is steps = 10
       occupied_only: True = only consider occupied area tiles for map control metric, False = consider all area tiles
-      norm: 0 = Normalize from -1 to 1 for ct possession weighted by tile area (ONLY occupied tiles)
-            1 = Normalize from 0 to 1 for ct possession, weighted by tile area (ONLY occupied tiles)
-            2 = No normalization, weighted by tile area (ONLY occupied tiles)
-      absolute: True if absolute pixel area from the tiles should be used,
-                False if relative area (T vs CT) should be used. Does not work with occupied = False.
-
+      norm: 0 = Normalize from -1 to 1, 1 = Normalize from 0 to 1, 2 = No normalization
+      absolute: True if absolute pixel area from the tiles should be used, False if relative area (T vs CT).
 
     Returns: The map control metric.
 
     """
-    logger.info("Calculating %s metrics for round %d." % (self.__class__.__name__, round_idx))
-    map_name = dm.get_map_name()
-
-    if map_name not in NAV:
-      raise ValueError("Map not found.")
-
-    metric_values: list[float] = []
-    for frame_idx, _frame in enumerate(dm.get_game_round(round_idx)["frames"] or []):
-      try:
-        metric = self.process_metric_frame(dm, round_idx, frame_idx, False, area_threshold, steps, occupied_only, norm, absolute)
-        metric_values.append(metric)
-      except (ValueError, KeyError) as err:
-        logger.warning(err)
-        logger.warning("Ignoring frame %d and adding NA instead." % frame_idx)
-        metric_values.append(None)
-
-    if plot_metric:
-      logger.info("Plotting %s metrics for round %d." % (self.__class__.__name__, round_idx))
-      plt.scatter(np.arange(len(metric_values)), metric_values)
-      plt.show()
-
-    return metric_values
+    overrides = {
+      "area_threshold": area_threshold,
+      "steps": steps,
+      "occupied_only": occupied_only,
+      "norm": norm,
+      "absolute": absolute,
+    }
+    metric = MapControlMetric(**{
+      name: value if value is not None else getattr(self, name) for name, value in overrides.items()
+    })
+    return BaseMetric.process_metric_round(metric, dm, round_idx, plot_metric)
 
 
 
@@ -209,6 +217,7 @@ class MapControlMetric(BaseMetric):
         raise ValueError("All tiles and relative do not work together. Use norm instead.")
 
 
+      adjacency = get_nav_adjacency(map_name)
       current_map_control_value: list[float] = []
       tile_areas: list[float] = []
       if occupied_only:
@@ -224,7 +233,7 @@ class MapControlMetric(BaseMetric):
           current_map_control_value.append(sum(t_val))
         else:
           current_map_control_value.append(sum(t_val) / (sum(ct_val) + sum(t_val)))
-        tile_areas.append(calculate_tile_area(map_name, int(tile)))
+        tile_areas.append(adjacency.tile_areas[adjacency.get_rows(int(tile))])
 
       np_current_map_control_value = np.array(current_map_control_value)
       np_tile_areas = np.array(tile_areas)
@@ -258,7 +267,7 @@ class MapControlMetric(BaseMetric):
 def _bfs(
       map_name: str,
       current_tiles: list[int],
-      neighbor_info: dict[int, set[int]],
+      adjacency: NavAdjacency,
       area_threshold: float = 1 / 20,
       steps: int = 10):
   """Helper function to run bfs from given tiles to generate map_control values dict.
@@ -270,6 +279,11 @@ def _bfs(
   1/20 as a default. This means the BFS search will stop once the cumulative tile
   area reaches this threshold.
 
+  The search runs level by level on the arrays of the map's NavAdjacency: each level
+  gathers the neighbors of all tiles of the previous level at once, keeps the first
+  occurrence of every unseen tile (in the order a FIFO queue would pop them) and cuts
+  the level off where the cumulative area reaches the threshold.
+
   Notes:
     - cannot get more than 20% of map per player
     - in theory, with 5 players, exactly 100% would be possible
@@ -279,7 +293,7 @@ def _bfs(
   Args:
       map_name (str): Map for current_tiles
       current_tiles (TileId): List of source tiles for bfs iteration(s)
-      neighbor_info (dict): Dictionary mapping tile to its navigable neighbors
+      adjacency (NavAdjacency): Navigable neighbors and areas of the map's tiles
       area_threshold (float): Percentage representing amount of map's total
                               navigable area which is the max cumulative tile
                               area for each bfs algorithm
@@ -289,58 +303,49 @@ def _bfs(
 
   Raises:
       ValueError: If area_threshold <= 0
+      KeyError: If a source tile is not a tile of the map
   """
   if area_threshold <= 0:
     msg = "Invalid area_threshold value. Must be > 0."
     raise ValueError(msg)
 
-  total_map_area = 0
-  for tile_id in NAV[map_name]:
-    total_map_area += calculate_tile_area(map_name, tile_id)
+  max_player_area = adjacency.total_area * area_threshold
+  start_rows = adjacency.get_rows(current_tiles)
+  if (start_rows < 0).any():
+    raise KeyError(f"Tile {current_tiles[int(np.argmin(start_rows))]} not found on map {map_name}.")
 
   map_control_values: dict[int, list[float]] = defaultdict(list)
-  for cur_start_tile in current_tiles:
-    tiles_seen: set[int] = set()
-
+  for start_row in start_rows:
+    seen = np.zeros(len(adjacency.tile_ids), dtype=bool)
     # start tile gets value control value of 1.0
-    # go 10 steps deep in BFS
     # each step gets -0.1 less control value
-    start_tile = BFSTileData(
-      tile_id=cur_start_tile, map_control_value=1.0, steps_left=steps
-    )
-
-    queue: deque[BFSTileData] = deque([start_tile])
-
+    frontier = np.array([start_row], dtype=np.int64)
+    map_control_value = 1.0
+    steps_left = steps
     current_player_area = 0
 
-    while queue and current_player_area < total_map_area * area_threshold:
-      cur_tile = queue.popleft()
-      cur_id = cur_tile.tile_id
-      if cur_id not in tiles_seen:
-        tiles_seen.add(cur_id)
-        map_control_values[cur_id].append(cur_tile.map_control_value)
-
-        neighbors = list(neighbor_info[cur_id])
-        if len(neighbors) == 0:
-          neighbors = [
-            #tile.tile_id
-            tile["areas"][0]
-            for tile in _approximate_neighbors(map_name, cur_id)   # retrieves neighbors by identifying 5 areas with minimal distance to focal area
-          ]
-
-        queue.extend(
-          [
-            BFSTileData(
-              tile_id=neighbor,
-              map_control_value=max((cur_tile.steps_left - 1) / steps, 0.1),
-              steps_left=cur_tile.steps_left - 1,
-            )
-            for neighbor in neighbors
-          ]
-        )
-
-        cur_tile_area = calculate_tile_area(map_name, cur_id)
-        current_player_area += cur_tile_area
+    while len(frontier) and current_player_area < max_player_area:
+      # first occurrence of each tile of the level that was not visited before
+      _, first_positions = np.unique(frontier, return_index=True)
+      candidates = frontier[np.sort(first_positions)]
+      candidates = candidates[~seen[candidates]]
+
+      # cumulative area before each candidate, starting from the area of the previous levels
+      cumulative_area = np.cumsum(np.concatenate(([current_player_area], adjacency.tile_areas[candidates])))
+      over_threshold = np.flatnonzero(cumulative_area[:-1] >= max_player_area)
+      visit_count = int(over_threshold[0]) if len(over_threshold) else len(candidates)
+      visited = candidates[:visit_count]
+
+      seen[visited] = True
+      for tile_id in adjacency.tile_ids[visited].tolist():
+        map_control_values[tile_id].append(map_control_value)
+      current_player_area = cumulative_area[visit_count]
+      if visit_count < len(candidates):
+        break
+
+      frontier = adjacency.get_neighbor_rows(visited)
+      map_control_value = max((steps_left - 1) / steps, 0.1)
+      steps_left -= 1
 
   return map_control_values
 
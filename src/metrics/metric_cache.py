@@ -0,0 +1,86 @@
+"""On-disk cache of the per-frame values of metrics, so re-running a metric with the same configuration on the same
+demo only reads a file.
+
+Every (demo, validation mode, round, metric class, parameters) is stored as one `.npy` vector at
+`<cache_dir>/<demo file stem>-<demo hash>[-validated]/round-<round>/<metric class>-<parameter hash>.npy`. The demo
+hash covers the content of the demo file, so a re-parsed demo never reads stale values. Demos loaded with validation
+drop invalid frames, so their values are kept apart from those of unvalidated loads. The parameter hash covers the
+metric's configuration (see `BaseMetric.get_parameters`), so a changed parameter only recomputes that metric.
+"""
+
+import functools
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump when the values of a metric change for the same parameters, to ignore all earlier results
+METRIC_CACHE_VERSION = 1
+
+
+@functools.lru_cache(maxsize=32)
+def _hash_file(file_path: str, size: int, mtime_ns: int) -> str:
+  digest = hashlib.blake2b(digest_size=16)
+  with open(file_path, "rb") as f:
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+def get_demo_hash(file_path) -> str:
+  """Returns a hash of the content of a demo file. The file is only read again when its size or modification time
+  changes."""
+  stat = os.stat(file_path)
+  return _hash_file(str(Path(file_path).resolve()), stat.st_size, stat.st_mtime_ns)
+
+
+def get_parameters_hash(parameters: dict[str, Any]) -> str:
+  """Returns a hash of metric parameters. Parameters are compared by their repr, in name order."""
+  key = repr((METRIC_CACHE_VERSION, sorted(parameters.items())))
+  return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+class MetricCache:
+  """The per-frame metric values of the rounds of demos, stored in `cache_dir` (see the module docstring)."""
+
+  def __init__(self, cache_dir):
+    self.cache_dir = Path(cache_dir)
+
+  def get_path(
+      self, demo_path, round_idx: int, metric_name: str, parameters: dict[str, Any], validated: bool = False) -> Path:
+    """Returns the cache file of the values of a metric in a round of a demo loaded with or without validation."""
+    demo_dir = f"{Path(demo_path).stem}-{get_demo_hash(demo_path)}{'-validated' if validated else ''}"
+    return self.cache_dir / demo_dir / f"round-{round_idx}" / f"{metric_name}-{get_parameters_hash(parameters)}.npy"
+
+  def load(
+      self, demo_path, round_idx: int, metric_name: str, parameters: dict[str, Any],
+      validated: bool = False) -> np.ndarray | None:
+    """Returns the cached values of a metric in a round, or None if they are not cached."""
+    try:
+      return np.load(self.get_path(demo_path, round_idx, metric_name, parameters, validated), allow_pickle=False)
+    except (OSError, ValueError):
+      return None
+
+  def save(
+      self, demo_path, round_idx: int, metric_name: str, parameters: dict[str, Any], values: np.ndarray,
+      validated: bool = False) -> None:
+    """Stores the values of a metric in a round. Failing to write the cache is logged, not raised."""
+    path = self.get_path(demo_path, round_idx, metric_name, parameters, validated)
+    tmp_path = path.with_name(f"{path.stem}.tmp-{os.getpid()}.npy")
+    try:
+      path.parent.mkdir(parents=True, exist_ok=True)
+      np.save(tmp_path, np.asarray(values, dtype=np.float64), allow_pickle=False)
+      os.replace(tmp_path, path)
+    except OSError as err:
+      logger.warning("Could not write metric cache file %s: %s" % (path, err))
+
+
+def get_metric_cache() -> MetricCache | None:
+  """Returns the MetricCache in the METRIC_CACHE_DIR environment variable, or None if it is not set."""
+  cache_dir = os.environ.get("METRIC_CACHE_DIR")
+  return MetricCache(cache_dir) if cache_dir else None
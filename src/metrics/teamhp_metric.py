@@ -1,7 +1,10 @@
 import logging
 
+import numpy as np
+
 from datamodel.data_manager import DataManager
-from metrics.base_metric import BaseMetric
+from datamodel.side_type import SideType
+from metrics.base_metric import BaseMetric, RoundFrames
 
 logger = logging.getLogger(__name__)
 
@@ -9,6 +12,8 @@ class TeamHpMetric(BaseMetric):
   """
   TeamHp provides a metric to estimate the total health points of a team.
   """
+  value_type = int
+
   def __init__(self, team: str):
     if team != "ct" and team != "t":
       raise ValueError("Team should be 't' or 'ct'.")
@@ -32,3 +37,8 @@ class TeamHpMetric(BaseMetric):
     players = frame[self.teamside]["players"]
     hps = [player["hp"] for player in players]
     return sum(hps)
+
+  def process_metric_frames(self, frames: RoundFrames) -> np.ndarray:
+    """Sums the hp over the player slots of all frames at once (empty slots are NaN and ignored)."""
+    hps = frames.get_player_values("hp", SideType.from_str(self.teamside))
+    return np.nansum(hps, axis=1)
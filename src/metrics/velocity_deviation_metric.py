@@ -1,9 +1,12 @@
 import logging
+import warnings
 
+import numpy as np
 from numpy import std
 
 from datamodel.data_manager import DataManager
-from metrics.base_metric import BaseMetric
+from datamodel.side_type import SideType
+from metrics.base_metric import BaseMetric, RoundFrames
 
 logger = logging.getLogger(__name__)
 
@@ -30,3 +33,12 @@ class VelocityDeviationMetric(BaseMetric):
     players = frame["t"]["players"]
     velocities = [abs(player["velocityX"])+abs(player["velocityX"]) for player in players]
     return std(velocities)
+
+  def process_metric_frames(self, frames: RoundFrames) -> np.ndarray:
+    """Takes the standard deviation over the player slots of all frames at once (empty slots are ignored, frames
+    without players are NaN)."""
+    velocities_x = frames.get_player_values("velocityX", SideType.T)
+    velocities = np.abs(velocities_x) + np.abs(velocities_x)
+    with warnings.catch_warnings():
+      warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN frames
+      return np.nanstd(velocities, axis=1)
@@ -0,0 +1,111 @@
+import numpy as np
+import torch
+from sklearn.preprocessing import OneHotEncoder
+
+
+def onehot_lookup(encoder: OneHotEncoder, values) -> np.ndarray:
+    """Vectorized `encoder.transform` for a fitted single-feature OneHotEncoder with handle_unknown="ignore".
+
+    All values are looked up in the encoder's (sorted) categories at once, and the ones are set with a single
+    fancy-index assignment. Unknown values get an all-zero row. Returns the one-hot rows of shape [n, n_categories].
+    """
+    categories = encoder.categories_[0]
+    values = np.asarray(values).reshape(-1)
+    onehot = np.zeros((len(values), len(categories)), dtype=np.float64)
+    if len(categories) == 0:
+        return onehot
+    cols = np.minimum(np.searchsorted(categories, values), len(categories) - 1)
+    known = np.flatnonzero(categories[cols] == values)
+    onehot[known, cols[known]] = 1.0
+    return onehot
+
+
+def build_node_features(
+    graph_dicts: list[dict],
+    area_encoder: OneHotEncoder,
+    node_type_encoder: OneHotEncoder,
+    min_utility: float,
+    utility_range: float,
+    global_min_x: float,
+    global_x_range: float,
+    global_min_y: float,
+    global_y_range: float,
+) -> list[torch.Tensor]:
+    """Builds the node feature matrices of all given graphs in one vectorized pass.
+
+    The features of a node are its normalized utility, the isAlive and hasBomb flags, the one-hot areaId, its
+    normalized x and y position and the one-hot nodeType. Nodes are in `nodes_data` order.
+
+    Returns:
+        list[torch.Tensor]: One float tensor of shape [nodes, features] per graph.
+    """
+    if not graph_dicts:
+        return []
+    nodes = [node for graph_dict in graph_dicts for node in graph_dict["nodes_data"].values()]
+    node_counts = [len(graph_dict["nodes_data"]) for graph_dict in graph_dicts]
+
+    def column(key: str) -> np.ndarray:
+        return np.array([node.get(key, 0) for node in nodes], dtype=np.float64).reshape(-1, 1)
+
+    features = np.hstack(
+        [
+            (column("totalUtility") - min_utility) / utility_range,
+            column("isAlive"),
+            column("hasBomb"),
+            onehot_lookup(area_encoder, [node.get("areaId", 0) for node in nodes]),
+            (column("x") - global_min_x) / global_x_range,
+            (column("y") - global_min_y) / global_y_range,
+            onehot_lookup(node_type_encoder, [node.get("nodeType", 0) for node in nodes]),
+        ]
+    )
+    return list(torch.from_numpy(features).float().split(node_counts))
+
+
+class NodeStatistics:
+    """Normalization statistics and encoder categories of the nodes of a set of graphs, computed in a single
+    streaming pass (see `update`), so the graphs do not have to be held in memory at once."""
+
+    def __init__(self):
+        self.area_ids: set = set()
+        self.node_type_ids: set = set()
+        self.min_utility = self.min_x = self.min_y = float("inf")
+        self.max_utility = self.max_x = self.max_y = float("-inf")
+
+    def update(self, graph_dict: dict) -> None:
+        """Adds the nodes of a graph to the statistics."""
+        for node in graph_dict["nodes_data"].values():
+            self.area_ids.add(node.get("areaId", 0))
+            self.node_type_ids.add(node.get("nodeType", 0))
+            utility, x, y = node.get("totalUtility", 0), node.get("x", 0), node.get("y", 0)
+            self.min_utility, self.max_utility = min(self.min_utility, utility), max(self.max_utility, utility)
+            self.min_x, self.max_x = min(self.min_x, x), max(self.max_x, x)
+            self.min_y, self.max_y = min(self.min_y, y), max(self.max_y, y)
+
+    def fit_area_encoder(self) -> OneHotEncoder:
+        """Returns a OneHotEncoder fitted on all seen areaIds (the same as fitting it on the areaIds of all nodes)."""
+        return OneHotEncoder(sparse_output=False, handle_unknown="ignore").fit(
+            [[area_id] for area_id in sorted(self.area_ids)]
+        )
+
+    def fit_node_type_encoder(self) -> OneHotEncoder:
+        """Returns a OneHotEncoder fitted on all seen nodeTypes."""
+        return OneHotEncoder(sparse_output=False, handle_unknown="ignore").fit(
+            [[node_type] for node_type in sorted(self.node_type_ids)]
+        )
+
+    def get_normalization(self) -> dict[str, float]:
+        """Returns the min/max and range of the utility and the x and y position, named like the attributes of the
+        graph datasets. Ranges of constant values are 1. Raises a ValueError if no nodes were seen."""
+        if not self.node_type_ids:
+            raise ValueError("No graph nodes to compute normalization statistics from.")
+        return {
+            "min_utility": self.min_utility,
+            "max_utility": self.max_utility,
+            "utility_range": self.max_utility - self.min_utility if self.max_utility != self.min_utility else 1,
+            "global_min_x": self.min_x,
+            "global_max_x": self.max_x,
+            "global_x_range": self.max_x - self.min_x if self.max_x != self.min_x else 1,
+            "global_min_y": self.min_y,
+            "global_max_y": self.max_y,
+            "global_y_range": self.max_y - self.min_y if self.max_y != self.min_y else 1,
+        }
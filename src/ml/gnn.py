@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 import pickle
@@ -7,178 +8,216 @@ import joblib
 import numpy as np
 import torch
 import torch.nn.functional as F
-from sklearn.preprocessing import OneHotEncoder
 from sklearn.utils.class_weight import compute_class_weight
 from torch.nn import Dropout, Linear
 from torch.utils.data import Dataset, random_split
-from torch_geometric.data import Data
+from torch_geometric.data import Data, InMemoryDataset
+from torch_geometric.data.separate import separate
 from torch_geometric.loader import DataLoader
 from torch_geometric.nn import GCNConv, global_add_pool
 from torch_geometric.utils import add_self_loops
 from torchmetrics import Accuracy, F1Score, Precision, Recall
 
+from datamodel.graph_store import is_graph_file, load_graph_file
+from ml.features import NodeStatistics, build_node_features
+from ml.graph_files import LazyGraphFiles
+
 #TODO: Fields need to be updated since create_graphs.py was changed.
 
+# Bump when the features or the layout of the processed dataset files change, to invalidate all existing ones
+PROCESSED_FORMAT_VERSION = 2
+
+# Attributes of GraphDataset that are stored in (and restored from) its processed dataset file
+PROCESSED_ATTRIBUTES = (
+    "area_encoder",
+    "node_type_encoder",
+    "label_to_id",
+    "min_utility",
+    "max_utility",
+    "utility_range",
+    "global_min_x",
+    "global_max_x",
+    "global_min_y",
+    "global_max_y",
+    "global_x_range",
+    "global_y_range",
+)
+
+
+def find_graph_files(graph_root_dir) -> list[str]:
+    """Returns the paths of all graph files below the given directory, in os.walk order."""
+    return [
+        os.path.join(root, file)
+        for root, _, files in os.walk(graph_root_dir)
+        for file in files
+        if is_graph_file(file)
+    ]
+
+
+def get_processed_dataset_key(graph_files: list[str], *fingerprinted) -> str:
+    """Returns a key that changes whenever a graph file is added, removed or modified, or any of the given objects
+    (encoders, label maps) changes."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"v{PROCESSED_FORMAT_VERSION}\n".encode())
+    for file_path in sorted(graph_files):
+        stat = os.stat(file_path)
+        digest.update(f"{file_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    for obj in fingerprinted:
+        digest.update(pickle.dumps(obj))
+    return digest.hexdigest()
+
+
 class GraphDataset(Dataset):
+    """Dataset of the labeled graphs below `graph_root_dir` as PyG Data objects.
+
+    If a `processed_dir` is given, the processed graphs are collated (like PyG's InMemoryDataset) and saved there
+    together with the encoders and normalization statistics, keyed by the graph files and the given encoders and
+    labels. Later runs with the same inputs load that file instead of reading and featurizing all graphs again.
+
+    With `lazy=True` only the position of every graph in its file is kept in memory, and graphs are read and
+    featurized on access (see `LazyGraphFiles`, which caches the `cache_size` most recently used files), so corpora
+    larger than RAM can be trained on. The normalization statistics are computed in a single streaming pass over the
+    files. Lazy datasets ignore `processed_dir`.
+    """
+
     def __init__(
         self,
         graph_root_dir,
         area_encoder=None,
         label_to_id=None,
         node_type_encoder=None,
+        processed_dir=None,
+        lazy=False,
+        cache_size=8,
     ):
         super().__init__()
         self.graph_root_dir = graph_root_dir
         self.all_graphs = []
-        self.area_ids = []
-
-        # Search all folders for the graphs
-        for root, _, files in os.walk(self.graph_root_dir):
-            # print(f"Searching in {root} for .pkl files")
-            for file in files:
-                if file.endswith(".pkl"):
-                    file_path = os.path.join(root, file)
-                    with open(file_path, "rb") as f:
-                        graphs_in_file = pickle.load(f)
-                        if isinstance(graphs_in_file, list):
-                            for i, graph_data in enumerate(graphs_in_file):
-                                strategy = graph_data.get("graph_data", {}).get(
-                                    "strategy_used", "unknown"
-                                )
-                                if strategy != "unknown":
-                                    self.all_graphs.append((graph_data, file_path, i))
-                        else:
-                            strategy = graphs_in_file.get("graph_data", {}).get(
-                                "strategy_used", "unknown"
-                            )
-                            if strategy != "unknown":
-                                self.all_graphs.append((graphs_in_file, file_path, 0))
-
-        # Collect data for normalizations
-        self.node_type_ids = []
-        self.area_ids = []
-        self.all_utilities = []
-        self.all_x = []
-        self.all_y = []
-        for graph_data, _, _ in self.all_graphs:
-            for node in graph_data["nodes_data"].values():
-                self.area_ids.append([node.get("areaId", 0)])
-                self.node_type_ids.append([node.get("nodeType", 0)])
-                self.all_utilities.append(node.get("totalUtility", 0))
-                self.all_x.append(node.get("x", 0))
-                self.all_y.append(node.get("y", 0))
-
-        # AreaId OneHotEncoder
-        if area_encoder is not None:
-            self.area_encoder = area_encoder
-        else:
-            self.area_encoder = OneHotEncoder(
-                sparse_output=False, handle_unknown="ignore"
-            )
-            self.area_encoder.fit(self.area_ids)
-
-        # Node type normalization
-        if node_type_encoder is not None:
-            self.node_type_encoder = node_type_encoder
-        else:
-            self.node_type_encoder = OneHotEncoder(
-                sparse_output=False, handle_unknown="ignore"
-            )
-            self.node_type_encoder.fit(self.node_type_ids)
-
-        # Utility normalization
-        self.min_utility = min(self.all_utilities)
-        self.max_utility = max(self.all_utilities)
-        self.utility_range = (
-            self.max_utility - self.min_utility
-            if self.max_utility != self.min_utility
-            else 1
-        )
-
-        # Position normalization
-        self.global_min_x, self.global_max_x = min(self.all_x), max(self.all_x)
-        self.global_min_y, self.global_max_y = min(self.all_y), max(self.all_y)
-        self.global_x_range = (
-            self.global_max_x - self.global_min_x
-            if self.global_max_x != self.global_min_x
-            else 1
-        )
-        self.global_y_range = (
-            self.global_max_y - self.global_min_y
-            if self.global_max_y != self.global_min_y
-            else 1
-        )
+        self.processed_graphs = []
+        self.lazy_graphs = None  # LazyGraphFiles index of the graphs, in lazy mode
+        self._collated = None  # (data, slices) of the processed graphs, when loaded from a processed dataset file
 
         # Collect unique labels from all graphs
-        if label_to_id is not None:
-            self.label_to_id = label_to_id
-        else:
+        if label_to_id is None:
             with open(
                 "research_project\\tactic_labels\\de_dust2_tactics.json"
             ) as f:
                 tactics = json.load(f)
             strategies = [item["id"] for item in tactics]
-            self.label_to_id = {label: idx for idx, label in enumerate(strategies)}
-
-        # Convert each graph to a PyG Data object
+            label_to_id = {label: idx for idx, label in enumerate(strategies)}
+        self.label_to_id = label_to_id
+
+        graph_files = find_graph_files(self.graph_root_dir)
+        processed_path = None
+        if processed_dir is not None and not lazy:
+            key = get_processed_dataset_key(graph_files, area_encoder, node_type_encoder, label_to_id)
+            processed_path = os.path.join(processed_dir, f"graph_dataset-{key}.pt")
+            if os.path.exists(processed_path):
+                self._load_processed(processed_path)
+                return
+
+        # Search all folders for the labeled graphs, collecting the normalization statistics in the same pass
+        stats = NodeStatistics()
+        if lazy:
+            # Only keep the positions of the graphs in their files, the graphs are loaded again in __getitem__
+            self.lazy_graphs = LazyGraphFiles(
+                graph_files, keep=self._is_labeled, on_graph=stats.update, cache_size=cache_size
+            )
+        else:
+            for file_path in graph_files:
+                graphs_in_file = load_graph_file(file_path)
+                if not isinstance(graphs_in_file, list):
+                    graphs_in_file = [graphs_in_file]
+                for i, graph_data in enumerate(graphs_in_file):
+                    if self._is_labeled(graph_data):
+                        self.all_graphs.append((graph_data, file_path, i))
+                        stats.update(graph_data)
+
+        self.area_encoder = area_encoder if area_encoder is not None else stats.fit_area_encoder()
+        self.node_type_encoder = node_type_encoder if node_type_encoder is not None else stats.fit_node_type_encoder()
+        # Utility and position normalization
+        for name, value in stats.get_normalization().items():
+            setattr(self, name, value)
+        if lazy:
+            return
+
+        # Build the node features of all graphs at once, then convert each graph to a PyG Data object
+        node_features = build_node_features(
+            [graph_data for graph_data, _, _ in self.all_graphs], *self._feature_parameters()
+        )
         self.processed_graphs = [
-            self._process_graph_data(graph_data, file_path, idx)
-            for graph_data, file_path, idx in self.all_graphs
+            self._process_graph_data(graph_data, file_path, idx, x)
+            for (graph_data, file_path, idx), x in zip(self.all_graphs, node_features, strict=True)
         ]
+        if processed_path is not None:
+            self._save_processed(processed_path)
+
+    @staticmethod
+    def _is_labeled(graph_dict):
+        return graph_dict.get("graph_data", {}).get("strategy_used", "unknown") != "unknown"
+
+    def _feature_parameters(self):
+        """The encoders and normalization statistics, as passed to `build_node_features`."""
+        return (
+            self.area_encoder,
+            self.node_type_encoder,
+            self.min_utility,
+            self.utility_range,
+            self.global_min_x,
+            self.global_x_range,
+            self.global_min_y,
+            self.global_y_range,
+        )
+
+    def _save_processed(self, processed_path):
+        data, slices = InMemoryDataset.collate(self.processed_graphs)
+        os.makedirs(os.path.dirname(processed_path), exist_ok=True)
+        tmp_path = f"{processed_path}.tmp-{os.getpid()}"
+        torch.save(
+            {
+                "data": data,
+                "slices": slices,
+                "attributes": {name: getattr(self, name) for name in PROCESSED_ATTRIBUTES},
+            },
+            tmp_path,
+        )
+        os.replace(tmp_path, processed_path)
+
+    def _load_processed(self, processed_path):
+        processed = torch.load(processed_path, weights_only=False)
+        for name, value in processed["attributes"].items():
+            setattr(self, name, value)
+        if processed["slices"] is None:  # collate returns a single graph as is
+            self.processed_graphs = [processed["data"]]
+        else:
+            self._collated = (processed["data"], processed["slices"])
 
     def __len__(self):
+        if self.lazy_graphs is not None:
+            return len(self.lazy_graphs)
+        if self._collated is not None:
+            _, slices = self._collated
+            return len(slices["y"]) - 1
         return len(self.processed_graphs)
 
     def __getitem__(self, idx):
+        if self.lazy_graphs is not None:
+            graph_data, file_path, graph_idx = self.lazy_graphs[idx]
+            x = build_node_features([graph_data], *self._feature_parameters())[0]
+            return self._process_graph_data(graph_data, file_path, graph_idx, x)
+        if self._collated is not None:
+            data, slices = self._collated
+            return separate(cls=data.__class__, batch=data, idx=idx, slice_dict=slices, decrement=False)
         return self.processed_graphs[idx]
 
-    def _process_graph_data(self, graph_dict, file_path, graph_idx):
-        # selected_keys = ["x", "y", "hp", "armor", "isAlive", "hasBomb", "nodeType", "areaId"]
-        # print("Nodes data keys:", graph_dict["nodes_data"].values())
-        # print(graph_dict["graph_data"].keys(), graph_dict["graph_data"].values())
-
+    def _process_graph_data(self, graph_dict, file_path, graph_idx, x):
+        """Converts a graph to a PyG Data object, given its node features from `build_node_features`."""
         # Extract graph features
         graph_data = graph_dict.get("graph_data", {})
         graph_features = [
             graph_data.get("seconds", 0) / 175.0,  # Normalize
         ]
 
-        # Extract node features
-        node_dicts = graph_dict["nodes_data"].values()
-        node_features = []
-        for node in node_dicts:
-            # hp = node.get("hp", 0) / 100.0
-            # armor = node.get("armor", 0) / 100.0
-            norm_utility = (
-                node.get("totalUtility", 0) - self.min_utility
-            ) / self.utility_range
-
-            norm_x = (node.get("x", 0) - self.global_min_x) / self.global_x_range
-            norm_y = (node.get("y", 0) - self.global_min_y) / self.global_y_range
-
-            area_onehot = self.area_encoder.transform([[node.get("areaId", 0)]])[0]
-
-            binary_flags = [
-                float(node.get("isAlive", 0)),
-                float(node.get("hasBomb", 0)),
-            ]
-
-            node_type_onehot = self.node_type_encoder.transform(
-                [[node.get("nodeType", 0)]]
-            )[0]
-
-            full_feature = (
-                [norm_utility]
-                + list(binary_flags)
-                + list(area_onehot)
-                + [norm_x, norm_y]
-                + list(node_type_onehot)
-            )
-
-            node_features.append(full_feature)
-
-        x = torch.tensor(node_features, dtype=torch.float)
-
         # Create node index mapping
         node_ids = sorted(graph_dict["nodes_data"].keys())
         node_map = {nid: i for i, nid in enumerate(node_ids)}
@@ -211,7 +250,8 @@ class GraphDataset(Dataset):
             x=x,
             edge_index=edge_index,
             y=torch.tensor(label, dtype=torch.long),
-            graph_feat=torch.tensor(graph_features, dtype=torch.float),
+            # [1, graph_feat_dim], so that a batch collates to [batch_size, graph_feat_dim]
+            graph_feat=torch.tensor([graph_features], dtype=torch.float),
         )
 
 
@@ -233,7 +273,8 @@ class GNN(torch.nn.Module):
         x = F.relu(self.conv2(x, edge_index))
         x = global_add_pool(x, batch)
 
-        graph_feats = torch.stack([d.graph_feat for d in data.to_data_list()])
+        # [batch_size, graph_feat_dim]; the reshape also accepts graphs stored with a flat graph_feat
+        graph_feats = data.graph_feat.reshape(x.size(0), -1)
         x = torch.cat([x, graph_feats.to(x.device)], dim=1)
 
         return self.lin(x)
@@ -244,7 +285,7 @@ def train():
     print(f"Using device: {device}")
 
     data_path = "research_project/graphs"
-    dataset = GraphDataset(data_path)
+    dataset = GraphDataset(data_path, processed_dir="research_project/graphs_processed")
 
     # Print label distribution
     labels = [data.y.item() for data in dataset]
@@ -267,7 +308,7 @@ def train():
 
     # Model setup
     sample_graph = dataset[0]
-    graph_feat_dim = dataset[0].graph_feat.shape[0]
+    graph_feat_dim = dataset[0].graph_feat.shape[-1]
     input_dim = sample_graph.num_node_features
     output_dim = int(max(labels)) + 1
     hidden_channels = 64
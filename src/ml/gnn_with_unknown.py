@@ -1,5 +1,4 @@
 import os
-import pickle
 from collections import Counter
 
 import joblib
@@ -16,6 +15,8 @@ from torch_geometric.nn import GCNConv, global_add_pool
 from torch_geometric.utils import add_self_loops
 from torchmetrics import Accuracy, F1Score, Precision, Recall
 
+from datamodel.graph_store import is_graph_file, load_graph_file
+
 #TODO: Fields need to be updated since create_graphs.py was changed.
 
 class GraphDataset(Dataset):
@@ -25,18 +26,17 @@ class GraphDataset(Dataset):
         self.all_graphs = []
         self.area_ids = []
 
-        # Recursively search all folders for .pkl files
+        # Recursively search all folders for graph files
         for root, _, files in os.walk(self.graph_root_dir):
             for file in files:
-                if file.endswith(".pkl"):
+                if is_graph_file(file):
                     file_path = os.path.join(root, file)
-                    with open(file_path, "rb") as f:
-                        graphs_in_file = pickle.load(f)
-                        if isinstance(graphs_in_file, list):
-                            for i, graph_data in enumerate(graphs_in_file):
-                                self.all_graphs.append((graph_data, file_path, i))
-                        else:
-                            self.all_graphs.append((graphs_in_file, file_path, 0))
+                    graphs_in_file = load_graph_file(file_path)
+                    if isinstance(graphs_in_file, list):
+                        for i, graph_data in enumerate(graphs_in_file):
+                            self.all_graphs.append((graph_data, file_path, i))
+                    else:
+                        self.all_graphs.append((graphs_in_file, file_path, 0))
 
         # Collect areaId for OneHotEncoder
         for graph_data, _, _ in self.all_graphs:
@@ -163,7 +163,8 @@ class GraphDataset(Dataset):
             x=x,
             edge_index=edge_index,
             y=torch.tensor(label, dtype=torch.long),
-            graph_feat=torch.tensor(graph_features, dtype=torch.float),
+            # [1, graph_feat_dim], so that a batch collates to [batch_size, graph_feat_dim]
+            graph_feat=torch.tensor([graph_features], dtype=torch.float),
         )
 
 
@@ -185,7 +186,8 @@ class GNN(torch.nn.Module):
         x = F.relu(self.conv2(x, edge_index))
         x = global_add_pool(x, batch)
 
-        graph_feats = torch.stack([d.graph_feat for d in data.to_data_list()])
+        # [batch_size, graph_feat_dim]; the reshape also accepts graphs stored with a flat graph_feat
+        graph_feats = data.graph_feat.reshape(x.size(0), -1)
         x = torch.cat([x, graph_feats.to(x.device)], dim=1)
 
         return self.lin(x)
@@ -219,7 +221,7 @@ def train():
 
     # Model setup
     sample_graph = dataset[0]
-    graph_feat_dim = dataset[0].graph_feat.shape[0]
+    graph_feat_dim = dataset[0].graph_feat.shape[-1]
     input_dim = sample_graph.num_node_features
     output_dim = int(max(labels)) + 1
     hidden_channels = 64
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from collections.abc import Callable
+
+from datamodel.graph_store import load_graph_file
+
+
+class LazyGraphFiles:
+    """Index of the graphs in a set of graph files that loads the files on demand.
+
+    Only (file, position in file) of every graph is kept in memory, and the `cache_size` most recently used files
+    are cached. Datasets built on it can be used with several DataLoader workers: the cache is not pickled, so every
+    worker starts with an empty cache of its own.
+    """
+
+    def __init__(
+        self,
+        graph_files: list[str],
+        keep: Callable[[dict], bool] | None = None,
+        on_graph: Callable[[dict], None] | None = None,
+        cache_size: int = 8,
+    ):
+        """
+        Args:
+            graph_files (list[str]): The graph files to index, in dataset order.
+            keep (Callable[[dict], bool] | None): Returns whether a graph belongs to the dataset. All graphs by default.
+            on_graph (Callable[[dict], None] | None): Called with every kept graph while indexing, e.g. to compute
+                statistics in the same pass.
+            cache_size (int): The number of graph files to keep in memory.
+        """
+        self.graph_files = graph_files
+        self.cache_size = max(1, cache_size)
+        self.entries: list[tuple[int, int]] = []  # (index into graph_files, index of the graph in its file)
+        self._cache: OrderedDict[int, list[dict]] = OrderedDict()
+        for file_idx, file_path in enumerate(graph_files):
+            graphs_in_file = load_graph_file(file_path)
+            if not isinstance(graphs_in_file, list):
+                graphs_in_file = [graphs_in_file]
+            for graph_idx, graph_dict in enumerate(graphs_in_file):
+                if keep is None or keep(graph_dict):
+                    self.entries.append((file_idx, graph_idx))
+                    if on_graph is not None:
+                        on_graph(graph_dict)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, idx: int) -> tuple[dict, str, int]:
+        """Returns the graph dict, its file and its position in the file."""
+        file_idx, graph_idx = self.entries[idx]
+        return self._load(file_idx)[graph_idx], self.graph_files[file_idx], graph_idx
+
+    def _load(self, file_idx: int) -> list[dict]:
+        if file_idx in self._cache:
+            self._cache.move_to_end(file_idx)
+            return self._cache[file_idx]
+        graphs_in_file = load_graph_file(self.graph_files[file_idx])
+        if not isinstance(graphs_in_file, list):
+            graphs_in_file = [graphs_in_file]
+        self._cache[file_idx] = graphs_in_file
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return graphs_in_file
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+        return state
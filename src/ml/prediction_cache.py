@@ -0,0 +1,136 @@
+"""Per-round tactic predictions of a match, computed on demand and persisted to one cache file per match and model.
+
+The cache file `<cache_dir>/<match_id>-<model hash>.json` holds the normalization statistics of the match and the
+predictions of every round predicted so far. It is keyed by a hash of the checkpoint and encoders, so a retrained
+model never reads stale predictions, and it is discarded when a graph file of the match is added, removed or
+modified.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from datamodel.graph_store import get_graph_file_round_index, load_graph_file
+from ml.features import NodeStatistics
+from ml.gnn import find_graph_files, get_processed_dataset_key
+from ml.predictor import DEFAULT_CHECKPOINT, get_prediction_engine
+
+PREDICTION_CACHE_VERSION = 1
+MODEL_FILES = ("label_to_id.pkl", "area_encoder.pkl", "node_type_encoder.pkl")
+
+
+@functools.lru_cache(maxsize=8)
+def _hash_files(file_stamps: tuple[tuple[str, int, int], ...]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for file_path, _, _ in file_stamps:
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_model_hash(models_dir, checkpoint_name=DEFAULT_CHECKPOINT) -> str:
+    """Returns a hash of the checkpoint and encoders of a models directory. The files are only read again when their
+    size or modification time changes."""
+    file_stamps = []
+    for name in (checkpoint_name, *MODEL_FILES):
+        file_path = Path(models_dir) / name
+        stat = os.stat(file_path)
+        file_stamps.append((str(file_path.resolve()), stat.st_size, stat.st_mtime_ns))
+    return _hash_files(tuple(file_stamps))
+
+
+class MatchPredictions:
+    """The predicted tactic of every frame of a match, by round. Rounds are predicted when first requested (see
+    `predict_round`) and written to the cache file, so reopening a match only reads that file.
+
+    Without a `cache_dir`, the predictions are only kept in memory. `predict_round` can be called from several
+    threads, e.g. a GUI worker thread.
+    """
+
+    def __init__(self, models_dir, graph_dir, cache_dir=None, checkpoint_name=DEFAULT_CHECKPOINT):
+        self.models_dir = Path(models_dir)
+        self.checkpoint_name = checkpoint_name
+        graph_files = find_graph_files(graph_dir)
+        self.round_files = {
+            round_index: file_path
+            for file_path in graph_files
+            if (round_index := get_graph_file_round_index(file_path)) is not None
+        }
+        self.graphs_key = get_processed_dataset_key(graph_files)
+        self.cache_path = None
+        if cache_dir is not None:
+            model_hash = get_model_hash(self.models_dir, checkpoint_name)
+            self.cache_path = Path(cache_dir) / f"{Path(graph_dir).name}-{model_hash}.json"
+        self.normalization = None
+        self.rounds: dict[int, list[str]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if self.cache_path is None or not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cached.get("version") != PREDICTION_CACHE_VERSION or cached.get("graphs_key") != self.graphs_key:
+            return
+        self.normalization = cached["normalization"]
+        self.rounds = {int(round_index): predictions for round_index, predictions in cached["rounds"].items()}
+
+    def _save(self):
+        if self.cache_path is None:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_name(f"{self.cache_path.name}.tmp-{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": PREDICTION_CACHE_VERSION,
+                    "graphs_key": self.graphs_key,
+                    "normalization": self.normalization,
+                    "rounds": self.rounds,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.cache_path)
+
+    def get_normalization(self) -> dict[str, float]:
+        """Returns the normalization statistics of all graphs of the match, computed in one streaming pass on first
+        use. All rounds are featurized with them, as if the whole match was predicted at once."""
+        if self.normalization is None:
+            stats = NodeStatistics()
+            for file_path in self.round_files.values():
+                graphs_in_file = load_graph_file(file_path)
+                for graph_data in graphs_in_file if isinstance(graphs_in_file, list) else [graphs_in_file]:
+                    stats.update(graph_data)
+            self.normalization = stats.get_normalization()
+        return self.normalization
+
+    def get_missing_rounds(self) -> list[int]:
+        """Returns the indices of the rounds with graphs that are not predicted yet."""
+        return sorted(round_index for round_index in self.round_files if round_index not in self.rounds)
+
+    def predict_round(self, round_index: int) -> list[str]:
+        """Returns the predicted tactic of every frame of a round, predicting it if it is not cached. Rounds without
+        graphs have no predictions."""
+        with self._lock:
+            if round_index in self.rounds:
+                return self.rounds[round_index]
+            if round_index not in self.round_files:
+                return []
+            engine = get_prediction_engine(self.models_dir, self.checkpoint_name)
+            self.rounds[round_index] = engine.predict_graph_files(
+                [self.round_files[round_index]], normalization=self.get_normalization()
+            )
+            self._save()
+            return self.rounds[round_index]
+
+    def to_list(self, round_count: int) -> list[list[str]]:
+        """Returns the predictions as [round][frame], with an empty list for the rounds that are not predicted yet."""
+        return [self.rounds.get(round_index, []) for round_index in range(round_count)]
@@ -1,102 +1,80 @@
+import argparse
+import functools
 import json
 import os
-import pickle
+import sys
+from pathlib import Path
 
 import joblib
 import torch
-from sklearn.preprocessing import OneHotEncoder
+from dotenv import load_dotenv
 from torch.utils.data import Dataset
 from torch_geometric.data import Data
 from torch_geometric.loader import DataLoader
 from torch_geometric.utils import add_self_loops
 
-from ml.gnn import GNN
+from datamodel.graph_store import graph_file_sort_key, load_graph_file
+from ml.features import NodeStatistics, build_node_features
+from ml.gnn import GNN, find_graph_files
+from ml.graph_files import LazyGraphFiles
+
+DEFAULT_CHECKPOINT = "checkpoint11.pt"
+DEFAULT_BATCH_SIZE = 256  # Graphs per forward pass
 
 #TODO: Fields need to be updated since create_graphs.py was changed.
 
 class GraphDatasetPredictor(Dataset):
+    """Dataset of all graphs below `graph_root_dir` as PyG Data objects, labeled or not, ordered by round and frame.
+
+    With `lazy=True` only the position of every graph in its file is kept in memory and graphs are read and
+    featurized on access, like the lazy mode of `ml.gnn.GraphDataset`.
+
+    `graph_files` restricts the dataset to the given files instead of all files below `graph_root_dir`, and
+    `normalization` (see `NodeStatistics.get_normalization`) replaces the statistics of the loaded graphs, so that a
+    subset of a match (e.g. one round) is featurized like the whole match.
+    """
+
     def __init__(
         self,
         graph_root_dir,
         area_encoder=None,
         label_to_id=None,
         node_type_encoder=None,
-        tactics_labels=None
+        tactics_labels=None,
+        lazy=False,
+        cache_size=8,
+        graph_files=None,
+        normalization=None,
     ):
         super().__init__()
         self.graph_root_dir = graph_root_dir
         self.all_graphs = []
-        self.area_ids = []
+        self.processed_graphs = []
+        self.lazy_graphs = None  # LazyGraphFiles index of the graphs, in lazy mode
         self.tactics_labels_path = tactics_labels
 
-        # Search all folders for the graphs
-        for root, _, files in os.walk(self.graph_root_dir):
-            # print(f"Searching in {root} for .pkl files")
-            for file in files:
-                if file.endswith(".pkl"):
-                    file_path = os.path.join(root, file)
-                    with open(file_path, "rb") as f:
-                        graphs_in_file = pickle.load(f)
-                        if isinstance(graphs_in_file, list):
-                            for i, graph_data in enumerate(graphs_in_file):
-                                self.all_graphs.append((graph_data, file_path, i))
-                        else:
-                            self.all_graphs.append((graphs_in_file, file_path, 0))
-
-        # Collect data for normalizations
-        self.node_type_ids = []
-        self.area_ids = []
-        self.all_utilities = []
-        self.all_x = []
-        self.all_y = []
-        for graph_data, _, _ in self.all_graphs:
-            for node in graph_data["nodes_data"].values():
-                self.area_ids.append([node.get("areaId", 0)])
-                self.node_type_ids.append([node.get("nodeType", 0)])
-                self.all_utilities.append(node.get("totalUtility", 0))
-                self.all_x.append(node.get("x", 0))
-                self.all_y.append(node.get("y", 0))
-
-        # AreaId OneHotEncoder
-        if area_encoder is not None:
-            self.area_encoder = area_encoder
+        # Search all folders for the graphs, collecting the normalization statistics in the same pass. The graphs are
+        # in round and frame order, so predictions can be mapped back to [round][frame].
+        if graph_files is None:
+            graph_files = find_graph_files(self.graph_root_dir)
+        graph_files = sorted(graph_files, key=graph_file_sort_key)
+        stats = NodeStatistics()
+        if lazy:
+            self.lazy_graphs = LazyGraphFiles(graph_files, on_graph=stats.update, cache_size=cache_size)
         else:
-            self.area_encoder = OneHotEncoder(
-                sparse_output=False, handle_unknown="ignore"
-            )
-            self.area_encoder.fit(self.area_ids)
-
-        # Node type normalization
-        if node_type_encoder is not None:
-            self.node_type_encoder = node_type_encoder
-        else:
-            self.node_type_encoder = OneHotEncoder(
-                sparse_output=False, handle_unknown="ignore"
-            )
-            self.node_type_encoder.fit(self.node_type_ids)
-
-        # Utility normalization
-        self.min_utility = min(self.all_utilities)
-        self.max_utility = max(self.all_utilities)
-        self.utility_range = (
-            self.max_utility - self.min_utility
-            if self.max_utility != self.min_utility
-            else 1
-        )
-
-        # Position normalization
-        self.global_min_x, self.global_max_x = min(self.all_x), max(self.all_x)
-        self.global_min_y, self.global_max_y = min(self.all_y), max(self.all_y)
-        self.global_x_range = (
-            self.global_max_x - self.global_min_x
-            if self.global_max_x != self.global_min_x
-            else 1
-        )
-        self.global_y_range = (
-            self.global_max_y - self.global_min_y
-            if self.global_max_y != self.global_min_y
-            else 1
-        )
+            for file_path in graph_files:
+                graphs_in_file = load_graph_file(file_path)
+                if not isinstance(graphs_in_file, list):
+                    graphs_in_file = [graphs_in_file]
+                for i, graph_data in enumerate(graphs_in_file):
+                    self.all_graphs.append((graph_data, file_path, i))
+                    stats.update(graph_data)
+
+        self.area_encoder = area_encoder if area_encoder is not None else stats.fit_area_encoder()
+        self.node_type_encoder = node_type_encoder if node_type_encoder is not None else stats.fit_node_type_encoder()
+        # Utility and position normalization
+        for name, value in (normalization or stats.get_normalization()).items():
+            setattr(self, name, value)
 
         # Collect unique labels from all graphs
         if label_to_id is not None:
@@ -110,66 +88,57 @@ class GraphDatasetPredictor(Dataset):
                 tactics = json.load(f)
             strategies = [item["id"] for item in tactics]
             self.label_to_id = {label: idx for idx, label in enumerate(strategies)}
+        if lazy:
+            return
 
-        # Convert each graph to a PyG Data object
+        # Build the node features of all graphs at once, then convert each graph to a PyG Data object
+        node_features = build_node_features(
+            [graph_data for graph_data, _, _ in self.all_graphs], *self._feature_parameters()
+        )
         self.processed_graphs = [
-            self._process_graph_data(graph_data, file_path, idx)
-            for graph_data, file_path, idx in self.all_graphs
+            self._process_graph_data(graph_data, file_path, idx, x)
+            for (graph_data, file_path, idx), x in zip(self.all_graphs, node_features, strict=True)
         ]
 
+    def _feature_parameters(self):
+        """The encoders and normalization statistics, as passed to `build_node_features`."""
+        return (
+            self.area_encoder,
+            self.node_type_encoder,
+            self.min_utility,
+            self.utility_range,
+            self.global_min_x,
+            self.global_x_range,
+            self.global_min_y,
+            self.global_y_range,
+        )
+
+    def get_file_paths(self) -> list[str]:
+        """Returns the graph file of every graph, in dataset order."""
+        if self.lazy_graphs is not None:
+            return [self.lazy_graphs.graph_files[file_idx] for file_idx, _ in self.lazy_graphs.entries]
+        return [file_path for _, file_path, _ in self.all_graphs]
+
     def __len__(self):
+        if self.lazy_graphs is not None:
+            return len(self.lazy_graphs)
         return len(self.processed_graphs)
 
     def __getitem__(self, idx):
+        if self.lazy_graphs is not None:
+            graph_data, file_path, graph_idx = self.lazy_graphs[idx]
+            x = build_node_features([graph_data], *self._feature_parameters())[0]
+            return self._process_graph_data(graph_data, file_path, graph_idx, x)
         return self.processed_graphs[idx]
 
-    def _process_graph_data(self, graph_dict, file_path, graph_idx):
-        # selected_keys = ["x", "y", "hp", "armor", "isAlive", "hasBomb", "nodeType", "areaId"]
-        # print("Nodes data keys:", graph_dict["nodes_data"].values())
-        # print(graph_dict["graph_data"].keys(), graph_dict["graph_data"].values())
-
+    def _process_graph_data(self, graph_dict, file_path, graph_idx, x):
+        """Converts a graph to a PyG Data object, given its node features from `build_node_features`."""
         # Extract graph features
         graph_data = graph_dict.get("graph_data", {})
         graph_features = [
             graph_data.get("seconds", 0) / 175.0,  # Normalize
         ]
 
-        # Extract node features
-        node_dicts = graph_dict["nodes_data"].values()
-        node_features = []
-        for node in node_dicts:
-            # hp = node.get("hp", 0) / 100.0
-            # armor = node.get("armor", 0) / 100.0
-            norm_utility = (
-                node.get("totalUtility", 0) - self.min_utility
-            ) / self.utility_range
-
-            norm_x = (node.get("x", 0) - self.global_min_x) / self.global_x_range
-            norm_y = (node.get("y", 0) - self.global_min_y) / self.global_y_range
-
-            area_onehot = self.area_encoder.transform([[node.get("areaId", 0)]])[0]
-
-            binary_flags = [
-                float(node.get("isAlive", 0)),
-                float(node.get("hasBomb", 0)),
-            ]
-
-            node_type_onehot = self.node_type_encoder.transform(
-                [[node.get("nodeType", 0)]]
-            )[0]
-
-            full_feature = (
-                [norm_utility]
-                + list(binary_flags)
-                + list(area_onehot)
-                + [norm_x, norm_y]
-                + list(node_type_onehot)
-            )
-
-            node_features.append(full_feature)
-
-        x = torch.tensor(node_features, dtype=torch.float)
-
         # Create node index mapping
         node_ids = sorted(graph_dict["nodes_data"].keys())
         node_map = {nid: i for i, nid in enumerate(node_ids)}
@@ -202,64 +171,170 @@ class GraphDatasetPredictor(Dataset):
             x=x,
             edge_index=edge_index,
             y=torch.tensor(label, dtype=torch.long),
-            graph_feat=torch.tensor(graph_features, dtype=torch.float),
+            # [1, graph_feat_dim], so that a batch collates to [batch_size, graph_feat_dim]
+            graph_feat=torch.tensor([graph_features], dtype=torch.float),
         )
 
 
-class Predictor:
-    def __init__(self, model_path, dataset_path, labels_path):
-        self.model_path = model_path
-        self.mlmodel = model_path / "checkpoint11.pt"
-        self.dataset_path = dataset_path
-        self.labels_path = labels_path / "de_dust2_tactics.json"
+class PredictionEngine:
+    """The trained model (in eval mode), encoders and label maps of a models directory, loaded once and reused for
+    any number of predictions. Use `get_prediction_engine` to share one engine per models directory.
 
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    The engine is shared, so it holds no per-caller settings: the batch size is passed to every prediction call.
+    """
 
-        # Load unlabeled data
-        print("Loading unlabeled data...")
-        label_to_id = joblib.load(self.model_path / "label_to_id.pkl")
-        area_encoder = joblib.load(self.model_path / "area_encoder.pkl")
-        node_type_encoder = joblib.load(self.model_path / "node_type_encoder.pkl")
-        self.id_to_label = {v: k for k, v in label_to_id.items()}
-        dataset = GraphDatasetPredictor(
-            self.dataset_path,
-            label_to_id=label_to_id,
-            area_encoder=area_encoder,
-            node_type_encoder=node_type_encoder,
-            tactics_labels=self.labels_path
-        )
-        self.loader = DataLoader(dataset)
+    def __init__(self, models_dir, checkpoint_name=DEFAULT_CHECKPOINT):
+        self.models_dir = Path(models_dir)
+        self.checkpoint_path = self.models_dir / checkpoint_name
+
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-        print(f"Dataset loaded with {len(dataset)} graphs.")
-        checkpoint = torch.load(self.mlmodel)
+        self.label_to_id = joblib.load(self.models_dir / "label_to_id.pkl")
+        self.area_encoder = joblib.load(self.models_dir / "area_encoder.pkl")
+        self.node_type_encoder = joblib.load(self.models_dir / "node_type_encoder.pkl")
+        self.id_to_label = {v: k for k, v in self.label_to_id.items()}
 
+        checkpoint = torch.load(self.checkpoint_path)
         self.model = GNN(
             input_dim=checkpoint["input_dim"],
             hidden_channels=checkpoint["hidden_channels"],
             output_dim=checkpoint["output_dim"],
         )
+        # Only the weights are needed for inference, the optimizer state in the checkpoint is not restored
         self.model.load_state_dict(checkpoint["model_state_dict"])
-
-        optimizer = torch.optim.AdamW(self.model.parameters(), lr=0.0002)
-        optimizer.load_state_dict(checkpoint["optimizer_state_dict"])
-
         self.model.to(self.device)
         self.model.eval()
-        print(f"Model loaded from {self.mlmodel}")
+        print(f"Model loaded from {self.checkpoint_path}")
+
+    def load_dataset(self, graph_dir, lazy=False, graph_files=None, normalization=None) -> GraphDatasetPredictor:
+        """Returns the graphs below the given directory (or in `graph_files`), featurized with the encoders of this
+        engine."""
+        return GraphDatasetPredictor(
+            graph_dir,
+            area_encoder=self.area_encoder,
+            label_to_id=self.label_to_id,
+            node_type_encoder=self.node_type_encoder,
+            lazy=lazy,
+            graph_files=graph_files,
+            normalization=normalization,
+        )
 
-    def predict(self):
+    def predict_dataset(self, dataset, batch_size=DEFAULT_BATCH_SIZE) -> list[str]:
+        """Returns the predicted tactic of every graph of the dataset, as a flat list in dataset order. Graphs are
+        predicted in batches of `batch_size`."""
+        # No shuffling: the predictions are returned in dataset (round and frame) order
+        loader = DataLoader(dataset, batch_size=batch_size, shuffle=False)
         predictions = []
-        preds = []
-        print("Predicting...")
-        with torch.no_grad():
-            for _i, batch in enumerate(self.loader):
+        with torch.inference_mode():
+            for batch in loader:
                 batch = batch.to(self.device)
                 out = self.model(batch)
-                pred = out.argmax(dim=1)
-                pred_labels = [self.id_to_label[p.item()] for p in pred]
-                predictions.append(pred_labels)
+                predictions.append(out.argmax(dim=1).cpu())
+
+        if not predictions:
+            return []
+        return [self.id_to_label[p] for p in torch.cat(predictions).tolist()]
+
+    def predict_graph_files(self, graph_files, normalization=None, batch_size=DEFAULT_BATCH_SIZE) -> list[str]:
+        """Returns the predicted tactic of every frame of the given graph files, as a flat list in round and frame
+        order."""
+        dataset = self.load_dataset(None, graph_files=graph_files, normalization=normalization)
+        return self.predict_dataset(dataset, batch_size)
+
+    def predict_graph_dir(self, graph_dir, lazy=False, batch_size=DEFAULT_BATCH_SIZE) -> dict[str, list[str]]:
+        """Returns the predicted tactic of every frame below the given directory, grouped by graph (round) file in
+        round order."""
+        dataset = self.load_dataset(graph_dir, lazy=lazy)
+        predictions = self.predict_dataset(dataset, batch_size)
+        by_file: dict[str, list[str]] = {}
+        for file_path, prediction in zip(dataset.get_file_paths(), predictions, strict=True):
+            by_file.setdefault(os.path.relpath(file_path, graph_dir), []).append(prediction)
+        return by_file
+
+
+@functools.lru_cache(maxsize=4)
+def _get_prediction_engine(models_dir: Path, checkpoint_name: str) -> PredictionEngine:
+    return PredictionEngine(models_dir, checkpoint_name)
 
-        for i in predictions:
-            preds.append(i[0])
 
-        return preds
+def get_prediction_engine(models_dir, checkpoint_name=DEFAULT_CHECKPOINT) -> PredictionEngine:
+    """Returns the PredictionEngine of a models directory, loading it on the first call only."""
+    return _get_prediction_engine(Path(models_dir).resolve(), checkpoint_name)
+
+
+class Predictor:
+    """Predicts the tactic of every graph of a match with the (cached) PredictionEngine of `model_path`."""
+
+    def __init__(self, model_path, dataset_path, labels_path, batch_size=DEFAULT_BATCH_SIZE):
+        self.model_path = model_path
+        self.dataset_path = dataset_path
+        self.labels_path = labels_path / "de_dust2_tactics.json"
+        self.batch_size = batch_size
+
+        self.engine = get_prediction_engine(self.model_path)
+
+        # Load unlabeled data
+        print("Loading unlabeled data...")
+        self.dataset = self.engine.load_dataset(self.dataset_path)
+        print(f"Dataset loaded with {len(self.dataset)} graphs.")
+
+    def predict(self):
+        """Returns the predicted tactic of every graph, as a flat list in dataset order."""
+        print("Predicting...")
+        return self.engine.predict_dataset(self.dataset, self.batch_size)
+
+
+def resolve_graph_dir(target: str, graphs_dir) -> Path:
+    """Returns the graph directory of a prediction target, which is either a graph directory or the match ID of a
+    demo whose graphs are in `graphs_dir`."""
+    if os.path.isdir(target):
+        return Path(target)
+    if graphs_dir is not None and os.path.isdir(os.path.join(graphs_dir, target)):
+        return Path(graphs_dir) / target
+    raise ValueError(f"{target} is neither a graph directory nor a demo in {graphs_dir}.")
+
+
+def main(targets, models_dir, graphs_dir, serve=False, batch_size=DEFAULT_BATCH_SIZE, num_threads=None, lazy=False):
+    """Prints the per-frame predictions of every target as one JSON line. With `serve`, the model stays loaded and
+    further targets are read from stdin, one per line, until EOF. `num_threads` limits the threads torch uses on the
+    CPU in this process (torch's default if None)."""
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    engine = get_prediction_engine(models_dir)
+
+    def answer(target):
+        try:
+            graph_dir = resolve_graph_dir(target, graphs_dir)
+            result = {"target": target, "rounds": engine.predict_graph_dir(graph_dir, lazy=lazy, batch_size=batch_size)}
+        except (OSError, ValueError) as e:
+            result = {"target": target, "error": str(e)}
+        print(json.dumps(result), flush=True)
+
+    for target in targets:
+        answer(target)
+    if serve:
+        for line in sys.stdin:
+            if line.strip():
+                answer(line.strip())
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Predict the tactic of every frame of matches.")
+    parser.add_argument("targets", nargs="*", help="Match IDs (graph folders in GRAPHS_OUTPUT_DIR) or graph directories")
+    parser.add_argument("--models-dir", default=os.environ.get("MODELS_OUTPUT_DIR"),
+                        help="Directory of the checkpoint and encoders (default: MODELS_OUTPUT_DIR)")
+    parser.add_argument("--graphs-dir", default=os.environ.get("GRAPHS_OUTPUT_DIR"),
+                        help="Directory of the graph folders of the matches (default: GRAPHS_OUTPUT_DIR)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Keep the model loaded and read further targets from stdin, one per line")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Graphs per forward pass (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads used by torch (default: torch's)")
+    parser.add_argument("--lazy", action="store_true", help="Load the graphs of a match lazily from disk")
+    args = parser.parse_args()
+    if args.models_dir is None:
+        parser.error("--models-dir or MODELS_OUTPUT_DIR is required")
+
+    main(args.targets, args.models_dir, args.graphs_dir, serve=args.serve, batch_size=args.batch_size,
+         num_threads=args.threads, lazy=args.lazy)
@@ -5,19 +5,34 @@ to reflect most up-to-date features in `create_graphs.py`.
 For example, the distance metrics here are rather simple.
 Tactics are missing.
 """
+import argparse
 import csv
+import functools
+import itertools
 import logging
 import os
+from collections import deque
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
 from typing import Any
 
-from datamodel.data_manager import DataManager
-from metrics.base_metric import BaseMetric
+from datamodel.data_manager import (
+  DataManager,
+  get_map_name_from_demo_file_without_parsing,
+)
+from datamodel.demo_stream import DemoIndex
+from metrics.base_metric import BaseMetric, RoundFrames, to_metric_list
 from metrics.bomb_distance_metric import BombDistanceMetric
 from metrics.distance_metric import DistanceMetric
 from metrics.map_control_metric import MapControlMetric
 from metrics.teamhp_metric import TeamHpMetric
 from metrics.velocity_deviation_metric import VelocityDeviationMetric
+from utils.nav_data import (
+  attach_shared_nav_data,
+  release_shared_nav_data,
+  share_nav_data,
+)
 
 LOGGING_LEVEL = os.environ.get("LOGGING_INFO")
 if LOGGING_LEVEL == "INFO":
@@ -33,12 +48,30 @@ logger = logging.getLogger(__name__)
 ## WARNING: (4) players switch teams at round 15.
 EXAMPLE_DEMO_PATH = Path(__file__).parent / '../demos/esta/lan/de_dust2/00e7fec9-cee0-430f-80f4-6b50443ceacd.json'
 
+# Index of the first round of the second half, in which the teams switch sides (MR15)
+HALFTIME_ROUND_INDEX = 15
+
+# Rounds submitted to the process pool per worker ahead of the round whose rows are yielded next
+ROUNDS_IN_FLIGHT_PER_PROCESS = 4
+
+# All metrics that can be written, by column name in the .csv file. Each entry creates a new metric instance.
+METRICS: dict[str, Callable[[], BaseMetric]] = {
+  "bombDistance": BombDistanceMetric,
+  "mapControl": MapControlMetric,
+  "totalDistance": functools.partial(DistanceMetric, cumulative=True),
+  "deltaDistance": functools.partial(DistanceMetric, cumulative=False),
+  "velocityDeviation": VelocityDeviationMetric,
+  "tHp": functools.partial(TeamHpMetric, "t"),
+  "ctHp": functools.partial(TeamHpMetric, "ct"),
+}
+
+KEYS_DEMO_LEVEL = ("matchID",)
 KEYS_ROUND_LEVEL = ("roundNum", "isWarmup", "startTick", "freezeTimeEndTick", "endTick", "endOfficialTick", "bombPlantTick", "tScore", "ctScore", "endTScore", "endCTScore", "ctTeam", "tTeam", "winningSide", "winningTeam", "losingTeam", "roundEndReason", "ctFreezeTimeEndEqVal", "ctRoundStartEqVal", "ctRoundSpendMoney", "ctBuyType", "tFreezeTimeEndEqVal", "tRoundStartEqVal", "tRoundSpendMoney", "tBuyType")
 # "parseKillFrame"
 KEYS_BOMB_LEVEL = ("bombTick", "bombSeconds", "bombClockTime", "bombPlayerSteamID", "bombPlayerName", "bombPlayerTeam", "bombPlayerX", "bombPlayerY", "bombPlayerZ", "bombAction", "bombSite")
 KEYS_FRAME_LEVEL = ("tick", "seconds", "clockTime", "bombPlanted")
 KEYS_FRAME_LEVEL_EXTRA = ("secondsCalculated",)
-KEYS_METRIC_LEVEL = ("bombDistance", "mapControl", "totalDistance", "deltaDistance", "velocityDeviation", "tHp", "ctHp")
+KEYS_METRIC_LEVEL = tuple(METRICS)
 # "side",
 KEYS_TEAM_LEVEL = ("teamName", "teamEqVal", "alivePlayers", "totalUtility")
 # "inventory", "spotters", "isBlinded", "isAirborne", "isDucking", "isDuckingInProgress", "isUnDuckingInProgress", "isStanding", "isScoped", "isWalking", "isUnknown", "ping", "zoomLevel"
@@ -51,7 +84,7 @@ def process_round(dm: DataManager, round_idx: int, metrics: list[BaseMetric]) ->
   round = dm.get_game_round(round_idx)
 
   # all variables on the round level
-  data_roundlevel = [round[key] for key in KEYS_ROUND_LEVEL]
+  data_roundlevel = [dm.get_match_id()] + [round[key] for key in KEYS_ROUND_LEVEL]
 
   frames = dm._get_frames(round_idx)
   logger.info("Processing round %d with %d frames." % (round_idx, len(frames)))
@@ -61,6 +94,10 @@ def process_round(dm: DataManager, round_idx: int, metrics: list[BaseMetric]) ->
   bomb_data = process_bomb_data(round)
   data_bomblevel = [bomb_data[key] for key in KEYS_BOMB_LEVEL]
 
+  # all estimated metrics, computed for the whole round at once and added to each frame row later
+  ### todo: distance metrics should also be estimated for CT side
+  metric_columns = process_round_metrics(dm, round_idx, metrics)
+
   # iterate and process each frame
   for frame_idx, frame in enumerate(frames):
 
@@ -79,19 +116,7 @@ def process_round(dm: DataManager, round_idx: int, metrics: list[BaseMetric]) ->
     else:
       data_framelevel.append(frame["seconds"])
 
-    # all estimated metrics, they are added to each player observation later
-    ### todo some metrics need specific process_metric_round
-    ### todo: distance metrics should also be estimated for CT side
-    data_metriclevel = []
-    for metric in metrics:
-      try:
-        metric_value = metric.process_metric_frame(dm, round_idx, frame_idx)
-        data_metriclevel.append(metric_value)
-      except (ValueError, KeyError, ZeroDivisionError) as err:
-        ## TODO: Fix the ZeroDivisonError
-        logger.warning(err)
-        logger.warning("Ignoring metric for frame %d and adding NA instead for metric %s." % (frame_idx, metric.__class__))
-        data_metriclevel.append(None)
+    data_metriclevel = [metric_column[frame_idx] for metric_column in metric_columns]
 
     # all variables on the team and player level for the T side
     team = frame["t"]
@@ -114,6 +139,46 @@ def process_round(dm: DataManager, round_idx: int, metrics: list[BaseMetric]) ->
     rows_round.append(row)
   return rows_round
 
+def process_round_metrics(dm: DataManager, round_idx: int, metrics: list[BaseMetric]) -> list[list[float | None]]:
+  """Calculates each metric for all frames of a round (see `BaseMetric.process_metric_frames`), or reads it from the
+  metric cache if METRIC_CACHE_DIR is set. The round is read into arrays once and shared by all metrics. Returns one
+  list per metric with a value per frame (None = NA)."""
+  frames = RoundFrames(dm, round_idx)
+  metric_columns = []
+  for metric in metrics:
+    try:
+      metric_columns.append(to_metric_list(metric.process_metric_frames_cached(frames), metric.value_type))
+    except (ValueError, KeyError, ZeroDivisionError) as err:
+      logger.warning(err)
+      logger.warning("Ignoring metric for round %d and adding NA instead for metric %s." % (round_idx, metric.__class__))
+      metric_columns.append([None] * frames.frame_count)
+  return metric_columns
+
+def create_player_mappings(dm: DataManager) -> tuple[dict[str, int], dict[str, int]] | None:
+  """Returns the T and CT player mappings of the first half, created from the first valid frame of the demo (the
+  frame process_round would create them from when graphing the demo round by round). With these, every round can be
+  processed independently of the others. Returns None if the demo has no valid frame."""
+  for round_idx in range(dm.get_round_count()):
+    for frame in dm.get_game_round(round_idx)["frames"] or []:
+      if check_frame_validity(frame)[0]:
+        dm.create_player_mapping(frame, force_mapping=True)
+        return dm.mappingT, dm.mappingCT
+  return None
+
+
+def set_round_player_mapping(
+    dm: DataManager, player_mappings: tuple[dict[str, int], dict[str, int]] | None, round_idx: int) -> None:
+  """Sets the player mappings of the DataManager for the given round from the first-half mappings.
+  We need to swap mappings in the second half, because player sides switch there.
+  WARNING: This only works if teams player in MR15 setting."""
+  if player_mappings is None:
+    return
+  mapping_t, mapping_ct = player_mappings
+  if round_idx < HALFTIME_ROUND_INDEX:
+    dm.mappingT, dm.mappingCT = mapping_t, mapping_ct
+  else:
+    dm.mappingT, dm.mappingCT = mapping_ct, mapping_t
+
 def check_frame_validity(frame):
   if len(frame["t"]["players"]) != 5:
     return False, "Frame does not have 5 T-side players."
@@ -156,10 +221,10 @@ def process_bomb_data(round):
       }
   return bomb_data
 
-def generate_csv_header():
+def generate_csv_header(metric_keys: Sequence[str] = KEYS_METRIC_LEVEL):
 
   # Order
-  # data_roundlevel + data_bomblevel + data_framelevel + data_metriclevel
+  # data_demolevel + data_roundlevel + data_bomblevel + data_framelevel + data_metriclevel
   # + data_teamlevel_t + data_playerlevel_t + data_teamlevel_ct + data_playerlevel_ct
 
   keys = []
@@ -174,34 +239,140 @@ def generate_csv_header():
     for key in KEYS_PLAYER_LEVEL:
       keys.append("ct%d_%s" % (player_idx, key))
 
-  return KEYS_ROUND_LEVEL + KEYS_BOMB_LEVEL + KEYS_FRAME_LEVEL + KEYS_FRAME_LEVEL_EXTRA + KEYS_METRIC_LEVEL + tuple(keys)
-
-def main():
-  dm = DataManager(EXAMPLE_DEMO_PATH, do_validate=False)
-  output_filename = "testdemo.csv"
-  logger.info(f"Processing match id: {dm.get_match_id()} with {dm.get_round_count()} rounds to file {output_filename}.")
+  return (KEYS_DEMO_LEVEL + KEYS_ROUND_LEVEL + KEYS_BOMB_LEVEL + KEYS_FRAME_LEVEL + KEYS_FRAME_LEVEL_EXTRA
+          + tuple(metric_keys) + tuple(keys))
+
+def create_metrics(metric_keys: Sequence[str]) -> list[BaseMetric]:
+  """Creates the metrics for the given column names (see METRICS)."""
+  return [METRICS[key]() for key in metric_keys]
+
+
+def find_demo_files(paths: Sequence[Path]) -> list[Path]:
+  """Returns the given demo files, with directories replaced by all .json files in them (recursively, sorted)."""
+  demo_files = []
+  for path in paths:
+    path = Path(path)
+    demo_files.extend(sorted(path.rglob("*.json")) if path.is_dir() else [path])
+  return demo_files
+
+
+def open_worker_demo(demo_path: str, scanned_demo: tuple[dict, DemoIndex] | None = None) -> DataManager:
+  """Returns the DataManager of a demo. Rounds are streamed from the file, so only the rounds in use are held in
+  memory. With the `scanned_demo` of `plan_demo`, the file is not scanned again and only the round in use is read."""
+  return DataManager(Path(demo_path), do_validate=False, lazy=True, scanned_demo=scanned_demo)
+
+
+def plan_demo(
+    demo_path: str) -> tuple[int, tuple[dict[str, int], dict[str, int]] | None, tuple[dict, DemoIndex] | None]:
+  """Indexes a demo. Returns its round count, first-half player mappings and scanned demo, so its rounds can be
+  processed independently without scanning the demo again (see `process_demo_round`)."""
+  # With DEMO_CACHE_DIR set, this builds the demo cache once per demo, as round tasks never build it
+  dm = open_worker_demo(demo_path)
+  return dm.get_round_count(), create_player_mappings(dm), dm.get_scanned_demo()
+
+
+def process_demo_round(
+    demo_path: str,
+    round_idx: int,
+    player_mappings: tuple[dict[str, int], dict[str, int]] | None,
+    metric_keys: Sequence[str],
+    scanned_demo: tuple[dict, DemoIndex] | None = None) -> list[list[Any]]:
+  """Returns the rows of a single round of a planned demo."""
+  dm = open_worker_demo(demo_path, scanned_demo)
+  set_round_player_mapping(dm, player_mappings, round_idx)
+  return process_round(dm, round_idx, create_metrics(metric_keys))
+
+
+def _submit_demo_rounds(
+    executor: ProcessPoolExecutor,
+    demo_files: Sequence[Path],
+    metric_keys: Sequence[str]) -> Iterator[tuple[Path, int, Future]]:
+  """Submits the rounds of the given demos to the pool, in demo and round order, as they are requested. Each demo is
+  planned in the pool while the rounds of the demo before it are submitted. Demos that fail are logged and skipped."""
+  next_plan = executor.submit(plan_demo, str(demo_files[0])) if demo_files else None
+  for demo_idx, demo_path in enumerate(demo_files):
+    plan_future = next_plan
+    if demo_idx + 1 < len(demo_files):
+      next_plan = executor.submit(plan_demo, str(demo_files[demo_idx + 1]))
+    try:
+      round_count, player_mappings, scanned_demo = plan_future.result()
+    except (OSError, ValueError, KeyError) as err:
+      logger.error("Skipping demo %s: %s" % (demo_path, err))
+      continue
+    for round_idx in range(round_count):
+      yield demo_path, round_idx, executor.submit(
+        process_demo_round, str(demo_path), round_idx, player_mappings, tuple(metric_keys), scanned_demo)
+
+
+def iterate_demo_rounds(
+    demo_files: Sequence[Path],
+    metric_keys: Sequence[str] = KEYS_METRIC_LEVEL,
+    processes: int = 1) -> Iterator[tuple[Path, int, list[list[Any]]]]:
+  """Processes all rounds of the given demos and yields (demo path, round index, rows) in demo and round order.
+
+  With more than one process, every (demo, round) is a task of its own in a process pool, so even a single demo keeps
+  all workers busy. At most ROUNDS_IN_FLIGHT_PER_PROCESS rounds per process are submitted ahead of the round that is
+  yielded next, so results that finish early are held back only within that window. Demos and rounds that fail are
+  logged and skipped.
+  """
+  if processes <= 1:
+    for demo_path in demo_files:
+      try:
+        round_count, player_mappings, scanned_demo = plan_demo(str(demo_path))
+      except (OSError, ValueError, KeyError) as err:
+        logger.error("Skipping demo %s: %s" % (demo_path, err))
+        continue
+      for round_idx in range(round_count):
+        try:
+          yield demo_path, round_idx, process_demo_round(
+            str(demo_path), round_idx, player_mappings, metric_keys, scanned_demo)
+        except (OSError, ValueError, KeyError) as err:
+          logger.error("Skipping round %d of demo %s: %s" % (round_idx, demo_path, err))
+    return
+
+  # Build the distance data of all maps once and share it with the workers instead of each building its own
+  map_names = {get_map_name_from_demo_file_without_parsing(Path(demo_path)) for demo_path in demo_files}
+  shared_blocks, shared_nav_data = share_nav_data(name for name in map_names if name is not None)
+  try:
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=attach_shared_nav_data,
+        initargs=(shared_nav_data,),
+    ) as executor:
+      round_tasks = _submit_demo_rounds(executor, list(demo_files), metric_keys)
+      in_flight = deque(itertools.islice(round_tasks, processes * ROUNDS_IN_FLIGHT_PER_PROCESS))
+      while in_flight:
+        demo_path, round_idx, round_future = in_flight.popleft()
+        # keep the workers busy while the caller handles this round
+        in_flight.extend(itertools.islice(round_tasks, 1))
+        try:
+          rows = round_future.result()
+        except (OSError, ValueError, KeyError) as err:
+          logger.error("Skipping round %d of demo %s: %s" % (round_idx, demo_path, err))
+          continue
+        yield demo_path, round_idx, rows
+  finally:
+    release_shared_nav_data(shared_blocks)
+
+
+def main(
+    demo_paths: Sequence[Path] = (EXAMPLE_DEMO_PATH,),
+    output_filename: str = "testdemo.csv",
+    metric_keys: Sequence[str] = KEYS_METRIC_LEVEL,
+    processes: int = 1):
+  demo_files = find_demo_files(demo_paths)
+  logger.info(f"Processing {len(demo_files)} demos with {processes} processes to file {output_filename}.")
 
   with open(output_filename, 'w', newline='') as csvfile:
     writer = csv.writer(csvfile)
-    writer.writerow(generate_csv_header())
+    writer.writerow(generate_csv_header(metric_keys))
 
     rows_total = 0
-    for round_idx in range(dm.get_round_count()):
-      logger.info(f"Converting round {round_idx}")
-
-      # we need to swap mappings, because player sides switch here.
-      # WARNING: This only works if teams player in MR15 setting.
-      if round_idx == 15:
-        dm.swap_player_mapping()
-
+    for demo_path, round_idx, rows in iterate_demo_rounds(demo_files, metric_keys, processes):
       # Write straight to file, so in case of error not all converted rows are lost.
-      rows = process_round(dm, round_idx, [
-        BombDistanceMetric(), MapControlMetric(), DistanceMetric(cumulative=True), DistanceMetric(cumulative=False),
-        VelocityDeviationMetric(), TeamHpMetric('t'), TeamHpMetric('ct')
-      ])
       writer.writerows(rows)
-      logger.info("%d rows written to file." % len(rows))
-      rows_total+= len(rows)
+      logger.info("%d rows of round %d of %s written to file." % (len(rows), round_idx, demo_path.stem))
+      rows_total += len(rows)
     logger.info(f"SUCCESSFULLY COMPLETED: {rows_total} written in total.")
 
 
@@ -253,6 +424,16 @@ def test_player_mapping():
 
 
 if __name__ == '__main__':
-  main()
+  parser = argparse.ArgumentParser(description="Write frame-level metrics of CS:GO demos to a .csv file.")
+  parser.add_argument("demos", nargs="*", type=Path, default=[EXAMPLE_DEMO_PATH],
+                      help="Demo .json files or directories with demo files (default: the example demo)")
+  parser.add_argument("--output", default="testdemo.csv", help="The .csv file to write (default: testdemo.csv)")
+  parser.add_argument("--metrics", nargs="+", choices=KEYS_METRIC_LEVEL, default=list(KEYS_METRIC_LEVEL),
+                      help="The metric columns to compute, in column order (default: all)")
+  parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                      help="Number of worker processes, 1 = process all rounds in this process (default: CPU count)")
+  args = parser.parse_args()
+
+  main(args.demos, args.output, tuple(dict.fromkeys(args.metrics)), args.processes)
   #test_round_mapping()
   #test_player_mapping()
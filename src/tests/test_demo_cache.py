@@ -0,0 +1,44 @@
+import json
+import os
+
+import numpy as np
+
+from datamodel.demo_cache import build_demo_cache, load_demo_cache
+
+
+def test_demo_cache_round_trip_and_invalidation(tmp_path):
+    frame = {"tick": 1, "clockTime": "01:55", "t": {"side": "T", "players": [{"name": "t1", "x": 1.0, "hp": 100}]},
+             "ct": {"side": "CT", "players": []}, "bomb": {"x": 1.0, "y": 2.0, "z": 3.0}}
+    game = {"matchID": "m", "gameRounds": [{"roundNum": 1, "frames": [frame, frame]}, {"roundNum": 2, "frames": None}]}
+    demo_path = tmp_path / "demo.json"
+    demo_path.write_text(json.dumps(game))
+    cache_dir = tmp_path / "cache"
+
+    assert load_demo_cache(demo_path, cache_dir) is None
+    build_demo_cache(demo_path, cache_dir, json.loads(demo_path.read_text()), validated=False)
+
+    data, store = load_demo_cache(demo_path, cache_dir)
+    assert isinstance(store.player_numeric, np.memmap)
+    assert data["gameRounds"][0] == {"roundNum": 1, "frames": []}
+    assert data["gameRounds"][1]["frames"] is None
+    assert store.get_round_frame_count(0) == 2
+    assert store.frame(1)["t"]["players"][0]["name"] == "t1"
+    assert load_demo_cache(demo_path, cache_dir, require_validated=True) is None
+
+    game["matchID"] = "changed"
+    demo_path.write_text(json.dumps(game))
+    os.utime(demo_path, ns=(0, 0))
+    assert load_demo_cache(demo_path, cache_dir) is None
+
+
+def test_demo_cache_keeps_demos_with_the_same_name_apart(tmp_path):
+    cache_dir = tmp_path / "cache"
+    for folder, match_id in (("a", "first"), ("b", "second")):
+        demo_path = tmp_path / folder / "demo.json"
+        demo_path.parent.mkdir()
+        game = {"matchID": match_id, "gameRounds": [{"roundNum": 1, "frames": []}]}
+        demo_path.write_text(json.dumps(game))
+        build_demo_cache(demo_path, cache_dir, game, validated=False)
+
+    assert load_demo_cache(tmp_path / "a" / "demo.json", cache_dir)[0]["matchID"] == "first"
+    assert load_demo_cache(tmp_path / "b" / "demo.json", cache_dir)[0]["matchID"] == "second"
@@ -0,0 +1,52 @@
+import json
+
+from datamodel.demo_stream import LazyGameRounds, iter_game_rounds, scan_demo
+
+
+def test_scan_demo_indexes_rounds(tmp_path):
+    game = {"matchID": "m", "mapName": "de_dust2", "gameRounds": [{"roundNum": i, "frames": [{"tick": t} for t in range(i)]}
+                                                                  for i in range(3)], "tickRate": 128}
+    path = tmp_path / "demo.json"
+    path.write_text(json.dumps(game, indent=1, ensure_ascii=False))
+
+    header, index = scan_demo(path)
+    assert header == {"matchID": "m", "mapName": "de_dust2", "tickRate": 128}
+    assert index.round_frame_counts == [0, 1, 2]
+    assert list(iter_game_rounds(path, do_validate=False)) == game["gameRounds"]
+
+    rounds = LazyGameRounds(path, index, do_validate=False, cache_size=1)
+    rounds.prefetch(2)
+    assert rounds[2] == game["gameRounds"][2]
+    assert rounds[-3] == game["gameRounds"][0]
+
+
+def test_scan_demo_counts_frames_after_sanitizing(tmp_path):
+    valid = {"frameID": 1, "globalFrameID": 1, "clockTime": "01:55"}
+    game = {"gameRounds": [{"frames": [valid, {"tick": 1}, valid]}]}
+    path = tmp_path / "demo.json"
+    path.write_text(json.dumps(game))
+
+    assert scan_demo(path)[1].round_frame_counts == [3]
+    assert scan_demo(path, do_validate=True)[1].round_frame_counts == [2]
+
+
+def test_data_manager_reuses_scanned_demo(monkeypatch, tmp_path):
+    import datamodel.data_manager as data_manager
+
+    game = {"matchID": "m", "mapName": "de_dust2", "gameRounds": [{"roundNum": i, "frames": []} for i in range(3)]}
+    path = tmp_path / "demo.json"
+    path.write_text(json.dumps(game))
+    scanned_demo = data_manager.DataManager(path, do_validate=False, lazy=True).get_scanned_demo()
+
+    def fail(*_):
+        raise AssertionError("the demo was scanned again")
+
+    monkeypatch.setattr(data_manager, "scan_demo", fail)
+    monkeypatch.setattr(data_manager, "build_demo_cache", fail)
+    dm = data_manager.DataManager(path, do_validate=False, lazy=True, scanned_demo=scanned_demo)
+    assert dm.get_map_name() == "de_dust2"
+    assert dm.get_game_round(2) == game["gameRounds"][2]
+    # a cache miss opens the scanned demo instead of parsing the whole demo to build the cache
+    dm = data_manager.DataManager(path, do_validate=False, lazy=True, cache_dir=tmp_path / "cache",
+                                  scanned_demo=scanned_demo)
+    assert dm.get_game_round(2) == game["gameRounds"][2]
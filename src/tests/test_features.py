@@ -0,0 +1,44 @@
+import numpy as np
+from sklearn.preprocessing import OneHotEncoder
+
+from ml.features import NodeStatistics, build_node_features, onehot_lookup
+
+
+def test_onehot_lookup_matches_encoder():
+    encoder = OneHotEncoder(sparse_output=False, handle_unknown="ignore").fit([[7], [3], [1000], [12]])
+    values = [3, 12, 5, 1000, 0, 7, 2000]
+    expected = encoder.transform([[value] for value in values])
+    assert np.array_equal(onehot_lookup(encoder, values), expected)
+
+
+def test_build_node_features():
+    area_encoder = OneHotEncoder(sparse_output=False, handle_unknown="ignore").fit([[1], [2]])
+    node_type_encoder = OneHotEncoder(sparse_output=False, handle_unknown="ignore").fit([[1], [900], [1000]])
+    graphs = [
+        {"nodes_data": {0: {"totalUtility": 300, "isAlive": True, "hasBomb": False, "areaId": 2, "x": 10, "y": 20,
+                            "nodeType": 1000},
+                        6: {"areaId": 1, "nodeType": 900}}},
+        {"nodes_data": {7: {"nodeType": 1}}},
+    ]
+    features = build_node_features(graphs, area_encoder, node_type_encoder, 100, 200, 0, 10, 0, 40)
+
+    assert [tuple(x.shape) for x in features] == [(2, 10), (1, 10)]
+    assert features[0][0].tolist() == [1.0, 1.0, 0.0, 0.0, 1.0, 1.0, 0.5, 0.0, 0.0, 1.0]
+    assert features[1][0].tolist() == [-0.5, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+
+
+def test_node_statistics_match_full_fit():
+    nodes = [{"areaId": 5, "nodeType": 1000, "totalUtility": 200, "x": -10, "y": 3},
+             {"areaId": 2, "nodeType": 900, "x": 30, "y": 3},
+             {"areaId": 5, "nodeType": 1}]
+    stats = NodeStatistics()
+    stats.update({"nodes_data": {0: nodes[0], 6: nodes[1]}})
+    stats.update({"nodes_data": {7: nodes[2]}})
+
+    full_fit = OneHotEncoder(sparse_output=False, handle_unknown="ignore").fit([[node["areaId"]] for node in nodes])
+    assert [c.tolist() for c in stats.fit_area_encoder().categories_] == [c.tolist() for c in full_fit.categories_]
+    assert stats.fit_node_type_encoder().categories_[0].tolist() == [1, 900, 1000]
+    normalization = stats.get_normalization()
+    assert (normalization["min_utility"], normalization["utility_range"]) == (0, 200)
+    assert (normalization["global_min_x"], normalization["global_x_range"]) == (-10, 40)
+    assert (normalization["global_min_y"], normalization["global_y_range"]) == (0, 3)
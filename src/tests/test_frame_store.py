@@ -0,0 +1,44 @@
+from datamodel.frame_store import ColumnarFrames, FrameStore
+from datamodel.side_type import SideType
+
+
+def _player(name: str, x: float, hp: int) -> dict:
+    return {"steamID": 76561198000000000 + hp, "name": name, "x": x, "y": -x, "z": 1.5, "hp": hp, "isAlive": hp > 0,
+            "activeWeapon": "AK-47", "inventory": [{"weaponName": "AK-47"}]}
+
+
+def _frame(tick: int, t_players: list[dict]) -> dict:
+    return {"tick": tick, "seconds": tick / 128, "clockTime": "01:55", "bombPlanted": False,
+            "t": {"side": "T", "teamName": "A", "players": t_players},
+            "ct": {"side": "CT", "teamName": "B", "players": [_player("ct1", 10.0, 100)]},
+            "bomb": {"x": 1.0, "y": 2.0, "z": 3.0}}
+
+
+def test_frame_store_round_trip():
+    rounds = [
+        {"frames": [_frame(0, [_player("t1", 1.0, 100), _player("t2", 2.0, 0)]), _frame(64, [_player("t1", 3.0, 90)])]},
+        {"frames": []},
+        {"frames": [_frame(128, [_player(f"t{i}", float(i), 50) for i in range(6)])]},
+    ]
+    store = FrameStore.from_game_rounds(rounds)
+
+    assert store.round_count == 3
+    assert store.frame_count == 3
+    assert store.slot_count == 6  # grows for the round with six players
+    assert store.get_round_frame_count(1) == 0
+
+    hp = store.get_player_values("hp", 0)
+    assert hp.shape == (2, 2, 6)
+    assert list(hp[0, 1, :2]) == [100, 0]
+    assert store.get_player_strings("name", 0)[1, 1, 0] == "t1"
+    assert store.get_player_counts(0)[1].tolist() == [1, 1]
+
+    frames = ColumnarFrames(store, 0)
+    assert len(frames) == 2
+    rebuilt = frames[0]
+    assert rebuilt["t"]["players"][1]["name"] == "t2"
+    assert rebuilt["t"]["players"][1]["isAlive"] is False
+    assert rebuilt["t"]["players"][0]["inventory"] == [{"weaponName": "AK-47"}]
+    assert rebuilt["bomb"] == {"x": 1.0, "y": 2.0, "z": 3.0}
+    assert rebuilt[SideType.CT.value]["players"][0]["steamID"] == 76561198000000100
+    assert len(ColumnarFrames(store, 2)[0]["t"]["players"]) == 6
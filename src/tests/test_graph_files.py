@@ -0,0 +1,27 @@
+import pickle
+
+from ml.graph_files import LazyGraphFiles
+
+
+def _write_round(path, ticks):
+    with open(path, "wb") as f:
+        pickle.dump([{"graph_data": {"tick": tick, "strategy_used": "unknown" if tick % 2 else "rush_a"},
+                      "nodes_data": {}, "edges_data": []} for tick in ticks], f)
+    return str(path)
+
+
+def test_lazy_graph_files_index_and_cache(tmp_path):
+    files = [_write_round(tmp_path / f"graph-rounds-{i}.pkl", range(i * 10, i * 10 + 4)) for i in range(3)]
+    seen = []
+    lazy = LazyGraphFiles(files, keep=lambda g: g["graph_data"]["strategy_used"] != "unknown",
+                          on_graph=seen.append, cache_size=2)
+
+    assert len(lazy) == 6 and len(seen) == 6
+    assert lazy.entries[:3] == [(0, 0), (0, 2), (1, 0)]
+    graph, file_path, graph_idx = lazy[3]
+    assert (graph["graph_data"]["tick"], file_path, graph_idx) == (12, files[1], 2)
+
+    for idx in range(len(lazy)):
+        lazy[idx]
+    assert list(lazy._cache) == [1, 2]  # only the most recently used files are kept
+    assert not pickle.loads(pickle.dumps(lazy))._cache
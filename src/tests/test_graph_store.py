@@ -0,0 +1,68 @@
+import pickle
+
+from datamodel.graph_store import (
+    graph_file_sort_key,
+    is_graph_file,
+    load_graph_file,
+    read_round_graphs,
+    write_round_graphs,
+)
+
+NODE_KEYS = ("x", "hp", "isAlive", "areaId", "nodeType")
+EDGE_PAIRS = [(0, 1), (0, 6), (0, 7), (1, 0), (1, 6), (1, 7), (6, 0), (6, 1), (6, 7)]
+
+
+def _graph(tick: int, alive: bool) -> dict:
+    nodes = {
+        0: {"x": 1.5, "hp": 100, "isAlive": True, "areaId": 12, "nodeType": 1000},
+        1: {"x": -2.25, "hp": 0 if not alive else 40, "isAlive": alive, "areaId": 13, "nodeType": 1000},
+        6: {"x": 3.0, "hp": 0, "isAlive": 0, "areaId": 7, "nodeType": 900},
+        7: {"x": 0, "hp": 0, "isAlive": 0, "areaId": 0, "nodeType": 1},
+    }
+    edges = [(a, b, {"dist": float(a * 10 + b)}) for a, b in EDGE_PAIRS]
+    return {"graph_data": {"tick": tick, "seconds": tick / 128, "bombPlanted": False, "winningSide": "T",
+                           "tactic_used": "rush_a"},
+            "nodes_data": nodes, "edges_data": edges}
+
+
+def test_round_graphs_round_trip(tmp_path):
+    graphs = [_graph(0, True), _graph(64, False)]
+    path = tmp_path / "graph-rounds-3.npz"
+    write_round_graphs(path, graphs, NODE_KEYS, 9, EDGE_PAIRS)
+
+    round_graphs = read_round_graphs(path)
+    assert round_graphs.nodes.shape == (2, 9, len(NODE_KEYS))
+    assert round_graphs.edges.shape == (2, len(EDGE_PAIRS))
+    assert round_graphs.node_mask[0].tolist() == [True, True] + [False] * 4 + [True, True, False]
+    assert round_graphs.node_kinds == ["f", "i", "b", "i", "i"]
+    assert round_graphs.get_node_values("hp")[:, 1].tolist() == [40, 0]
+    assert round_graphs.graph_data["tactic_used"].tolist() == ["rush_a", "rush_a"]
+
+    assert round_graphs.to_graph_dicts() == graphs
+    assert load_graph_file(path) == graphs
+
+
+def test_load_graph_file_reads_pickles(tmp_path):
+    path = tmp_path / "graph-rounds-0.pkl"
+    with open(path, "wb") as f:
+        pickle.dump([_graph(0, True)], f)
+
+    assert load_graph_file(path) == [_graph(0, True)]
+    assert is_graph_file(path.name) and is_graph_file("graph-rounds-1.npz") and not is_graph_file("graph-rounds-1.csv")
+
+
+def test_graph_file_sort_key_orders_rounds_numerically():
+    files = ["m/graph-rounds-10.npz", "m/graph-rounds-2.pkl", "m/notes.pkl", "m/graph-rounds-0.pkl"]
+    assert sorted(files, key=graph_file_sort_key) == [
+        "m/graph-rounds-0.pkl", "m/graph-rounds-2.pkl", "m/graph-rounds-10.npz", "m/notes.pkl"
+    ]
+
+
+def test_round_graphs_restore_none_graph_values(tmp_path):
+    graphs = [_graph(0, True), _graph(64, True)]
+    graphs[0]["graph_data"].update({"winningSide": None, "bombTick": 5000})
+    graphs[1]["graph_data"].update({"bombTick": None})
+    path = tmp_path / "graph-rounds-4.npz"
+    write_round_graphs(path, graphs, NODE_KEYS, 9, EDGE_PAIRS)
+
+    assert load_graph_file(path) == graphs
@@ -0,0 +1,70 @@
+import json
+import os
+
+import numpy as np
+
+from datamodel.data_manager import DataManager
+from metrics.base_metric import BaseMetric
+from metrics.map_control_metric import MapControlMetric
+from metrics.metric_cache import MetricCache
+
+
+class CountingMetric(BaseMetric):
+    def __init__(self, offset: float):
+        self.offset = offset
+        self._calls = 0
+
+    def process_metric_frame(self, dm, round_idx, frame_idx, plot_metric=False) -> float:
+        self._calls += 1
+        return frame_idx + self.offset
+
+
+def _write_demo(demo_path, frame_count: int) -> DataManager:
+    frames = [{"tick": tick, "t": {"players": []}, "ct": {"players": []}} for tick in range(frame_count)]
+    demo_path.write_text(json.dumps({"mapName": "de_dust2", "gameRounds": [{"frames": frames}]}))
+    return DataManager(demo_path, do_validate=False)
+
+
+def test_metric_values_are_cached_per_parameters_and_demo(monkeypatch, tmp_path):
+    monkeypatch.setenv("METRIC_CACHE_DIR", str(tmp_path / "cache"))
+    demo_path = tmp_path / "demo.json"
+    dm = _write_demo(demo_path, 3)
+
+    metric = CountingMetric(0.5)
+    assert metric.process_metric_round(dm, 0) == [0.5, 1.5, 2.5]
+    assert metric.process_metric_round(dm, 0) == [0.5, 1.5, 2.5]
+    assert metric._calls == 3  # computed once, then read from the cache
+
+    other = CountingMetric(1.0)
+    assert other.process_metric_round(dm, 0) == [1.0, 2.0, 3.0]
+    assert other._calls == 3
+
+    # a changed demo file is not read from the old cache entries
+    dm = _write_demo(demo_path, 4)
+    os.utime(demo_path, ns=(0, 0))
+    assert metric.process_metric_round(dm, 0) == [0.5, 1.5, 2.5, 3.5]
+    assert metric._calls == 7
+
+
+def test_map_control_parameters_key_the_cache(tmp_path):
+    demo_path = tmp_path / "demo.json"
+    demo_path.write_text("{}")
+    cache = MetricCache(tmp_path / "cache")
+    default, changed = MapControlMetric(), MapControlMetric(steps=5)
+    assert default.get_parameters()["steps"] == 10
+
+    cache.save(demo_path, 2, "MapControlMetric", default.get_parameters(), np.array([0.25, np.nan]))
+    assert cache.load(demo_path, 2, "MapControlMetric", changed.get_parameters()) is None
+    cached = cache.load(demo_path, 2, "MapControlMetric", MapControlMetric().get_parameters())
+    assert cached[0] == 0.25 and np.isnan(cached[1])
+
+
+def test_validation_mode_keys_the_cache(tmp_path):
+    demo_path = tmp_path / "demo.json"
+    demo_path.write_text("{}")
+    cache = MetricCache(tmp_path / "cache")
+    parameters = CountingMetric(0.0).get_parameters()
+
+    cache.save(demo_path, 0, "CountingMetric", parameters, np.array([1.0, 2.0]), validated=True)
+    assert cache.load(demo_path, 0, "CountingMetric", parameters) is None
+    assert cache.load(demo_path, 0, "CountingMetric", parameters, validated=True).tolist() == [1.0, 2.0]
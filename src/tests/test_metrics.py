@@ -0,0 +1,143 @@
+import gc
+import json
+import weakref
+
+import numpy as np
+import pytest
+from awpy.data import NAV
+
+from datamodel.data_manager import DataManager
+from metrics.base_metric import BaseMetric, RoundFrames
+from metrics.bomb_distance_metric import BombDistanceMetric
+from metrics.distance_metric import DistanceMetric
+from metrics.teamhp_metric import TeamHpMetric
+from metrics.velocity_deviation_metric import VelocityDeviationMetric
+
+
+def _player(name: str, x: float, hp: int) -> dict:
+    return {"name": name, "x": x, "y": 2 * x, "z": -x, "velocityX": x - 3, "velocityY": 1.0, "hp": hp,
+            "isAlive": hp > 0}
+
+
+def _area_center(area_id: int) -> dict:
+    area = NAV["de_dust2"][area_id]
+    return {key: (area[f"southEast{key.upper()}"] + area[f"northWest{key.upper()}"]) / 2 for key in ("x", "y", "z")}
+
+
+def _demo(tmp_path) -> DataManager:
+    area_ids = list(NAV["de_dust2"])
+    frames = []
+    for frame_idx in range(6):
+        # players change their order between frames and one player is missing in frame 3
+        t_players = [_player(f"t{i}", float(i * 10 + frame_idx * (i + 1)), 100 - 10 * i) for i in range(5)]
+        t_players = t_players[::-1] if frame_idx % 2 else t_players
+        if frame_idx == 3:
+            t_players = t_players[:4]
+        frames.append({"tick": frame_idx * 64, "seconds": frame_idx / 2, "clockTime": "01:55", "bombPlanted": False,
+                       "t": {"side": "T", "players": t_players},
+                       "ct": {"side": "CT", "players": [_player("ct1", 5.0, 80), _player("ct2", 6.0, 0)]},
+                       "bomb": None if frame_idx == 0 else _area_center(area_ids[frame_idx * 97])})
+    demo_path = tmp_path / "demo.json"
+    demo_path.write_text(json.dumps({"mapName": "de_dust2", "gameRounds": [{"roundNum": 1, "frames": frames}]}))
+    return DataManager(demo_path, do_validate=False)
+
+
+def _frame_values(metric, dm: DataManager) -> list:
+    values = []
+    for frame_idx in range(dm.get_frame_count(0)):
+        try:
+            values.append(metric.process_metric_frame(dm, 0, frame_idx))
+        except (ValueError, KeyError):
+            values.append(np.nan)
+    return values
+
+
+@pytest.mark.parametrize("make_metric", [lambda: TeamHpMetric("t"), lambda: TeamHpMetric("ct"),
+                                         VelocityDeviationMetric, BombDistanceMetric])
+def test_round_metrics_match_frame_metrics(tmp_path, make_metric):
+    dm = _demo(tmp_path)
+    batch = make_metric().process_metric_frames(RoundFrames(dm, 0))
+    assert np.allclose(batch, _frame_values(make_metric(), dm), rtol=1e-5, equal_nan=True)
+
+
+def test_distance_metric_matches_players_by_name(tmp_path):
+    dm = _demo(tmp_path)
+    deltas = DistanceMetric(cumulative=False).process_metric_frames(RoundFrames(dm, 0))
+    # every player moves (i + 1) on x, 2 * (i + 1) on y and (i + 1) on z per frame, t0 is missing in frame 3
+    step = sum(4 * (i + 1) for i in range(5))
+    assert deltas.tolist() == [0.0, step, step, step - 4, step - 4, step]
+    assert DistanceMetric().process_metric_round(dm, 0) == np.cumsum(deltas).tolist()
+
+
+@pytest.mark.parametrize("cumulative", [True, False])
+def test_distance_metric_frames_are_stateless(tmp_path, cumulative):
+    dm = _demo(tmp_path)
+    metric = DistanceMetric(cumulative=cumulative)
+    batch = metric.process_metric_frames(RoundFrames(dm, 0))
+    # frames in reverse order and twice, with the same instance
+    for frame_idx in [5, 4, 3, 2, 1, 0, 3]:
+        assert metric.process_metric_frame(dm, 0, frame_idx) == batch[frame_idx]
+
+
+def test_distance_metric_computes_each_round_once(monkeypatch, tmp_path):
+    dm = _demo(tmp_path)
+    metric = DistanceMetric()
+    calls = []
+    process_metric_frames = metric.process_metric_frames
+    monkeypatch.setattr(metric, "process_metric_frames", lambda frames: calls.append(frames) or
+                        process_metric_frames(frames))
+    _frame_values(metric, dm)
+    assert len(calls) == 1
+    with pytest.raises(ValueError):
+        metric.process_metric_frame(dm, 0, dm.get_frame_count(0))
+
+    # the reused values do not keep the demo alive
+    dm_ref = weakref.ref(dm)
+    del dm, calls[:]
+    gc.collect()
+    assert dm_ref() is None
+
+
+def test_distance_metric_prefers_steam_ids(tmp_path):
+    frames = [{"t": {"players": [{"steamID": 7, "name": name, "x": x, "y": 0.0, "z": 0.0}]}, "ct": {"players": []}}
+              for name, x in [("before", 0.0), ("after", 3.0)]]
+    demo_path = tmp_path / "demo.json"
+    demo_path.write_text(json.dumps({"mapName": "de_dust2", "gameRounds": [{"frames": frames}]}))
+    dm = DataManager(demo_path, do_validate=False)
+    assert DistanceMetric(cumulative=False).process_metric_round(dm, 0) == [0.0, 3.0]
+
+
+def test_bomb_distance_frames_skip_pathfinding(monkeypatch, tmp_path):
+    import metrics.bomb_distance_metric as bomb_distance_metric
+
+    def fail(**_):
+        raise AssertionError("paths are only needed for plotting")
+
+    monkeypatch.setattr(bomb_distance_metric, "area_distance", fail)
+    bomb_distance_metric._find_bomb_area.cache_clear()
+    dm = _demo(tmp_path)
+    metric = BombDistanceMetric()
+    values = [metric.process_metric_frame(dm, 0, frame_idx) for frame_idx in (1, 2, 1, 1)]
+
+    table = bomb_distance_metric.get_bombsite_distance_table("de_dust2")
+    area_id = bomb_distance_metric._find_bomb_area("de_dust2", *_area_center(list(NAV["de_dust2"])[97]).values())
+    assert values[0] == values[2] == values[3] == pytest.approx(table.lookup([area_id]).min())
+    assert bomb_distance_metric._find_bomb_area.cache_info().misses == 2
+
+
+def test_frame_fallback_only_skips_value_errors(tmp_path):
+    class FrameMetric(BaseMetric):
+        def __init__(self, error: Exception):
+            self.error = error
+
+        def process_metric_frame(self, dm, round_idx, frame_idx, plot_metric=False):
+            if frame_idx == 1:
+                raise self.error
+            return frame_idx
+
+    dm = _demo(tmp_path)
+    assert FrameMetric(ValueError("no value")).process_metric_round(dm, 0) == [0.0, None, 2.0, 3.0, 4.0, 5.0]
+    with pytest.raises(KeyError):
+        FrameMetric(KeyError("hp")).process_metric_round(dm, 0)
+    assert TeamHpMetric("t").process_metric_round(dm, 0)[0] == 400
+    assert type(TeamHpMetric("t").process_metric_round(dm, 0)[0]) is int
@@ -0,0 +1,189 @@
+import math
+from collections import defaultdict, deque
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from utils import nav_data
+
+
+def _area(x: float, y: float, z: float) -> dict:
+    return {"southEastX": x + 1, "northWestX": x - 1, "southEastY": y + 1, "northWestY": y - 1,
+            "southEastZ": z, "northWestZ": z, "areaName": ""}
+
+
+def test_area_index_matches_linear_scan(monkeypatch):
+    areas = {7: _area(0, 0, 0), 11: _area(100, 0, 0), 13: _area(0, 100, 50), 17: _area(100, 100, 500)}
+    monkeypatch.setattr(nav_data, "NAV", {"de_test": areas})
+    index = nav_data.AreaIndex("de_test")
+
+    points = np.random.default_rng(0).uniform(-50, 150, size=(64, 3))
+    centers = {area_id: ((a["southEastX"] + a["northWestX"]) / 2, (a["southEastY"] + a["northWestY"]) / 2,
+                         (a["southEastZ"] + a["northWestZ"]) / 2) for area_id, a in areas.items()}
+    expected = [min(centers, key=lambda area_id: math.dist(point, centers[area_id])) for point in points]
+    assert index.find_closest_areas(points).tolist() == expected
+
+    assert index.find_closest_area([100, 100, 0], flat=False) == 11
+    assert index.find_closest_area([100, 100], flat=True) == 17
+    assert index.find_closest_areas([[1, 1, 1], [np.nan, 0, 0]]).tolist() == [7, 0]
+    assert index.find_closest_areas([]).shape == (0,)
+
+
+def test_area_distance_matrix_lookup(monkeypatch):
+    areas = {3: _area(0, 0, 0), 5: _area(10, 0, 0), 9: _area(20, 0, 0)}
+    matrix = {"3": {"3": {"geodesic": 0.0}, "5": {"geodesic": 10.0}, "9": {"geodesic": 25.0}},
+              "5": {"3": {"geodesic": 10.0}, "5": {"geodesic": 0.0}, "42": {"geodesic": 1.0}}}
+    monkeypatch.setattr(nav_data, "NAV", {"de_test": areas})
+    monkeypatch.setattr(nav_data, "AREA_DIST_MATRIX", {"de_test": matrix})
+    dist = nav_data.AreaDistanceMatrix.from_awpy("de_test")
+
+    assert dist.area_ids.tolist() == [3, 5, 9]
+    assert dist.distances.dtype == np.float32
+    assert dist.get_rows([9, 3, 4, 0, 100]).tolist() == [2, 0, -1, -1, -1]
+    assert float(dist.lookup(3, 9)) == 25.0
+    assert np.isnan(dist.lookup(5, 9))  # missing from awpy's matrix
+    pairwise = dist.pairwise([5, 3, 7])
+    assert pairwise.shape == (3, 3)
+    assert pairwise[0, 1] == 10.0 and pairwise[1, 0] == 10.0
+    assert np.isnan(pairwise[2]).all()
+
+
+def test_area_distance_matrix_disk_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(nav_data, "NAV", {"de_test": {1: _area(0, 0, 0), 2: _area(5, 0, 0)}})
+    monkeypatch.setattr(nav_data, "AREA_DIST_MATRIX", {"de_test": {"1": {"2": {"geodesic": 5.0}}}})
+    built = nav_data._load_area_distance_matrix("de_test", tmp_path)
+    reopened = nav_data._load_area_distance_matrix("de_test", tmp_path)
+
+    assert isinstance(reopened.distances, np.memmap)
+    assert reopened.area_ids.tolist() == built.area_ids.tolist() == [1, 2]
+    assert float(reopened.lookup(1, 2)) == 5.0
+
+
+def test_bombsite_distance_table(monkeypatch, tmp_path):
+    areas = {1: _area(0, 0, 0), 2: _area(10, 0, 0), 3: _area(20, 0, 0), 4: _area(30, 0, 0), 5: _area(90, 0, 0)}
+    areas[1]["areaName"] = "BombsiteA"
+    areas[4]["areaName"] = "BombsiteB"
+    graph = nx.DiGraph()
+    graph.add_nodes_from(areas)
+    for a, b in ((1, 2), (2, 3), (3, 4)):
+        graph.add_edge(a, b, weight=10.0)
+        graph.add_edge(b, a, weight=10.0)
+    monkeypatch.setattr(nav_data, "NAV", {"de_test": areas})
+    monkeypatch.setattr(nav_data, "NAV_GRAPHS", {"de_test": graph})
+    # the matrix only knows some pairs, the others come from the graph
+    monkeypatch.setattr(nav_data, "AREA_DIST_MATRIX", {"de_test": {"1": {"3": {"geodesic": 15.0}}}})
+    monkeypatch.setattr(nav_data, "get_area_distance_matrix", lambda _: nav_data.AreaDistanceMatrix.from_awpy("de_test"))
+
+    table = nav_data._load_bombsite_distance_table("de_test", tmp_path)
+    assert table.lookup([1, 2, 3, 4]).tolist() == [[0.0, 30.0], [10.0, 20.0], [15.0, 10.0], [30.0, 0.0]]
+    assert np.isinf(table.lookup(5)).all()  # unreachable
+    with pytest.raises(ValueError):
+        table.lookup([1, 6])
+    assert isinstance(nav_data._load_bombsite_distance_table("de_test", tmp_path).distances, np.memmap)
+
+
+def test_shared_nav_data_round_trip(monkeypatch):
+    areas = {1: _area(0, 0, 0), 2: _area(10, 0, 0)}
+    areas[1]["areaName"] = "BombsiteA"
+    graph = nx.DiGraph()
+    graph.add_edge(1, 2, weight=10.0)
+    monkeypatch.setattr(nav_data, "NAV", {"de_test": areas})
+    monkeypatch.setattr(nav_data, "NAV_GRAPHS", {"de_test": graph})
+    monkeypatch.setattr(nav_data, "AREA_DIST_MATRIX", {"de_test": {"1": {"2": {"geodesic": 12.0}}}})
+    monkeypatch.setattr(nav_data, "_shared_area_distance_matrices", {})
+    monkeypatch.setattr(nav_data, "_shared_bombsite_distance_tables", {})
+    monkeypatch.delenv("NAV_CACHE_DIR", raising=False)
+    nav_data.get_area_distance_matrix.cache_clear()
+    nav_data.get_bombsite_distance_table.cache_clear()
+
+    blocks, spec = nav_data.share_nav_data(["de_test", "de_unknown"])
+    try:
+        assert list(spec) == ["de_test"]
+        nav_data.attach_shared_nav_data(spec)
+        assert "de_test" not in nav_data.AREA_DIST_MATRIX  # awpy's dicts are dropped after attaching
+        matrix = nav_data.get_area_distance_matrix("de_test")
+        assert matrix is nav_data._shared_area_distance_matrices["de_test"]
+        assert float(matrix.lookup(1, 2)) == 12.0
+        assert not matrix.distances.flags.writeable
+        assert nav_data.get_bombsite_distance_table("de_test").lookup([1, 2]).tolist() == [[0.0, np.inf], [12.0, np.inf]]
+    finally:
+        nav_data.get_area_distance_matrix.cache_clear()
+        nav_data.get_bombsite_distance_table.cache_clear()
+        nav_data.release_shared_nav_data(blocks)
+
+
+def _reference_bfs(tile_to_neighbors, areas, approximate, current_tiles, area_threshold, steps):
+    """The queue-based BFS map control used before NavAdjacency."""
+    total_map_area = sum(areas.values())
+    values = defaultdict(list)
+    for start in current_tiles:
+        seen, queue, player_area = set(), deque([(start, 1.0, steps)]), 0
+        while queue and player_area < total_map_area * area_threshold:
+            tile, value, steps_left = queue.popleft()
+            if tile in seen:
+                continue
+            seen.add(tile)
+            values[tile].append(value)
+            neighbors = list(tile_to_neighbors[tile]) or approximate[tile]
+            queue.extend((n, max((steps_left - 1) / steps, 0.1), steps_left - 1) for n in neighbors)
+            player_area += areas[tile]
+    return values
+
+
+def test_map_control_bfs_matches_queue_bfs(monkeypatch):
+    from metrics.map_control_metric import _bfs
+
+    rng = np.random.default_rng(1)
+    areas = {tile_id: _area(*rng.uniform(0, 1000, size=3)) for tile_id in range(1, 61)}
+    tile_areas = {tile_id: float(rng.uniform(1, 50)) for tile_id in areas}
+    graph = nx.DiGraph()
+    graph.add_nodes_from(areas)
+    for _ in range(90):
+        a, b = rng.integers(1, 56, size=2)  # tiles 56-60 stay isolated
+        if a != b:
+            graph.add_edge(int(a), int(b))
+    monkeypatch.setattr(nav_data, "NAV", {"de_test": areas})
+    monkeypatch.setattr(nav_data, "NAV_GRAPHS", {"de_test": graph})
+    monkeypatch.setattr(nav_data, "calculate_tile_area", lambda _, tile_id: tile_areas[tile_id])
+    adjacency = nav_data.NavAdjacency.from_awpy("de_test")
+
+    # the 5 closest tiles stand in for the neighbors of isolated tiles, like awpy's _approximate_neighbors
+    centers = {tile_id: ((a["southEastX"] + a["northWestX"]) / 2, (a["southEastY"] + a["northWestY"]) / 2,
+                         (a["southEastZ"] + a["northWestZ"]) / 2) for tile_id, a in areas.items()}
+    approximate = {
+        tile_id: sorted((t for t in areas if t != tile_id), key=lambda t: math.dist(centers[t], center))[:5]
+        for tile_id, center in centers.items()
+    }
+    for tile_id in (56, 60):
+        row = adjacency.get_rows(tile_id)
+        neighbors = adjacency.neighbors[adjacency.indptr[row]:adjacency.indptr[row + 1]]
+        assert adjacency.tile_ids[neighbors].tolist() == approximate[tile_id]
+
+    tile_to_neighbors = defaultdict(set)
+    for a, b in graph.edges:
+        tile_to_neighbors[a].add(b)
+        tile_to_neighbors[b].add(a)
+    for current_tiles, area_threshold, steps in (([1, 57, 20], 1 / 20, 10), ([3, 3], 1 / 3, 4), ([58], 1.0, 10)):
+        expected = _reference_bfs(tile_to_neighbors, tile_areas, approximate, current_tiles, area_threshold, steps)
+        assert dict(_bfs("de_test", current_tiles, adjacency, area_threshold, steps)) == dict(expected)
+    with pytest.raises(KeyError):
+        _bfs("de_test", [1, 0], adjacency)
+
+
+def test_nav_adjacency_disk_cache(monkeypatch, tmp_path):
+    areas = {1: _area(0, 0, 0), 2: _area(10, 0, 0), 3: _area(50, 0, 0)}
+    graph = nx.DiGraph()
+    graph.add_edge(1, 2)
+    monkeypatch.setattr(nav_data, "NAV", {"de_test": areas})
+    monkeypatch.setattr(nav_data, "NAV_GRAPHS", {"de_test": graph})
+    monkeypatch.setattr(nav_data, "calculate_tile_area", lambda _, tile_id: float(tile_id))
+    monkeypatch.setattr(nav_data, "APPROXIMATE_NEIGHBOR_COUNT", 1)
+    nav_data.get_area_index.cache_clear()
+    nav_data._load_nav_adjacency("de_test", tmp_path)
+    reopened = nav_data._load_nav_adjacency("de_test", tmp_path)
+    nav_data.get_area_index.cache_clear()
+
+    assert reopened.total_area == 6.0
+    assert reopened.tile_ids.tolist() == [1, 2, 3]
+    assert reopened.get_neighbor_rows(np.array([2, 0, 1])).tolist() == [1, 1, 0]  # tile 3 is isolated, 2 is closest
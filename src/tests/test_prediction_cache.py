@@ -0,0 +1,45 @@
+import pickle
+
+from ml import prediction_cache
+from ml.prediction_cache import MatchPredictions
+
+
+class _FakeEngine:
+    def __init__(self):
+        self.calls = []
+
+    def predict_graph_files(self, graph_files, normalization=None):
+        self.calls.append((graph_files, normalization))
+        with open(graph_files[0], "rb") as f:
+            return [f"tactic-{graph['graph_data']['tick']}" for graph in pickle.load(f)]
+
+
+def _write_round(path, ticks, x):
+    with open(path, "wb") as f:
+        pickle.dump([{"graph_data": {"tick": tick}, "nodes_data": {0: {"x": x, "nodeType": 1}}, "edges_data": []}
+                     for tick in ticks], f)
+
+
+def test_match_predictions_are_predicted_per_round_and_cached(monkeypatch, tmp_path):
+    graph_dir = tmp_path / "match"
+    graph_dir.mkdir()
+    _write_round(graph_dir / "graph-rounds-0.pkl", [0, 1], x=-5)
+    _write_round(graph_dir / "graph-rounds-2.pkl", [7], x=15)
+    engine = _FakeEngine()
+    monkeypatch.setattr(prediction_cache, "get_prediction_engine", lambda *_: engine)
+    monkeypatch.setattr(prediction_cache, "get_model_hash", lambda *_: "model")
+
+    predictions = MatchPredictions(tmp_path / "models", graph_dir, tmp_path / "cache")
+    assert predictions.get_missing_rounds() == [0, 2]
+    assert predictions.predict_round(2) == ["tactic-7"]
+    assert predictions.predict_round(1) == []
+    # every round is normalized with the statistics of the whole match
+    assert engine.calls[0][1]["global_min_x"] == -5 and engine.calls[0][1]["global_x_range"] == 20
+
+    reopened = MatchPredictions(tmp_path / "models", graph_dir, tmp_path / "cache")
+    assert reopened.to_list(3) == [[], [], ["tactic-7"]]
+    assert reopened.predict_round(0) == ["tactic-0", "tactic-1"]
+    assert len(engine.calls) == 2
+
+    _write_round(graph_dir / "graph-rounds-2.pkl", [7, 8], x=15)  # regraphed round, the cache is stale
+    assert MatchPredictions(tmp_path / "models", graph_dir, tmp_path / "cache").rounds == {}
@@ -0,0 +1,17 @@
+import json
+
+from datamodel.routine_tracker import RoutineTracker
+
+
+def test_aggregation_progress_counts_demo_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(RoutineTracker, "from_data_manager",
+                        classmethod(lambda cls, dm, tile_length, routine_length: cls(dm.get_map_name(), tile_length)))
+    for match_id, map_name in (("m1", "de_dust2"), ("m2", "de_inferno"), ("m3", "de_dust2")):
+        (tmp_path / f"{match_id}.json").write_text(json.dumps({"mapName": map_name, "gameRounds": []}))
+    (tmp_path / "notes.txt").write_text("not a demo")
+
+    progress = []
+    tracker = RoutineTracker.aggregate_routines_from_directory(
+        tmp_path, "de_dust2", 20, progress_callback=lambda processed, total: progress.append((processed, total)))
+    assert tracker.map_name == "de_dust2"
+    assert progress == [(0, 3), (1, 3), (2, 3), (3, 3)]
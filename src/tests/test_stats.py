@@ -0,0 +1,100 @@
+import csv
+import json
+from concurrent.futures import Future
+
+import stats
+
+
+def _player(name: str, x: float) -> dict:
+    player = {key: 0 for key in stats.KEYS_PLAYER_LEVEL}
+    player.update({"steamID": 0, "name": name, "x": x, "y": 0.0, "z": 0.0, "hp": 100, "isAlive": True})
+    return player
+
+
+def _round(round_num: int) -> dict:
+    frames = [
+        {"tick": tick, "seconds": tick / 64, "clockTime": "01:55", "bombPlanted": False, "bomb": None,
+         "t": {"teamName": "A", "teamEqVal": 0, "alivePlayers": 5, "totalUtility": 0,
+               "players": [_player(f"a{i}", float(tick + i)) for i in range(5)]},
+         "ct": {"teamName": "B", "teamEqVal": 0, "alivePlayers": 5, "totalUtility": 0,
+                "players": [_player(f"b{i}", float(i)) for i in range(5)]}}
+        for tick in range(0, 3 * 64, 64)
+    ]
+    game_round = {key: None for key in stats.KEYS_ROUND_LEVEL}
+    game_round.update({"roundNum": round_num, "bombEvents": [], "frames": frames})
+    return game_round
+
+
+def _read_csv(path) -> list[list[str]]:
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_main_writes_rounds_of_all_demos_in_order(tmp_path):
+    demo_dir = tmp_path / "demos"
+    demo_dir.mkdir()
+    for match_id in ("m1", "m2"):
+        game = {"mapName": "de_dust2", "gameRounds": [_round(1), _round(2), _round(3)]}
+        (demo_dir / f"{match_id}.json").write_text(json.dumps(game))
+
+    metric_keys = ("tHp", "deltaDistance")
+    stats.main([demo_dir], str(tmp_path / "serial.csv"), metric_keys, processes=1)
+    stats.main([demo_dir], str(tmp_path / "parallel.csv"), metric_keys, processes=2)
+
+    rows = _read_csv(tmp_path / "serial.csv")
+    assert _read_csv(tmp_path / "parallel.csv") == rows
+    header = rows[0]
+    assert header == list(stats.generate_csv_header(metric_keys))
+    assert [(row[0], row[1]) for row in rows[1::3]] == [("m1", "1"), ("m1", "2"), ("m1", "3"),
+                                                        ("m2", "1"), ("m2", "2"), ("m2", "3")]
+    assert [row[header.index("deltaDistance")] for row in rows[1:4]] == ["0.0", "320.0", "320.0"]
+    assert {row[header.index("tHp")] for row in rows[1:]} == {"500"}
+
+
+def test_demo_rounds_reuse_the_planned_scan(monkeypatch, tmp_path):
+    import datamodel.data_manager as data_manager
+
+    demo_path = tmp_path / "m1.json"
+    demo_path.write_text(json.dumps({"mapName": "de_dust2", "gameRounds": [_round(1), _round(2)]}))
+    round_count, player_mappings, scanned_demo = stats.plan_demo(str(demo_path))
+    expected = stats.process_demo_round(str(demo_path), 1, player_mappings, ("tHp",), scanned_demo)
+
+    def fail(*_, **__):
+        raise AssertionError("the demo was scanned again")
+
+    monkeypatch.setattr(data_manager, "scan_demo", fail)
+    assert round_count == 2
+    assert stats.process_demo_round(str(demo_path), 1, player_mappings, ("tHp",), scanned_demo) == expected
+
+
+def test_parallel_rounds_are_submitted_in_a_bounded_window(monkeypatch, tmp_path):
+    submitted = []
+
+    class SerialExecutor:
+        def __init__(self, max_workers, initializer, initargs):
+            initializer(*initargs)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *_):
+            return False
+
+        def submit(self, fn, *args):
+            submitted.append(fn)
+            future = Future()
+            future.set_result(fn(*args))
+            return future
+
+    monkeypatch.setattr(stats, "ProcessPoolExecutor", SerialExecutor)
+    demo_files = []
+    for match_id in ("m1", "m2", "m3", "m4"):
+        demo_files.append(tmp_path / f"{match_id}.json")
+        demo_files[-1].write_text(json.dumps({"mapName": "de_dust2", "gameRounds": [_round(1), _round(2), _round(3)]}))
+
+    rounds = stats.iterate_demo_rounds(demo_files, ("tHp",), processes=2)
+    assert next(rounds)[:2] == (demo_files[0], 0)
+    assert submitted.count(stats.process_demo_round) == 2 * stats.ROUNDS_IN_FLIGHT_PER_PROCESS + 1
+    assert submitted.count(stats.plan_demo) == 4
+    assert [(demo_path, round_idx) for demo_path, round_idx, _ in rounds][-1] == (demo_files[-1], 2)
+    assert submitted.count(stats.process_demo_round) == 12
@@ -0,0 +1,85 @@
+import queue
+import threading
+import tkinter as tk
+from collections.abc import Callable
+from typing import Any
+
+
+class BackgroundTask:
+    """Runs a function on a worker thread, so that long operations do not freeze the GUI.
+
+    Tk widgets must only be touched from the main thread, so the worker never calls back into the GUI directly: its
+    progress reports and its result are put in a queue that is polled from the Tk event loop with `widget.after`, and
+    the callbacks run there.
+
+    The target is called as `target(report_progress, cancelled)`. It reports progress by calling `report_progress`
+    with any value (passed on to `on_progress`) and should return early once the `cancelled` event is set. After
+    `cancel`, no further callbacks are made.
+    """
+
+    def __init__(
+        self,
+        widget: tk.Misc,
+        target: Callable[[Callable[[Any], None], threading.Event], Any],
+        on_done: Callable[[Any], None] | None = None,
+        on_progress: Callable[[Any], None] | None = None,
+        on_error: Callable[[Exception], None] | None = None,
+        poll_interval_ms: int = 50,
+    ):
+        self.widget = widget
+        self.target = target
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.poll_interval_ms = poll_interval_ms
+        self.cancelled = threading.Event()
+        self._messages: queue.Queue[tuple[str, Any]] = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._poll_job = None
+
+    def start(self) -> "BackgroundTask":
+        """Starts the worker thread and the polling. Returns the task itself."""
+        self._thread.start()
+        self._poll_job = self.widget.after(self.poll_interval_ms, self._poll)
+        return self
+
+    def cancel(self):
+        """Asks the worker to stop and stops delivering its messages."""
+        self.cancelled.set()
+        if self._poll_job is not None:
+            self.widget.after_cancel(self._poll_job)
+            self._poll_job = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the task was started, has not finished and was not cancelled."""
+        return self._poll_job is not None
+
+    def _run(self):
+        try:
+            result = self.target(lambda progress: self._messages.put(("progress", progress)), self.cancelled)
+        except Exception as e:
+            self._messages.put(("error", e))
+        else:
+            self._messages.put(("done", result))
+
+    def _poll(self):
+        self._poll_job = None
+        while not self.cancelled.is_set():
+            try:
+                kind, value = self._messages.get_nowait()
+            except queue.Empty:
+                self._poll_job = self.widget.after(self.poll_interval_ms, self._poll)
+                return
+            if kind == "progress":
+                if self.on_progress is not None:
+                    self.on_progress(value)
+            elif kind == "done":
+                if self.on_done is not None:
+                    self.on_done(value)
+                return
+            else:
+                if self.on_error is None:
+                    raise value
+                self.on_error(value)
+                return
@@ -18,7 +18,8 @@ from datamodel.position_tracker import PositionTracker
 from datamodel.routine_tracker import RoutineTracker
 from datamodel.side_type import SideType
 from datamodel.visualization_manager import VisualizationManager
-from ml.predictor import Predictor
+from ml.prediction_cache import MatchPredictions
+from ui.gui.background_task import BackgroundTask
 from ui.gui.imports import CanvasTooltip
 from ui.gui.subcomponents import (
     FrameWithScrollableInnerFrame,
@@ -484,7 +485,8 @@ class TopBarMenu(ttk.Frame):
         self._enable_menu_options_requiring_loaded_routine_tracker()
 
     def create_routine_heatmap_from_demo_directory(self):
-        """Creates a heatmap of player routines from all demos in a directory."""
+        """Creates a heatmap of player routines from all demos in a directory. The demos are aggregated on a worker
+        thread while a progress window with a cancel button is shown."""
         if self.main_app.dm is None:
             raise ValueError("DataManager not initialized.")
         if self.main_app.vm is None:
@@ -497,18 +499,65 @@ class TopBarMenu(ttk.Frame):
             # User cancelled the file dialog
             return
         directory_path = Path(file_dialog_response)
-        tracker = RoutineTracker.aggregate_routines_from_directory(
-            directory_path, self.main_app.dm.get_map_name(), 20
+        map_name = self.main_app.dm.get_map_name()
+
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("Aggregating Routines")
+        progress_window.resizable(False, False)
+        progress_label = ttk.Label(progress_window, text=f"Aggregating routines from {directory_path}...")
+        progress_label.pack(padx=10, pady=(10, 5))
+        progress_bar = ttk.Progressbar(progress_window, length=400, mode="determinate")
+        progress_bar.pack(padx=10, pady=5)
+        cancel_button = ttk.Button(progress_window, text="Cancel")
+        cancel_button.pack(pady=(5, 10))
+        self.heatmap_menu.entryconfigure(
+            HeatmapMenuButtonNames.GENERATE_ROUTINES_HEATMAP_FROM_DIRECTORY.value, state=tk.DISABLED
         )
-        self.main_app.vm._routine_tracker = tracker
 
-        # TODO: Add a progress bar that displays during the aggregation process (can be the 'indeterminate' style, as we might not be able to have insight into the progress of `aggregate_routines_from_directory`)
-        messagebox.showinfo(
-            "Routine Heatmap Data Loaded",
-            f"Routine heatmap data loaded successfully, including data from {len(tracker.metadata)} demos.",
-        )
+        def aggregate(report_progress, cancelled):
+            return RoutineTracker.aggregate_routines_from_directory(
+                directory_path,
+                map_name,
+                20,
+                progress_callback=lambda processed, total: report_progress((processed, total)),
+                should_stop=cancelled.is_set,
+            )
 
-        self._enable_menu_options_requiring_loaded_routine_tracker()
+        def close_progress_window():
+            progress_window.destroy()
+            self.heatmap_menu.entryconfigure(
+                HeatmapMenuButtonNames.GENERATE_ROUTINES_HEATMAP_FROM_DIRECTORY.value, state=tk.NORMAL
+            )
+
+        def show_progress(progress):
+            processed, total = progress
+            progress_bar.configure(maximum=max(total, 1), value=processed)
+            progress_label.configure(text=f"Aggregating routines from {directory_path}... {processed}/{total} files")
+
+        def finish(tracker: RoutineTracker):
+            close_progress_window()
+            if self.main_app.vm is None or self.main_app.dm.get_map_name() != map_name:
+                # A demo of another map was opened in the meantime
+                return
+            self.main_app.vm._routine_tracker = tracker
+            messagebox.showinfo(
+                "Routine Heatmap Data Loaded",
+                f"Routine heatmap data loaded successfully, including data from {len(tracker.metadata)} demos.",
+            )
+            self._enable_menu_options_requiring_loaded_routine_tracker()
+
+        def fail(error: Exception):
+            close_progress_window()
+            messagebox.showerror("Routine Aggregation Failed", f"The routines could not be aggregated: {error}")
+
+        task = BackgroundTask(self, aggregate, on_done=finish, on_progress=show_progress, on_error=fail).start()
+
+        def cancel():
+            task.cancel()
+            close_progress_window()
+
+        cancel_button.configure(command=cancel)
+        progress_window.protocol("WM_DELETE_WINDOW", cancel)
 
     def view_routine_heatmap_composition_info(self):
         """Displays a list of demos used in the creation of the current routine heatmap."""
@@ -1264,13 +1313,10 @@ class TimelineBar(ttk.Frame):
         if self.parent.vm is None:
             raise ValueError("VisualizationManager not initialized.")
 
-        if not self.parent.prediction_label.predictor_output:
+        round_predictions = self.parent.prediction_label.get_round_predictions(round_index)
+        if not round_predictions:
             return
 
-        # match_id = self.parent.dm.get_match_id()
-
-        predictor_output = self.parent.prediction_label.predictor_output
-
         pixels_per_frame = self._get_pixels_per_frame(round_index)
 
         segments = []
@@ -1278,7 +1324,7 @@ class TimelineBar(ttk.Frame):
         start_frame = None
         last_frame = None
 
-        for frame, tactic in enumerate(predictor_output[round_index]):
+        for frame, tactic in enumerate(round_predictions):
             if current_tactic is None:  # Start segment
                 current_tactic = tactic
                 start_frame = frame
@@ -1569,20 +1615,21 @@ class PredictionLabel(ttk.Frame):
     label: tk.Text
     run_prediction_button: tk.Button
 
-    predictor: Predictor
-    predictor_output: list
+    match_predictions: MatchPredictions | None
+    prediction_task: BackgroundTask | None
 
     def __init__(self, parent: MainApplication, *args, **kwargs):
         ttk.Frame.__init__(self, parent, *args, **kwargs)
         self.parent = parent
-        self.predictor = None
-        self.predictor_output = []
+        self.match_predictions = None
+        self.prediction_task = None
+        self._requested_round_index = None
 
         self.label = tk.Text(self, font=("Arial", 14), height=1, wrap="none")
         self.run_prediction_button = tk.Button(
             self,
             text="Run Predictor",
-            command=lambda tactic_id=None: self.run_predictor(),
+            command=lambda tactic_id=None: self.toggle_predictor(),
             state="disabled",
         )
         self.run_prediction_button.pack(pady=0)
@@ -1597,32 +1644,53 @@ class PredictionLabel(ttk.Frame):
         self.label.pack(side="top", fill="x", expand=True)
         self.pack(side="top", fill="x")
 
+    def _get_graph_folder(self) -> Path:
+        return Path(os.environ.get("GRAPHS_OUTPUT_DIR")) / f"{self.parent.dm.get_match_id()}"
+
+    def _open_match_predictions(self) -> MatchPredictions:
+        return MatchPredictions(
+            Path(os.environ.get("MODELS_OUTPUT_DIR")),
+            self._get_graph_folder(),
+            os.environ.get("PREDICTIONS_CACHE_DIR"),
+        )
+
     def check_graphs(self):
-        """Enables the run prediction button if labeled frame data exists."""
+        """Enables the run prediction button if labeled frame data exists, and shows the cached predictions of the
+        match, if any."""
         if self.parent.dm is None:
             return
 
-        label_folder = (
-            Path(os.environ.get("GRAPHS_OUTPUT_DIR"))
-            / f"{self.parent.dm.get_match_id()}"
-        )
+        label_folder = self._get_graph_folder()
 
-        if label_folder.exists() and label_folder.is_dir() and self.predictor is None:
+        if label_folder.exists() and label_folder.is_dir() and self.match_predictions is None:
             self.run_prediction_button.configure(state="normal")
+            if os.environ.get("MODELS_OUTPUT_DIR") is None:
+                return
+            try:
+                self.match_predictions = self._open_match_predictions()
+            except OSError:  # no trained model yet
+                return
+            if not self.match_predictions.get_missing_rounds():
+                self.run_prediction_button.configure(state="disabled")
         else:
             self.run_prediction_button.configure(state="disabled")
 
+    def get_round_predictions(self, round_index: int) -> list:
+        """Returns the predicted tactic of every frame of a round, or an empty list if it is not predicted yet. While
+        the predictor runs, a round that is not predicted yet is predicted next."""
+        if self.match_predictions is None:
+            return []
+        round_predictions = self.match_predictions.rounds.get(round_index, [])
+        if not round_predictions and self.prediction_task is not None:
+            self._requested_round_index = round_index
+        return round_predictions
+
     def get_prediction_for_frame(self, round_index: int, frame_index: int):
-        if not self.predictor_output:
+        round_predictions = self.get_round_predictions(round_index)
+        if frame_index < 0 or frame_index >= len(round_predictions):
             return
 
-        # if round_index < 0 or round_index >= len(self.predictor_output):
-        #     return
-
-        # if frame_index < 0 or frame_index >= len(self.predictor_output[round_index]):
-        #     return
-
-        predicted_tactic = self.predictor_output[round_index][frame_index]
+        predicted_tactic = round_predictions[frame_index]
         self.update_prediction(predicted_tactic)
 
     def update_prediction(self, tactic_id: str):
@@ -1636,45 +1704,75 @@ class PredictionLabel(ttk.Frame):
         self.label.configure(state=tk.DISABLED)
 
     def clear_prediction(self):
-        """Clears the prediction label."""
+        """Clears the prediction label and cancels a running prediction."""
         self.label.configure(state=tk.NORMAL)
         self.label.delete("1.0", tk.END)
         self.label.configure(state=tk.DISABLED)
-        self.predictor = None
-        self.predictor_output = None
-        self.run_prediction_button.configure(state="disabled")
-
-    def run_predictor(self):
-        self.predictor = Predictor(
-            Path(os.environ.get("MODELS_OUTPUT_DIR")),
-            Path(os.environ.get("GRAPHS_OUTPUT_DIR"))
-            / f"{self.parent.dm.get_match_id()}",
-            Path(os.environ.get("LABELS_OUTPUT_DIR"))
-        )
-        # Get raw output (flat list of predictions)
-        raw_output = self.predictor.predict()
-
-        # Convert to nested list [round][frame]
-        self.predictor_output = self._structure_predictions_by_round(raw_output)
-
+        self._stop_prediction_task()
+        self.match_predictions = None
         self.run_prediction_button.configure(state="disabled")
 
-        self.parent.reload_visualization_widgets()
-        self.parent.timeline_bar.load_timeline_predictions(
-            self.parent.timeline_bar.visualized_round_index
-        )
-
-    def _structure_predictions_by_round(self, flat_predictions: list):
-        """Convert a flat list of predictions into a nested list: predictions[round][frame]."""
-        if self.parent.dm is None:
-            raise ValueError("DataManager not initialized.")
-
-        structured = []
-        index = 0
-        for round_index in range(self.parent.dm.get_round_count()):
-            frame_count = self.parent.dm.get_frame_count(round_index)
-            round_predictions = flat_predictions[index : index + frame_count]
-            structured.append(round_predictions)
-            index += frame_count
+    def toggle_predictor(self):
+        """Starts the predictor, or cancels it if it is running."""
+        if self.prediction_task is None:
+            self.run_predictor()
+        else:
+            self._stop_prediction_task()
+            self.run_prediction_button.configure(state="normal")
 
-        return structured
+    def run_predictor(self):
+        """Predicts the rounds of the match on a worker thread, the visualized round first. Every predicted round is
+        delivered to the GUI as soon as it is done."""
+        if self.match_predictions is None:
+            self.match_predictions = self._open_match_predictions()
+        match_predictions = self.match_predictions
+        self._requested_round_index = self.parent.timeline_bar.visualized_round_index
+
+        def predict_rounds(report_progress, cancelled):
+            while not cancelled.is_set():
+                missing_rounds = match_predictions.get_missing_rounds()
+                if not missing_rounds:
+                    return
+                # The round the user is looking at goes first
+                requested_round_index = self._requested_round_index
+                if requested_round_index in missing_rounds:
+                    round_index = requested_round_index
+                else:
+                    round_index = missing_rounds[0]
+                match_predictions.predict_round(round_index)
+                report_progress(round_index)
+
+        self.prediction_task = BackgroundTask(
+            self,
+            predict_rounds,
+            on_done=lambda _: self._finish_prediction_task(),
+            on_progress=self._show_predicted_round,
+            on_error=self._show_prediction_error,
+        ).start()
+        self.run_prediction_button.configure(text="Cancel Prediction", state="normal")
+
+    def _show_predicted_round(self, round_index: int):
+        """Shows the predictions of a round that was just predicted, if it is the visualized round."""
+        predicted_count = len(self.match_predictions.round_files) - len(self.match_predictions.get_missing_rounds())
+        self.run_prediction_button.configure(
+            text=f"Cancel Prediction ({predicted_count}/{len(self.match_predictions.round_files)} rounds)"
+        )
+        if self.parent.vm is None or round_index != self.parent.timeline_bar.visualized_round_index:
+            return
+        self.parent.timeline_bar.load_timeline_predictions(round_index)
+        self.get_prediction_for_frame(round_index, self.parent.vm.current_frame_index)
+
+    def _show_prediction_error(self, error: Exception):
+        self._finish_prediction_task()
+        self.run_prediction_button.configure(state="normal")
+        messagebox.showerror("Prediction Failed", f"The tactics could not be predicted: {error}")
+
+    def _finish_prediction_task(self):
+        self.prediction_task = None
+        self.run_prediction_button.configure(text="Run Predictor", state="disabled")
+
+    def _stop_prediction_task(self):
+        if self.prediction_task is not None:
+            self.prediction_task.cancel()
+            self.prediction_task = None
+        self.run_prediction_button.configure(text="Run Predictor")
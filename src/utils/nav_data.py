@@ -0,0 +1,508 @@
+# This file contains precomputed, array-based views of the awpy NAV data, built once per map and process
+
+import os
+import shutil
+import sys
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from functools import cache
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+from awpy.analytics.nav import calculate_tile_area
+from awpy.data import AREA_DIST_MATRIX, NAV, NAV_GRAPHS
+from scipy.spatial import cKDTree
+
+# Bump when the layout of the cached NAV arrays changes, to invalidate all existing caches
+NAV_CACHE_VERSION = 1
+
+# Arrays attached from shared memory by `attach_shared_nav_data`, by map name. Take precedence over building them.
+_shared_area_distance_matrices: dict[str, "AreaDistanceMatrix"] = {}
+_shared_bombsite_distance_tables: dict[str, "BombsiteDistanceTable"] = {}
+_attached_memory: list[SharedMemory] = []  # Keeps the attached blocks open for the lifetime of the process
+
+# Number of closest tiles that stand in for the neighbors of a tile without NAV graph edges, as in awpy's map control
+APPROXIMATE_NEIGHBOR_COUNT = 5
+
+# Prefixes of the area names of the bombsites, in the column order of the BombsiteDistanceTable
+BOMBSITE_AREA_PREFIXES = ("BombsiteA", "BombsiteB")
+
+
+class AreaIndex:
+    """Spatial index over the centers of the NAV areas of a map, for resolving many positions to areas at once.
+
+    Matches awpy's `find_closest_area` (closest area center by euclidean distance), but answers a whole batch of
+    points with one KD-tree query instead of a linear scan over all areas per point.
+    """
+
+    def __init__(self, map_name: str):
+        """
+        Args:
+            map_name (str): The map to index. Must be a key of awpy.data.NAV.
+        """
+        if map_name not in NAV:
+            raise ValueError("Map not found.")
+        self.map_name = map_name
+        areas = NAV[map_name]
+        self.area_ids = np.fromiter(areas.keys(), dtype=np.int64, count=len(areas))
+        self.centers = np.array(
+            [
+                [
+                    (area["southEastX"] + area["northWestX"]) / 2,
+                    (area["southEastY"] + area["northWestY"]) / 2,
+                    (area["southEastZ"] + area["northWestZ"]) / 2,
+                ]
+                for area in areas.values()
+            ],
+            dtype=np.float64,
+        )
+        self._tree = cKDTree(self.centers)
+        self._flat_tree = cKDTree(self.centers[:, :2])
+
+    def find_closest_areas(self, points, flat: bool = False) -> np.ndarray:
+        """Finds the closest area for each of the given points.
+
+        Args:
+            points: Array-like of shape [n, 3] (or [n, 2] if flat) with x, y(, z) coordinates.
+            flat (bool): Whether z should be ignored.
+
+        Returns:
+            np.ndarray: The area IDs (int64) of shape [n]. Points with missing coordinates (NaN) get area ID 0,
+            like awpy's `find_closest_area`.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2 if flat else 3)
+        area_ids = np.zeros(len(points), dtype=np.int64)
+        valid = ~np.isnan(points).any(axis=1)
+        if valid.any():
+            tree = self._flat_tree if flat else self._tree
+            _, rows = tree.query(points[valid])
+            area_ids[valid] = self.area_ids[rows]
+        return area_ids
+
+    def find_closest_area(self, point, flat: bool = False) -> int:
+        """Finds the closest area for a single point. See `find_closest_areas`."""
+        return int(self.find_closest_areas([point], flat)[0])
+
+
+@cache
+def get_area_index(map_name: str) -> AreaIndex:
+    """Returns the AreaIndex for the given map, building it on first use in this process."""
+    return AreaIndex(map_name)
+
+
+class NavAdjacency:
+    """The undirected neighbors and the areas of the NAV tiles of a map as flat arrays, for graph searches over many
+    tiles without dicts of sets.
+
+    Row i belongs to the tile `tile_ids[i]` (sorted ascending). The neighbors of row i are the rows
+    `neighbors[indptr[i]:indptr[i + 1]]` (CSR layout), in the order of the neighbor sets that map control's BFS used
+    to build from NAV_GRAPHS on every frame. Tiles without neighbors in the NAV graph (isolated tiles) get their
+    APPROXIMATE_NEIGHBOR_COUNT closest tiles instead, like awpy's `_approximate_neighbors`, so searches never need
+    awpy's linear scan over all tiles. `tile_areas` holds awpy's `calculate_tile_area` of every tile and `total_area`
+    their sum in NAV order.
+    """
+
+    def __init__(
+        self,
+        map_name: str,
+        tile_ids: np.ndarray,
+        indptr: np.ndarray,
+        neighbors: np.ndarray,
+        tile_areas: np.ndarray,
+        total_area: float,
+    ):
+        """
+        Args:
+            map_name (str): The map of the tiles.
+            tile_ids (np.ndarray): The sorted tile IDs (int64) of shape [n].
+            indptr (np.ndarray): The offsets (int64) of the neighbors of each row into `neighbors`, shape [n + 1].
+            neighbors (np.ndarray): The neighbor rows (int64) of all tiles.
+            tile_areas (np.ndarray): The area (float64) of each tile, shape [n].
+            total_area (float): The navigable area of the map.
+        """
+        self.map_name = map_name
+        self.tile_ids = tile_ids
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.tile_areas = tile_areas
+        self.total_area = total_area
+
+    @classmethod
+    def from_awpy(cls, map_name: str) -> "NavAdjacency":
+        """Builds the adjacency of the given map from awpy's NAV_GRAPHS edges (in both directions) and NAV areas.
+        Edges to tiles without NAV data are dropped, the neighbors of isolated tiles are approximated."""
+        if map_name not in NAV:
+            raise ValueError("Map not found.")
+        tile_ids = np.sort(np.fromiter(NAV[map_name].keys(), dtype=np.int64, count=len(NAV[map_name])))
+        rows = {int(tile_id): row for row, tile_id in enumerate(tile_ids)}
+        tile_to_neighbors: dict[int, set[int]] = defaultdict(set)
+        for tile_1, tile_2 in NAV_GRAPHS[map_name].edges:
+            tile_to_neighbors[tile_1].add(tile_2)
+            tile_to_neighbors[tile_2].add(tile_1)
+        neighbor_rows = [
+            [rows[neighbor] for neighbor in tile_to_neighbors.get(int(tile_id), ()) if neighbor in rows]
+            for tile_id in tile_ids
+        ]
+        isolated = [row for row, tile_id in enumerate(tile_ids) if not tile_to_neighbors.get(int(tile_id))]
+        for row, neighbor_ids in zip(isolated, _approximate_tile_neighbors(map_name, tile_ids[isolated]), strict=True):
+            neighbor_rows[row] = [rows[int(neighbor_id)] for neighbor_id in neighbor_ids]
+        indptr = np.zeros(len(tile_ids) + 1, dtype=np.int64)
+        np.cumsum([len(row_neighbors) for row_neighbors in neighbor_rows], out=indptr[1:])
+        neighbors = np.fromiter(
+            (row for row_neighbors in neighbor_rows for row in row_neighbors), dtype=np.int64, count=int(indptr[-1])
+        )
+        tile_areas = np.array([calculate_tile_area(map_name, int(tile_id)) for tile_id in tile_ids], dtype=np.float64)
+        total_area = 0
+        for tile_id in NAV[map_name]:
+            total_area += calculate_tile_area(map_name, tile_id)
+        return cls(map_name, tile_ids, indptr, neighbors, tile_areas, total_area)
+
+    def get_rows(self, tile_ids) -> np.ndarray:
+        """Returns the rows of the given tile IDs, -1 for IDs that are not part of the map."""
+        tile_ids = np.asarray(tile_ids, dtype=np.int64)
+        if len(self.tile_ids) == 0:
+            return np.full(tile_ids.shape, -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.tile_ids, tile_ids), len(self.tile_ids) - 1)
+        return np.where(self.tile_ids[rows] == tile_ids, rows, -1)
+
+    def get_neighbor_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Returns the neighbors of all given rows, concatenated in the order of `rows`, with one fancy index."""
+        starts = self.indptr[rows]
+        counts = self.indptr[rows + 1] - starts
+        offsets = np.cumsum(counts) - counts
+        return self.neighbors[np.repeat(starts - offsets, counts) + np.arange(int(counts.sum()))]
+
+
+def _approximate_tile_neighbors(map_name: str, tile_ids: np.ndarray) -> np.ndarray:
+    """Returns the APPROXIMATE_NEIGHBOR_COUNT closest tiles (by euclidean distance between the tile centers) of each of
+    the given tiles, shape [k, APPROXIMATE_NEIGHBOR_COUNT].
+
+    Gives the same tiles in the same order as awpy's `_approximate_neighbors` (ties in NAV order), for all tiles with
+    one distance computation instead of one `area_distance` call per pair of tiles.
+    """
+    index = get_area_index(map_name)
+    positions = {int(tile_id): position for position, tile_id in enumerate(index.area_ids)}
+    neighbors = np.zeros((len(tile_ids), APPROXIMATE_NEIGHBOR_COUNT), dtype=np.int64)
+    for i, tile_id in enumerate(tile_ids):
+        position = positions[int(tile_id)]
+        offsets = index.centers - index.centers[position]
+        distances = np.sqrt(offsets[:, 0] ** 2 + offsets[:, 1] ** 2 + offsets[:, 2] ** 2)
+        others = np.delete(np.arange(len(index.area_ids)), position)
+        closest = others[np.argsort(distances[others], kind="stable")[:APPROXIMATE_NEIGHBOR_COUNT]]
+        neighbors[i, :len(closest)] = index.area_ids[closest]
+    return neighbors
+
+
+def _load_nav_adjacency(map_name: str, cache_dir: Path) -> NavAdjacency:
+    """Memory-maps the cached adjacency for the given map, building and writing it first if it does not exist yet."""
+
+    def build() -> dict[str, np.ndarray]:
+        adjacency = NavAdjacency.from_awpy(map_name)
+        return {
+            "tile_ids": adjacency.tile_ids,
+            "indptr": adjacency.indptr,
+            "neighbors": adjacency.neighbors,
+            "tile_areas": adjacency.tile_areas,
+            "total_area": np.float64(adjacency.total_area),
+        }
+
+    arrays = _load_cached_arrays(cache_dir, map_name, "adjacency", build)
+    return NavAdjacency(
+        map_name,
+        np.asarray(arrays["tile_ids"]),
+        np.asarray(arrays["indptr"]),
+        np.asarray(arrays["neighbors"]),
+        np.asarray(arrays["tile_areas"]),
+        float(arrays["total_area"]),
+    )
+
+
+@cache
+def get_nav_adjacency(map_name: str) -> NavAdjacency:
+    """Returns the NavAdjacency for the given map. If the NAV_CACHE_DIR environment variable is set, it is stored there
+    on first use, so the neighbors of the isolated tiles are only approximated once per map."""
+    if os.environ.get("NAV_CACHE_DIR"):
+        try:
+            return _load_nav_adjacency(map_name, Path(os.environ["NAV_CACHE_DIR"]))
+        except (OSError, ValueError):
+            pass  # unreadable or unwritable cache, build the adjacency in memory
+    return NavAdjacency.from_awpy(map_name)
+
+
+class AreaDistanceMatrix:
+    """Dense geodesic distances between all NAV areas of a map, converted once from awpy's AREA_DIST_MATRIX.
+
+    Row/column i of `distances` belongs to the area `area_ids[i]` (sorted ascending). Pairs missing from awpy's
+    matrix are NaN, so callers can fall back to awpy's `area_distance` for exactly those pairs.
+    """
+
+    def __init__(self, area_ids: np.ndarray, distances: np.ndarray):
+        """
+        Args:
+            area_ids (np.ndarray): The sorted area IDs (int64) of shape [n].
+            distances (np.ndarray): The geodesic distances (float32) of shape [n, n]. Can be memory-mapped.
+        """
+        self.area_ids = area_ids
+        self.distances = distances
+
+    @classmethod
+    def from_awpy(cls, map_name: str) -> "AreaDistanceMatrix":
+        """Builds the dense matrix for the given map from awpy's nested AREA_DIST_MATRIX dicts."""
+        if map_name not in NAV:
+            raise ValueError("Map not found.")
+        area_ids = np.sort(np.fromiter(NAV[map_name].keys(), dtype=np.int64, count=len(NAV[map_name])))
+        rows = {int(area_id): row for row, area_id in enumerate(area_ids)}
+        distances = np.full((len(area_ids), len(area_ids)), np.nan, dtype=np.float32)
+        for area_a, targets in AREA_DIST_MATRIX.get(map_name, {}).items():
+            row = rows.get(int(area_a))
+            if row is None:
+                continue
+            cols = np.array([rows.get(int(area_b), -1) for area_b in targets], dtype=np.int64)
+            values = np.array([target["geodesic"] for target in targets.values()], dtype=np.float32)
+            distances[row, cols[cols >= 0]] = values[cols >= 0]
+        return cls(area_ids, distances)
+
+    def get_rows(self, area_ids) -> np.ndarray:
+        """Returns the matrix rows of the given area IDs, -1 for IDs that are not part of the map."""
+        area_ids = np.asarray(area_ids, dtype=np.int64)
+        if len(self.area_ids) == 0:
+            return np.full(area_ids.shape, -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.area_ids, area_ids), len(self.area_ids) - 1)
+        return np.where(self.area_ids[rows] == area_ids, rows, -1)
+
+    def lookup(self, areas_a, areas_b) -> np.ndarray:
+        """Returns the geodesic distances between `areas_a` and `areas_b` (broadcast against each other).
+        Pairs with unknown areas or without a precomputed distance are NaN."""
+        rows_a, rows_b = np.broadcast_arrays(self.get_rows(areas_a), self.get_rows(areas_b))
+        known = (rows_a >= 0) & (rows_b >= 0)
+        distances = np.full(rows_a.shape, np.nan, dtype=np.float32)
+        distances[known] = self.distances[rows_a[known], rows_b[known]]
+        return distances
+
+    def pairwise(self, area_ids) -> np.ndarray:
+        """Returns the [n, n] geodesic distances between all given areas, with one fancy-index into the matrix."""
+        area_ids = np.asarray(area_ids, dtype=np.int64)
+        return self.lookup(area_ids[:, None], area_ids[None, :])
+
+
+def _load_cached_arrays(
+    cache_dir: Path, map_name: str, kind: str, build: Callable[[], dict[str, np.ndarray]]
+) -> dict[str, np.ndarray]:
+    """Memory-maps the cached arrays `<cache_dir>/<map>-<kind>-v<version>/<array name>.npy`, building them with `build`
+    and writing them first if they do not exist yet."""
+    array_dir = cache_dir / f"{map_name}-{kind}-v{NAV_CACHE_VERSION}"
+    if not array_dir.exists():
+        arrays = build()
+        # write to a temporary directory and swap it in, so concurrent workers never map a partially written file
+        tmp_dir = array_dir.with_name(f"{array_dir.name}.tmp-{os.getpid()}")
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(tmp_dir / f"{name}.npy", array)
+        try:
+            os.replace(tmp_dir, array_dir)
+        except OSError:
+            if not array_dir.exists():
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # another process was faster
+    return {path.stem: np.load(path, mmap_mode="r") for path in array_dir.glob("*.npy")}
+
+
+def _load_area_distance_matrix(map_name: str, cache_dir: Path) -> AreaDistanceMatrix:
+    """Memory-maps the cached matrix for the given map, building and writing it first if it does not exist yet."""
+
+    def build() -> dict[str, np.ndarray]:
+        matrix = AreaDistanceMatrix.from_awpy(map_name)
+        return {"area_ids": matrix.area_ids, "distances": matrix.distances}
+
+    arrays = _load_cached_arrays(cache_dir, map_name, "area-dist", build)
+    return AreaDistanceMatrix(np.asarray(arrays["area_ids"]), arrays["distances"])
+
+
+@cache
+def get_area_distance_matrix(map_name: str) -> AreaDistanceMatrix | None:
+    """Returns the dense AreaDistanceMatrix for the given map, or None if awpy has no distance matrix for it.
+
+    If the NAV_CACHE_DIR environment variable is set, the matrix is stored there once and memory-mapped afterwards,
+    so all worker processes share the same pages instead of each converting awpy's dicts.
+    """
+    if map_name in _shared_area_distance_matrices:
+        return _shared_area_distance_matrices[map_name]
+    if map_name not in AREA_DIST_MATRIX:
+        return None
+    if os.environ.get("NAV_CACHE_DIR"):
+        try:
+            return _load_area_distance_matrix(map_name, Path(os.environ["NAV_CACHE_DIR"]))
+        except (OSError, ValueError):
+            pass  # unreadable or unwritable cache, build the matrix in memory
+    return AreaDistanceMatrix.from_awpy(map_name)
+
+
+class BombsiteDistanceTable:
+    """Minimum geodesic distance from each bombsite to every NAV area of a map.
+
+    Column 0 holds the distance from the closest area of bombsite A, column 1 from the closest area of bombsite B
+    (see BOMBSITE_AREA_PREFIXES). Unreachable areas are inf. The distances never change, so the table is built once
+    per map and makes the bombsite distances of a node a single lookup.
+    """
+
+    def __init__(self, area_ids: np.ndarray, distances: np.ndarray):
+        """
+        Args:
+            area_ids (np.ndarray): The sorted area IDs (int64) of shape [n].
+            distances (np.ndarray): The bombsite distances (float32) of shape [n, 2].
+        """
+        self.area_ids = area_ids
+        self.distances = distances
+
+    @classmethod
+    def from_awpy(cls, map_name: str) -> "BombsiteDistanceTable":
+        """Builds the table for the given map. Distances are taken from the dense area distance matrix where it is
+        complete, and computed with a multi-source Dijkstra over awpy's NAV graph where pairs are missing."""
+        if map_name not in NAV:
+            raise ValueError("Map not found.")
+        area_ids = np.sort(np.fromiter(NAV[map_name].keys(), dtype=np.int64, count=len(NAV[map_name])))
+        matrix = get_area_distance_matrix(map_name)
+        distances = np.full((len(area_ids), len(BOMBSITE_AREA_PREFIXES)), np.inf, dtype=np.float32)
+        for col, prefix in enumerate(BOMBSITE_AREA_PREFIXES):
+            site_ids = [
+                int(area_id) for area_id in area_ids if NAV[map_name][int(area_id)]["areaName"].startswith(prefix)
+            ]
+            if not site_ids:
+                continue
+            incomplete = np.ones(len(area_ids), dtype=bool)
+            if matrix is not None:
+                site_distances = matrix.lookup(np.array(site_ids)[:, None], area_ids[None, :])
+                distances[:, col] = np.fmin.reduce(site_distances, axis=0)  # ignores missing pairs
+                incomplete = np.isnan(site_distances).any(axis=0)
+            if incomplete.any():
+                graph = NAV_GRAPHS[map_name]
+                graph_distances = nx.multi_source_dijkstra_path_length(
+                    graph, [area_id for area_id in site_ids if area_id in graph], weight="weight"
+                )
+                fallback = np.array(
+                    [graph_distances.get(int(area_id), np.inf) for area_id in area_ids[incomplete]], dtype=np.float32
+                )
+                distances[incomplete, col] = np.fmin(distances[incomplete, col], fallback)
+        return cls(area_ids, distances)
+
+    def lookup(self, area_ids) -> np.ndarray:
+        """Returns the distances to bombsite A and B of shape [k, 2] for the given area IDs.
+        Raises a ValueError for area IDs that are not part of the map, like awpy's `area_distance`."""
+        area_ids = np.asarray(area_ids, dtype=np.int64).reshape(-1)
+        rows = np.minimum(np.searchsorted(self.area_ids, area_ids), len(self.area_ids) - 1)
+        if len(self.area_ids) == 0 or (self.area_ids[rows] != area_ids).any():
+            raise ValueError("Area ID not found.")
+        return self.distances[rows]
+
+
+def _load_bombsite_distance_table(map_name: str, cache_dir: Path) -> BombsiteDistanceTable:
+    """Memory-maps the cached table for the given map, building and writing it first if it does not exist yet."""
+
+    def build() -> dict[str, np.ndarray]:
+        table = BombsiteDistanceTable.from_awpy(map_name)
+        return {"area_ids": table.area_ids, "distances": table.distances}
+
+    arrays = _load_cached_arrays(cache_dir, map_name, "bombsite-dist", build)
+    return BombsiteDistanceTable(np.asarray(arrays["area_ids"]), arrays["distances"])
+
+
+@cache
+def get_bombsite_distance_table(map_name: str) -> BombsiteDistanceTable:
+    """Returns the BombsiteDistanceTable for the given map. If the NAV_CACHE_DIR environment variable is set, the table
+    is stored there on first use, so it is only built once per map instead of once per process."""
+    if map_name in _shared_bombsite_distance_tables:
+        return _shared_bombsite_distance_tables[map_name]
+    if os.environ.get("NAV_CACHE_DIR"):
+        try:
+            return _load_bombsite_distance_table(map_name, Path(os.environ["NAV_CACHE_DIR"]))
+        except (OSError, ValueError):
+            pass  # unreadable or unwritable cache, build the table in memory
+    return BombsiteDistanceTable.from_awpy(map_name)
+
+
+def _to_shared_memory(array: np.ndarray, blocks: list[SharedMemory]) -> tuple[str, tuple[int, ...], str]:
+    """Copies an array into a new shared memory block. Returns the (name, shape, dtype) to attach to it."""
+    array = np.ascontiguousarray(array)
+    block = SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    blocks.append(block)
+    return block.name, array.shape, array.dtype.str
+
+
+def _from_shared_memory(spec: tuple[str, tuple[int, ...], str]) -> np.ndarray:
+    """Attaches to a shared memory block created by `_to_shared_memory` and returns a read-only view of its array."""
+    name, shape, dtype = spec
+    if sys.version_info >= (3, 13):
+        block = SharedMemory(name=name, track=False)
+    else:
+        block = SharedMemory(name=name)
+        # Only the creating process may unlink the block, not the resource tracker when this process exits
+        resource_tracker.unregister(block._name, "shared_memory")
+    _attached_memory.append(block)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    array.flags.writeable = False
+    return array
+
+
+def share_nav_data(map_names: Iterable[str]) -> tuple[list[SharedMemory], dict]:
+    """Builds the dense distance arrays of the given maps once and places them in shared memory, for pool workers to
+    attach to with `attach_shared_nav_data` (e.g. as the pool's initializer) instead of building their own copies.
+
+    Returns the created blocks, which the caller must close and unlink once the workers are done, and the picklable
+    spec to pass to `attach_shared_nav_data`. Maps without NAV data are skipped.
+    """
+    blocks: list[SharedMemory] = []
+    spec: dict[str, dict] = {}
+    try:
+        for map_name in map_names:
+            if map_name not in NAV:
+                continue
+            spec[map_name] = {}
+            matrix = get_area_distance_matrix(map_name)
+            if matrix is not None:
+                spec[map_name]["area-dist"] = {
+                    "area_ids": _to_shared_memory(matrix.area_ids, blocks),
+                    "distances": _to_shared_memory(matrix.distances, blocks),
+                }
+            table = get_bombsite_distance_table(map_name)
+            spec[map_name]["bombsite-dist"] = {
+                "area_ids": _to_shared_memory(table.area_ids, blocks),
+                "distances": _to_shared_memory(table.distances, blocks),
+            }
+    except BaseException:
+        release_shared_nav_data(blocks)
+        raise
+    return blocks, spec
+
+
+def release_shared_nav_data(blocks: list[SharedMemory]) -> None:
+    """Closes and unlinks the blocks created by `share_nav_data`."""
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+def attach_shared_nav_data(spec: dict) -> None:
+    """Makes the arrays shared by `share_nav_data` the ones returned by `get_area_distance_matrix` and
+    `get_bombsite_distance_table` in this process, without copying them.
+
+    awpy's nested AREA_DIST_MATRIX dicts of the attached maps are dropped in this process afterwards, as everything
+    here reads the dense arrays instead. This frees the per-worker copy of the largest part of awpy's data.
+    """
+    # forked workers inherit the parent's caches, which hold private copies of the arrays
+    get_area_distance_matrix.cache_clear()
+    get_bombsite_distance_table.cache_clear()
+    for map_name, arrays in spec.items():
+        if "area-dist" in arrays:
+            matrix_arrays = arrays["area-dist"]
+            _shared_area_distance_matrices[map_name] = AreaDistanceMatrix(
+                _from_shared_memory(matrix_arrays["area_ids"]), _from_shared_memory(matrix_arrays["distances"])
+            )
+            AREA_DIST_MATRIX.pop(map_name, None)
+        table_arrays = arrays["bombsite-dist"]
+        _shared_bombsite_distance_tables[map_name] = BombsiteDistanceTable(
+            _from_shared_memory(table_arrays["area_ids"]), _from_shared_memory(table_arrays["distances"])
+        )